@@ -1,15 +1,18 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
+import atexit
 import json
 import argparse
 import os
 import sys
 
-from emop.emop_query import EmopQuery
+from emop.emop_query import EmopQuery, pending_pages_by_fields
+from emop.lib.emop_stats import overhead_stages, runtime_by_fields, throughput_windows
 from emop.emop_submit import EmopSubmit
 from emop.emop_run import EmopRun
 from emop.emop_upload import EmopUpload
+from emop.lib.emop_metrics import metrics
 
 # Needed to prevent the _JAVA_OPTIONS value from breaking some of
 # the post processes that use Java
@@ -17,36 +20,209 @@ if os.environ.get("_JAVA_OPTIONS"):
     del os.environ["_JAVA_OPTIONS"]
 
 
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    return "%d:%02d:%02d" % (seconds / 3600, (seconds % 3600) / 60, seconds % 60)
+
+
+def format_runtime_summary(summary):
+    return ("%s: count=%d total=%0.1f mean=%0.1f p50=%0.1f p90=%0.1f p99=%0.1f max=%0.1f" %
+            (summary["name"], summary["count"], summary["total"], summary["mean"], summary["p50"], summary["p90"],
+             summary["p99"], summary["max"]))
+
+
+def format_fraction(value, total=1):
+    if value is None or not total:
+        return "-"
+    return "%0.1f%%" % (float(value) / total * 100)
+
+
+def print_report(args, report, printer, *printer_args):
+    """Print a report as JSON if --json is given, otherwise with printer"""
+    if args.query_json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        printer(report, *printer_args)
+
+
+def query_pending_pages(emop_query, args):
+    # --pending-pages --by
+    if args.pending_pages_by:
+        pending_pages_by = emop_query.pending_pages_by(q_filter=args.filter, by=args.pending_pages_by)
+        if pending_pages_by is None:
+            print("ERROR: querying pending pages failed")
+            sys.exit(1)
+        key = pending_pages_by_fields[args.pending_pages_by]["key"]
+        for value, count in pending_pages_by:
+            print("Number of pending pages for %s %s: %s" % (key, value, count))
+        print("Number of pending pages: %s" % sum(c for v, c in pending_pages_by))
+        return
+    pending_pages = emop_query.pending_pages(q_filter=args.filter)
+    if pending_pages == 0 or pending_pages:
+        print("Number of pending pages: %s" % pending_pages)
+    else:
+        print("ERROR: querying pending pages failed")
+        sys.exit(1)
+
+
+def print_jobs(states, jobs):
+    for state in sorted(states):
+        print("Jobs %s: %d" % (state, states[state]))
+    for job in jobs:
+        print("%s %s %s/%s %s %s %s" % (job.job_id, job.state, format_seconds(job.elapsed),
+                                        format_seconds(job.time_limit), job.node, job.proc_id, job.reason))
+
+
+def print_running(report):
+    print("Running jobs: %d" % len(report["jobs"]))
+    print("Pages per hour: %0.2f" % report["pages_per_hour"])
+    print("Stalled jobs: %d" % report["stalled"])
+    for job in report["jobs"]:
+        if job["num_pages"] is None:
+            progress = "no heartbeat"
+        else:
+            progress = "%d/%d pages (%d failed) %s %s %0.1f pages/hour ETA %s" % (
+                job["pages_done"] + job["pages_failed"], job["num_pages"], job["pages_failed"],
+                job["stage"] or "-", format_seconds(job["stage_time"]), job["pages_per_hour"] or 0,
+                format_seconds(job["finishes_in"]))
+        line = "%s %s %s %s left %s" % (job["job_id"], job["proc_id"], job["host"] or "-", progress,
+                                        format_seconds(job["time_left"]))
+        if job["finishes_in"] is not None and job["time_left"] is not None and \
+                job["finishes_in"] > job["time_left"]:
+            line += " TIME LIMIT BEFORE FINISH"
+        if job["stalled"]:
+            line += " STALLED: %s" % job["stalled"]
+        print(line)
+
+
+def print_accounting(report):
+    if report is None:
+        print("ERROR: querying job accounting failed")
+        sys.exit(1)
+    print("Jobs: %d" % report["jobs"])
+    for state in sorted(report["states"]):
+        print("Jobs %s: %d" % (state, report["states"][state]))
+    if report["mem_used_max"] is not None:
+        print("Memory per CPU: max %d MB, p95 %d MB of %s MB requested" %
+              (report["mem_used_max"], report["mem_used_p95"],
+               int(report["mem_requested"]) if report["mem_requested"] else "-"))
+    if report["cpu_efficiency"] is not None:
+        print("CPU efficiency: %0.1f%%, p95 %0.2f CPUs used" %
+              (report["cpu_efficiency"] * 100, report["cpus_used_p95"]))
+    if report["page_runtime"] is not None:
+        print("Page runtime: %0.1f seconds (from %s)" % (report["page_runtime"], report["page_runtime_source"]))
+    if report["time_limit_used_p95"] is not None:
+        print("Walltime used: p95 %0.1f%%" % (report["time_limit_used_p95"] * 100))
+    print("Recommended settings:")
+    for key in ["mem_per_cpu", "cpus_per_task", "avg_page_runtime"]:
+        value = report["recommended"][key]
+        print("\t%s = %s" % (key, value if value is not None else "- (no data)"))
+    for job in report["killed"]:
+        print("KILLED %s: job %s PROC_ID %s pages %s after %s, max memory %s MB of %s MB" %
+              (job["state"], job["job_id"], job["proc_id"], job["num_pages"] or "-", format_seconds(job["elapsed"]),
+               int(job["max_rss"]) if job["max_rss"] is not None else "-",
+               int(job["req_mem"] * (job["alloc_cpus"] or 1)) if job["req_mem"] else "-"))
+    for job in report["timed_out"]:
+        print("TIMEOUT: job %s PROC_ID %s pages %s after %s of %s walltime" %
+              (job["job_id"], job["proc_id"], job["num_pages"] or "-", format_seconds(job["elapsed"]),
+               format_seconds(job["time_limit"])))
+
+
+def print_runtimes(report, by, window):
+    avg_runtimes = report["averages"]
+    print("Pages completed: %d" % avg_runtimes["total_pages"])
+    print("Total Page Runtime: %d seconds" % avg_runtimes["total_page_runtime"])
+    print("Average Page Runtime: %d seconds" % avg_runtimes["average_page_runtime"])
+    print("Jobs completed: %d" % avg_runtimes["total_jobs"])
+    print("Average Job Runtime: %d seconds" % avg_runtimes["average_job_runtime"])
+    print("Processes:")
+    for process in avg_runtimes["processes"]:
+        print("\t%s completed: %d" % (process["name"], process["count"]))
+        print("\t%s Average: %d seconds" % (process["name"], process["avg"]))
+        print("\t%s Total: %d seconds" % (process["name"], process["total"]))
+    print("Runtime percentiles (seconds):")
+    for stage in report["stages"]:
+        print("\t%s" % format_runtime_summary(stage))
+    print("Throughput (pages/hour) by %s:" % window)
+    for throughput in report["throughput"]:
+        print("\t%s: %0.2f (%d pages)" % (throughput["window"], throughput["pages_per_hour"], throughput["pages"]))
+    for field in by or []:
+        print("Page runtimes by %s (seconds):" % field)
+        for group in report["by"][field]:
+            print("\t%s" % format_runtime_summary(group))
+
+
+def print_overhead(report):
+    aggregate = report["aggregate"]
+    print("Jobs: %d" % aggregate["jobs"])
+    print("Node time: %d seconds" % aggregate["node"])
+    for stage in overhead_stages:
+        print("\t%s: %d seconds (%s)" % (stage, aggregate["times"][stage],
+                                         format_fraction(aggregate["times"][stage], aggregate["node"])))
+    print("Productive: %s" % format_fraction(aggregate["productive"]))
+    print("ERROR COUNT: %d" % aggregate["events"]["error"])
+    print("HIT WALLTIME LIMIT COUNT: %d" % aggregate["events"]["time_limit"])
+    print("EXCEEDED MEMORY LIMIT COUNT: %d" % aggregate["events"]["memory_limit"])
+    print("Jobs (seconds):")
+    print("\tJOBID HOST NODE PRODUCTIVE %s" % " ".join(s.upper() for s in overhead_stages))
+    for job in report["jobs"]:
+        print("\t%s %s %d %s %s" % (job["job_id"] or "-", job["host"] or "-", job["node"],
+                                    format_fraction(job["productive"]),
+                                    " ".join("%d" % job["times"][s] for s in overhead_stages)))
+
+
 def query(args, parser):
     emop_query = EmopQuery(args.config_path)
     # --pending-pages
     if args.query_pending_pages:
-        pending_pages = emop_query.pending_pages(q_filter=args.filter)
-        if pending_pages == 0 or pending_pages:
-            print("Number of pending pages: %s" % pending_pages)
-        else:
-            print("ERROR: querying pending pages failed")
-            sys.exit(1)
+        query_pending_pages(emop_query, args)
+    # --jobs
+    if args.query_jobs:
+        print_jobs(*emop_query.jobs())
+    # --running
+    if args.query_running:
+        print_report(args, emop_query.running(), print_running)
+    # --accounting
+    if args.query_accounting:
+        print_accounting(emop_query.accounting())
     # --avg-runtimes
     if args.query_avg_runtimes:
-        avg_runtimes = emop_query.get_runtimes()
-        if avg_runtimes:
-            print("Pages completed: %d" % avg_runtimes["total_pages"])
-            print("Total Page Runtime: %d seconds" % avg_runtimes["total_page_runtime"])
-            print("Average Page Runtime: %d seconds" % avg_runtimes["average_page_runtime"])
-            print("Jobs completed: %d" % avg_runtimes["total_jobs"])
-            print("Average Job Runtime: %d seconds" % avg_runtimes["average_job_runtime"])
-            print("Processes:")
-            for process in avg_runtimes["processes"]:
-                print("\t%s completed: %d" % (process["name"], process["count"]))
-                print("\t%s Average: %d seconds" % (process["name"], process["avg"]))
-                print("\t%s Total: %d seconds" % (process["name"], process["total"]))
-        else:
-            print("ERROR: querying average page runtimes")
-            sys.exit(1)
+        report = emop_query.runtime_report(by=args.runtimes_by, window=args.throughput_window)
+        print_report(args, report, print_runtimes, args.runtimes_by, args.throughput_window)
+    # --overhead
+    if args.query_overhead:
+        print_report(args, emop_query.overhead(), print_overhead)
     sys.exit(0)
 
 
+def get_job_slots(emop_submit, args):
+    """Get the active jobs and job slots, exits if the job limit has been reached
+
+    Returns:
+        tuple: The number of active jobs and of job slots, 0 and None unless --schedule is given.
+    """
+    if not args.schedule:
+        return 0, None
+    current_job_count = emop_submit.scheduler.current_job_count()
+    job_slots = emop_submit.scheduler.available_job_slots()
+    if not job_slots:
+        if emop_submit.settings.scheduler_opportunistic:
+            print("No job slots available.")
+        else:
+            print("Job limit of %s reached." % emop_submit.settings.max_jobs)
+        sys.exit(0)
+    return current_job_count, job_slots
+
+
+def print_simulation(results):
+    for name, stats in results:
+        print("%s: makespan=%0.1fh node_hours=%0.1f jobs=%d kill_rate=%0.1f%% idle_slot_hours=%0.1f "
+              "idle=%0.1f%% incomplete_pages=%d" %
+              (name, stats["makespan"] / 3600.0, stats["node_hours"], stats["jobs"], stats["kill_rate"] * 100,
+               stats["idle_slot_hours"], stats["idle_fraction"] * 100, stats["incomplete_pages"]))
+
+
 def submit(args, parser):
     """SUBMIT
     """
@@ -71,30 +247,31 @@ def submit(args, parser):
         print("Error querying pending pages")
         sys.exit(1)
 
-    # Exit if the number of submitted jobs has reached the limit
-    if args.schedule:
-        current_job_count = emop_submit.scheduler.current_job_count()
-        if current_job_count >= emop_submit.settings.max_jobs:
-            print("Job limit of %s reached." % emop_submit.settings.max_jobs)
-            sys.exit(0)
+    current_job_count, job_slots = get_job_slots(emop_submit, args)
+
+    emop_submit.load_runtime_estimate(r_filter=args.filter)
 
     # Optimize job submission if --pages-per-job and --num-jobs was not set
     if not args.pages_per_job and not args.num_jobs:
-        num_jobs, pages_per_job = emop_submit.optimize_submit(pending_pages, current_job_count, sim=args.submit_simulate)
+        num_jobs, pages_per_job = emop_submit.optimize_submit(pending_pages, current_job_count, sim=args.submit_simulate,
+                                                              job_slots=job_slots)
     else:
         num_jobs = args.num_jobs
         pages_per_job = args.pages_per_job
 
     if args.submit_simulate:
+        print_simulation(emop_submit.simulate(pending_pages, current_job_count, r_filter=args.filter))
         sys.exit(0)
 
-    # Loop that performs the actual submission
-    for i in xrange(num_jobs):
-        proc_id = emop_submit.reserve(num_pages=pages_per_job, r_filter=args.filter)
-        if not proc_id:
-            print("Failed to reserve page")
-            sys.exit(1)
-        emop_submit.scheduler.submit_job(proc_id=proc_id, num_pages=pages_per_job)
+    # Reserve pages for all jobs then perform the actual submission
+    reserved = emop_submit.reserve_bulk(num_jobs=num_jobs, pages_per_job=pages_per_job, r_filter=args.filter)
+    if not reserved:
+        print("Failed to reserve page")
+        sys.exit(1)
+    submitted = emop_submit.scheduler.submit_jobs(reserved)
+    if submitted < len(reserved):
+        print("Error: submitted %d of %d reserved jobs" % (submitted, len(reserved)))
+        sys.exit(1)
     sys.exit(0)
 
 
@@ -212,10 +389,46 @@ parser_query.add_argument('--pending-pages',
                           help="query number of pending pages",
                           dest="query_pending_pages",
                           action="store_true")
+parser_query.add_argument('--by',
+                          help="group pending pages by field",
+                          dest="pending_pages_by",
+                          action="store",
+                          choices=sorted(pending_pages_by_fields.keys()))
+parser_query.add_argument('--jobs',
+                          help="query this application's jobs in the scheduler",
+                          dest="query_jobs",
+                          action="store_true")
+parser_query.add_argument('--running',
+                          help="query the progress of running jobs",
+                          dest="query_running",
+                          action="store_true")
+parser_query.add_argument('--accounting',
+                          help="query resource use of ended jobs and recommend settings",
+                          dest="query_accounting",
+                          action="store_true")
 parser_query.add_argument('--avg-runtimes',
                           help="query average runtimes of completed jobs",
                           dest="query_avg_runtimes",
                           action="store_true")
+parser_query.add_argument('--runtimes-by',
+                          help="with --avg-runtimes, break page runtimes down by field, may be repeated",
+                          dest="runtimes_by",
+                          action="append",
+                          choices=sorted(runtime_by_fields.keys()))
+parser_query.add_argument('--throughput-window',
+                          help="with --avg-runtimes, time window pages per hour are reported for",
+                          dest="throughput_window",
+                          action="store",
+                          default="day",
+                          choices=sorted(throughput_windows.keys()))
+parser_query.add_argument('--overhead',
+                          help="query where the node time of logged jobs was spent",
+                          dest="query_overhead",
+                          action="store_true")
+parser_query.add_argument('--json',
+                          help="with --running, --avg-runtimes or --overhead, print the report as JSON",
+                          dest="query_json",
+                          action="store_true")
 parser_query.set_defaults(func=query)
 # submit args
 parser_submit.add_argument(*filter_args, **filter_kwargs)
@@ -276,4 +489,7 @@ parser_testrun.add_argument('--no-upload',
 parser_testrun.set_defaults(func=testrun)
 
 args = parser.parse_args()
+metrics.set_label("command", args.mode)
+# Report API metrics however the subcommand exits
+atexit.register(metrics.report, args.mode)
 args.func(args, parser)
@@ -1,123 +1,284 @@
-import glob
 import logging
-import os
-import re
+import time
+from multiprocessing.pool import ThreadPool
 from emop.lib.emop_base import EmopBase
+from emop.lib.emop_cache import EmopCache
+from emop.lib.emop_heartbeat import load_heartbeats
+from emop.lib.emop_payload import EmopPayload
+from emop.lib.emop_scheduler import EmopScheduler
+from emop.lib.emop_stats import EmopStats, active_states, processes
 
 logger = logging.getLogger('emop')
 
-processes = [
-    "OCR",
-    "Denoise",
-    "MultiColumnSkew",
-    "XML_To_Text",
-    "PageEvaluator",
-    "PageCorrector",
-    "JuxtaCompare",
-    # "RetasCompare",
-]
+#: Fields pending pages can be grouped by, mapped to the job_queue filter key
+#: and the API path listing their values
+pending_pages_by_fields = {
+    "batch": {"key": "batch_id", "path": "/api/batch_jobs"},
+}
 
 
 class EmopQuery(EmopBase):
 
     def __init__(self, config_path):
         super(self.__class__, self).__init__(config_path)
+        self.cache = EmopCache(self.settings.cache_path, "emop_query")
+        self.job_status_ids = {}
+        self.scheduler = EmopScheduler.get_scheduler_instance(name=self.settings.scheduler, settings=self.settings)
+        self.stats = EmopStats(self.settings.stats_db)
+
+    def get_job_status_id(self, name):
+        """Get the ID of a job_status
+
+        job_status IDs do not change so they are cached on disk
+        for ``job_status_cache_ttl`` seconds.
+
+        Args:
+            name (str): Name of the job_status, such as "Not Started"
+
+        Returns:
+            int: The job_status ID, None if the lookup failed.
+        """
+        if name in self.job_status_ids:
+            return self.job_status_ids[name]
+        cache_key = "job_status_id:%s" % name
+        job_status_id = self.cache.get(cache_key, ttl=self.settings.job_status_cache_ttl)
+        if job_status_id is not None:
+            self.job_status_ids[name] = job_status_id
+            return job_status_id
+
+        job_status_request = self.emop_api.get_request("/api/job_statuses", {'name': name})
+        if not job_status_request or not job_status_request.get('results'):
+            return None
+        job_status_id = job_status_request.get('results')[0].get('id')
+        self.cache.set(cache_key, job_status_id)
+        self.job_status_ids[name] = job_status_id
+        return job_status_id
 
     def pending_pages(self, q_filter):
-        job_status_params = {
-            'name': 'Not Started',
-        }
-        job_status_request = self.emop_api.get_request("/api/job_statuses", job_status_params)
-        if not job_status_request:
+        job_status_id = self.get_job_status_id('Not Started')
+        if job_status_id is None:
             return None
-        job_status_results = job_status_request.get('results')[0]
-        job_status_id = job_status_results.get('id')
         if q_filter and isinstance(q_filter, dict):
             job_queue_params = q_filter.copy()
         else:
             job_queue_params = {}
         job_queue_params["job_status_id"] = str(job_status_id)
         job_queue_request = self.emop_api.get_request("/api/job_queues/count", job_queue_params)
-        if not job_status_request:
+        if not job_queue_request:
             return None
         job_queue_results = job_queue_request.get('job_queue')
         count = job_queue_results.get('count')
         return count
 
-    def parse_file_for_runtimes(self, filename):
-        runtimes = {}
-        runtimes["pages"] = []
-        runtimes["total"] = []
-        runtimes["processes"] = {}
-        for process in processes:
-            runtimes["processes"][process] = []
+    def get_by_values(self, by, q_filter):
+        """Get the values pending pages are grouped by
 
-        with open(filename) as f:
-            lines = f.readlines()
+        A list given in the filter, such as ``{"batch_id": [16, 17]}``, is used
+        as is and a single value, such as ``{"batch_id": 16}``, as a list of
+        one.  Otherwise every value is fetched from the API.
 
-        for line in lines:
-            page_match = re.search("Job \[.*\] COMPLETE: Duration: ([0-9.]+) secs", line)
-            total_match = re.search("TOTAL TIME: ([0-9.]+)$", line)
+        Args:
+            by (str): Name of a field in ``pending_pages_by_fields``
+            q_filter (dict): Filter to apply
 
-            if page_match:
-                page_runtime = page_match.group(1)
-                runtimes["pages"].append(float(page_runtime))
-            elif total_match:
-                total_runtime = total_match.group(1)
-                runtimes["total"].append(float(total_runtime))
-            else:
-                for process in processes:
-                    process_match = re.search("%s \[.*\] COMPLETE: Duration: ([0-9.]+) secs" % process, line)
-                    if process_match:
-                        process_runtime = process_match.group(1)
-                        runtimes["processes"][process].append(float(process_runtime))
-        return runtimes
+        Returns:
+            list: The values, None if they could not be fetched.
+        """
+        field = pending_pages_by_fields[by]
+        values = q_filter.get(field["key"]) if q_filter else None
+        if isinstance(values, list):
+            return values
+        if values is not None:
+            return [values]
+        request = self.emop_api.get_request(field["path"])
+        if not request:
+            return None
+        return [r.get('id') for r in request.get('results', [])]
+
+    def pending_pages_by(self, q_filter, by):
+        """Count pending pages grouped by a field
+
+        The counts for each value are requested concurrently using up to
+        ``concurrency`` API requests at once.
+
+        Args:
+            q_filter (dict): Filter to apply
+            by (str): Name of a field in ``pending_pages_by_fields``
+
+        Returns:
+            list: (value, count) tuples, None if any query failed.
+        """
+        key = pending_pages_by_fields[by]["key"]
+        values = self.get_by_values(by, q_filter)
+        if values is None:
+            return None
+        # Lookup once before the threads start so they share the cached value
+        if self.get_job_status_id('Not Started') is None:
+            return None
+        base_filter = dict(q_filter) if q_filter else {}
+
+        def count(value):
+            value_filter = base_filter.copy()
+            value_filter[key] = value
+            return self.pending_pages(q_filter=value_filter)
+
+        if not values:
+            return []
+        pool = ThreadPool(min(self.settings.api_concurrency, len(values)))
+        try:
+            counts = pool.map(count, values)
+        finally:
+            pool.close()
+            pool.join()
+        if None in counts:
+            return None
+        return zip(values, counts)
+
+    def jobs(self):
+        """Get this application's jobs in the scheduler's queue
+
+        Returns:
+            tuple: Count of jobs per state and the list of EmopSchedulerJob
+        """
+        jobs = self.scheduler.snapshot()
+        states = {}
+        for job in jobs:
+            states[job.state] = states.get(job.state, 0) + 1
+        return states, jobs
+
+    def running(self):
+        """Get the progress of running jobs
+
+        The heartbeat files written by running jobs are joined by proc_id
+        with the scheduler's snapshot.  A job is stalled when it has been in
+        one stage for ``heartbeat_stall`` seconds, when its heartbeat file
+        has not been updated for three ``heartbeat_interval`` or when it has
+        a heartbeat file but is no longer in the scheduler's queue.
+
+        Returns:
+            dict: ``jobs``, a dict for each running job ordered by proc_id,
+                the pages per hour of those still in the scheduler's queue
+                and the number stalled.
+        """
+        now = time.time()
+        heartbeats = load_heartbeats(self.settings)
+        scheduled = dict((j.proc_id, j) for j in self.scheduler.snapshot() if j.state == "RUNNING" and j.proc_id)
+        jobs = []
+        for proc_id in sorted(set(heartbeats) | set(scheduled)):
+            heartbeat = heartbeats.get(proc_id, {})
+            scheduler_job = scheduled.get(proc_id)
+            job = {
+                "proc_id": proc_id,
+                "job_id": scheduler_job.job_id if scheduler_job else heartbeat.get("job_id"),
+                "host": scheduler_job.node if scheduler_job else heartbeat.get("host"),
+                "state": scheduler_job.state if scheduler_job else None,
+                "num_pages": heartbeat.get("num_pages"),
+                "pages_done": heartbeat.get("pages_done"),
+                "pages_failed": heartbeat.get("pages_failed"),
+                "stage": heartbeat.get("stage"),
+                "stage_time": None,
+                "pages_per_hour": None,
+                "eta": heartbeat.get("eta"),
+                "finishes_in": None,
+                "time_left": None,
+                "stalled": None,
+            }
+            if job["eta"] is not None:
+                job["finishes_in"] = max(0, job["eta"] - now)
+            if heartbeat.get("stage_started"):
+                job["stage_time"] = now - heartbeat["stage_started"]
+            if heartbeat and now > heartbeat["started"]:
+                job["pages_per_hour"] = heartbeat["pages_done"] * 3600.0 / (now - heartbeat["started"])
+            if scheduler_job and scheduler_job.time_limit is not None and scheduler_job.elapsed is not None:
+                job["time_left"] = scheduler_job.time_limit - scheduler_job.elapsed
+
+            if heartbeat and not scheduler_job:
+                job["stalled"] = "not running"
+            elif heartbeat and now - heartbeat["updated"] > 3 * self.settings.heartbeat_interval:
+                job["stalled"] = "no heartbeat for %d seconds" % (now - heartbeat["updated"])
+            elif job["stage_time"] is not None and job["stage_time"] > self.settings.heartbeat_stall:
+                job["stalled"] = "in %s for %d seconds" % (job["stage"], job["stage_time"])
+            jobs.append(job)
+        return {
+            "jobs": jobs,
+            "pages_per_hour": sum(j["pages_per_hour"] or 0 for j in jobs if j["state"]),
+            "stalled": len([j for j in jobs if j["stalled"]]),
+        }
+
+    def job_num_pages(self, proc_id):
+        """Get the number of pages of a job from its input payload
+
+        Returns:
+            int: Number of pages, None if the payload is missing.
+        """
+        if not proc_id:
+            return None
+        payload = EmopPayload(self.settings, proc_id)
+        if not payload.input_exists():
+            return None
+        data = payload.load_input()
+        if not data:
+            return None
+        return len(data)
+
+    def accounting(self):
+        """Update the stored job accounting records and report on them
+
+        Only jobs since the previous update are read from the scheduler,
+        the first update reads ``accounting_lookback`` days.  Jobs that have
+        not ended are read again by the next update.  New lines of the job
+        logs in ``logdir`` are read for the page runtimes.
+
+        Returns:
+            dict: The report of EmopStats.accounting_report, None if the scheduler query failed.
+        """
+        since = self.stats.get_meta("accounting_since")
+        if since:
+            start = float(since)
+        else:
+            start = time.time() - self.settings.accounting_lookback * 86400
+        now = time.time()
+        records = self.scheduler.get_accounting(start)
+        if records is None:
+            return None
+        ended = [r for r in records if r.state not in active_states]
+        self.stats.add_accounting([(r, self.job_num_pages(r.proc_id)) for r in ended])
+        self.stats.set_meta("accounting_since", now)
+        logger.debug("Read %d ended jobs from the scheduler's accounting" % len(ended))
+        self.stats.update_runtimes(self.settings.scheduler_logdir, processes=self.settings.stats_processes)
+        return self.stats.accounting_report()
 
     def get_runtimes(self):
-        results = {}
-        results["processes"] = []
-        runtimes = {}
-        runtimes["pages"] = []
-        runtimes["total"] = []
-        for process in processes:
-            results[process] = []
-            runtimes[process] = []
+        """Get the runtimes logged by completed jobs
 
-        glob_path = os.path.join(self.settings.scheduler_logdir, "*.out")
-        files = glob.glob(glob_path)
+        New lines of the job logs in ``logdir`` are first read into the stats store.
 
-        for f in files:
-            file_runtimes = self.parse_file_for_runtimes(f)
-            runtimes["pages"] = runtimes["pages"] + file_runtimes["pages"]
-            runtimes["total"] = runtimes["total"] + file_runtimes["total"]
-            for process in processes:
-                runtimes[process] = runtimes[process] + file_runtimes["processes"][process]
+        Returns:
+            dict: Count, total and average runtimes of pages, jobs and each process.
+        """
+        self.stats.update_runtimes(self.settings.scheduler_logdir, processes=self.settings.stats_processes)
+        totals = self.stats.runtime_totals()
+        results = {}
+        results["processes"] = []
 
-        total_pages = len(runtimes["pages"])
-        total_jobs = len(runtimes["total"])
+        total_pages, total_page_runtime = totals.get("page", (0, 0))
+        total_jobs, total_job_runtime = totals.get("total", (0, 0))
 
         if total_pages > 0:
-            total_page_runtime = sum(runtimes["pages"])
             average_page_runtime = total_page_runtime / total_pages
         else:
-            total_page_runtime = sum(runtimes["pages"])
             average_page_runtime = 0
 
         if total_jobs > 0:
-            total_job_runtime = sum(runtimes["total"])
             average_job_runtime = total_job_runtime / total_jobs
         else:
-            total_job_runtime = sum(runtimes["total"])
             average_job_runtime = 0
 
         for process in processes:
-            process_runtimes = runtimes[process]
-            cnt = len(process_runtimes)
+            cnt, total = totals.get(process, (0, 0))
             if cnt > 0:
-                total = sum(process_runtimes)
                 avg = total / cnt
             else:
-                total = sum(process_runtimes)
                 avg = 0
             process_results = {"name": process, "count": cnt, "total": total, "avg": avg}
             results["processes"].append(process_results.copy())
@@ -128,3 +289,35 @@ class EmopQuery(EmopBase):
         results["total_jobs"] = total_jobs
         results["average_job_runtime"] = average_job_runtime
         return results
+
+    def runtime_report(self, by=None, window="day"):
+        """Get the runtimes logged by completed jobs with their distribution
+
+        Args:
+            by (list, optional): Keys of ``runtime_by_fields`` to break page runtimes down by
+            window (str, optional): A key of ``throughput_windows``
+
+        Returns:
+            dict: The averages of get_runtimes, the percentiles of each
+                stage, the pages per hour in each window and the breakdowns.
+        """
+        report = {
+            "averages": self.get_runtimes(),
+            "stages": self.stats.runtime_stages(),
+            "throughput": self.stats.throughput(window),
+            "by": {},
+        }
+        for field in by or []:
+            report["by"][field] = self.stats.page_runtimes_by(field)
+        return report
+
+    def overhead(self):
+        """Get where the node time of each job logged was spent
+
+        New lines of the job logs in ``logdir`` are first read into the stats store.
+
+        Returns:
+            dict: The report of EmopStats.overhead_report.
+        """
+        self.stats.update_runtimes(self.settings.scheduler_logdir, processes=self.settings.stats_processes)
+        return self.stats.overhead_report()
@@ -2,9 +2,12 @@ import json
 import logging
 import signal
 import sys
+import threading
 from emop.lib.emop_base import EmopBase
+from emop.lib.emop_heartbeat import EmopHeartbeat
 from emop.lib.emop_payload import EmopPayload
 from emop.lib.emop_job import EmopJob
+from emop.lib.emop_metrics import metrics
 from emop.lib.emop_scheduler import EmopScheduler
 from emop.lib.processes.tesseract import Tesseract
 from emop.lib.processes.xml_to_text import XML_To_Text
@@ -14,6 +17,7 @@ from emop.lib.processes.page_evaluator import PageEvaluator
 from emop.lib.processes.page_corrector import PageCorrector
 from emop.lib.processes.juxta_compare import JuxtaCompare
 from emop.lib.processes.retas_compare import RetasCompare
+from emop.emop_upload import EmopUpload, EmopUploadThread
 
 logger = logging.getLogger('emop')
 job_ids = []
@@ -34,6 +38,7 @@ def signal_exit(signum, frame):
             instance.jobs_failed.append({"id": job_id, "results": results})
     current_results = instance.get_results()
     instance.payload.save_output(data=current_results, overwrite=True)
+    instance.stop_heartbeat()
     sys.exit(1)
 
 
@@ -50,11 +55,50 @@ class EmopRun(EmopBase):
         self.proc_id = proc_id
         self.payload = EmopPayload(self.settings, proc_id)
         self.scheduler = EmopScheduler.get_scheduler_instance(name=self.settings.scheduler, settings=self.settings)
+        metrics.set_label("job", self.scheduler.job_id)
         self.results = {}
         self.jobs_completed = []
         self.jobs_failed = []
         self.page_results = []
         self.postproc_results = []
+        self.results_lock = threading.Lock()
+        self.upload_thread = None
+        self.heartbeat = None
+
+    def start_heartbeat(self, num_pages):
+        """Start writing this job's progress to its heartbeat file
+
+        Not started when ``heartbeat_interval`` is 0.
+
+        Args:
+            num_pages (int): Number of pages in the job
+        """
+        if self.settings.heartbeat_interval <= 0:
+            return
+        self.heartbeat = EmopHeartbeat(settings=self.settings, proc_id=self.proc_id, job_id=self.scheduler.job_id,
+                                       num_pages=num_pages)
+        self.heartbeat.start()
+
+    def stop_heartbeat(self):
+        if self.heartbeat:
+            self.heartbeat.stop()
+            self.heartbeat = None
+
+    def start_upload_thread(self):
+        """Start uploading completed pages in the background
+
+        Only started when the ``progressive`` upload setting is enabled.
+        """
+        if not self.settings.upload_progressive:
+            return
+        emop_upload = EmopUpload(self.settings.config_path)
+        self.upload_thread = EmopUploadThread(emop_upload=emop_upload, payload=self.payload, get_results=self.copy_results)
+        self.upload_thread.start()
+
+    def stop_upload_thread(self):
+        if self.upload_thread:
+            self.upload_thread.stop()
+            self.upload_thread = None
 
     def append_result(self, job, results, failed=False):
         """Append a page's results to job's results payload
@@ -67,21 +111,27 @@ class EmopRun(EmopBase):
             results (str): The error output of a particular process
             failed (bool, optional): Sets if the result is a failure
         """
-        if failed:
-            results_ext = "%s JOB %s: %s" % (self.scheduler.name, self.scheduler.job_id, results)
-            logger.error(results_ext)
-            self.jobs_failed.append({"id": job.id, "results": results_ext})
-        else:
-            self.jobs_completed.append(job.id)
+        with self.results_lock:
+            if failed:
+                results_ext = "%s JOB %s: %s" % (self.scheduler.name, self.scheduler.job_id, results)
+                logger.error(results_ext)
+                self.jobs_failed.append({"id": job.id, "results": results_ext})
+            else:
+                self.jobs_completed.append(job.id)
+            metrics.inc("emop_pages_total", result="failed" if failed else "completed")
 
-        # TODO: Do we need to handle adding page_results and postproc_results differently??
-        if job.page_result.has_data():
-            self.page_results.append(job.page_result.to_dict())
-        if job.postproc_result.has_data():
-            self.postproc_results.append(job.postproc_result.to_dict())
+            # TODO: Do we need to handle adding page_results and postproc_results differently??
+            if job.page_result.has_data():
+                self.page_results.append(job.page_result.to_dict())
+            if job.postproc_result.has_data():
+                self.postproc_results.append(job.postproc_result.to_dict())
 
         current_results = self.get_results()
         self.payload.save_output(data=current_results, overwrite=True)
+        if self.upload_thread:
+            self.upload_thread.page_done()
+        if self.heartbeat:
+            self.heartbeat.page_done(failed=failed)
 
     def get_results(self):
         """Get this object's results
@@ -101,6 +151,26 @@ class EmopRun(EmopBase):
 
         return data
 
+    def copy_results(self):
+        """Get a copy of this object's results
+
+        The copy is taken while holding the results lock so a page's
+        job_queue is never seen without its page and postproc results.
+
+        Returns:
+            dict: Results to be used as payload to API
+        """
+        with self.results_lock:
+            data = {
+                "job_queues": {
+                    "completed": list(self.jobs_completed),
+                    "failed": list(self.jobs_failed),
+                },
+                "page_results": list(self.page_results),
+                "postproc_results": list(self.postproc_results),
+            }
+        return data
+
     @EmopBase.run_timing
     def do_process(self, obj, job, **kwargs):
         """ Run a process
@@ -120,12 +190,15 @@ class EmopRun(EmopBase):
             bool: True if successful, False otherwise.
         """
         klass = obj.__class__.__name__
+        if self.heartbeat:
+            self.heartbeat.start_stage(klass)
         if self.settings.controller_skip_existing and not obj.should_run():
             logger.info("Skipping %s job [%s]" % (klass, job.id))
             return True
         result = obj.run(**kwargs)
         if result.exitcode != 0:
             err = "%s Failed: %s" % (klass, result.stderr)
+            metrics.inc("emop_stage_failures_total", stage=klass)
             # TODO need to rework so failed doesn't mean done
             self.append_result(job=job, results=err, failed=True)
             return False
@@ -149,16 +222,20 @@ class EmopRun(EmopBase):
             bool: True if successful, False otherwise.
         """
         logger.info(
-            "Got job [%s] - Batch: %s JobType: %s OCR Engine: %s" %
-            (job.id, job.batch_job.name, job.batch_job.job_type, job.batch_job.ocr_engine)
+            "Got job [%s] - Batch: %s JobType: %s OCR Engine: %s BatchID: %s Font: %s" %
+            (job.id, job.batch_job.name, job.batch_job.job_type, job.batch_job.ocr_engine, job.batch_job.id,
+             job.font.name)
         )
 
         # OCR #
+        if self.heartbeat:
+            self.heartbeat.start_stage("OCR")
         ocr_engine = job.batch_job.ocr_engine
         if ocr_engine == "tesseract":
             ocr = Tesseract(job=job)
         else:
             ocr_engine_err = "OCR with %s not yet supported" % ocr_engine
+            metrics.inc("emop_stage_failures_total", stage="OCR")
             self.append_result(job=job, results=ocr_engine_err, failed=True)
             return False
 
@@ -169,6 +246,7 @@ class EmopRun(EmopBase):
 
         if ocr_result.exitcode != 0:
             ocr_err = "%s OCR Failed: %s" % (ocr_engine, ocr_result.stderr)
+            metrics.inc("emop_stage_failures_total", stage="OCR")
             self.append_result(job=job, results=ocr_err, failed=True)
             return False
         else:
@@ -304,10 +382,14 @@ class EmopRun(EmopBase):
             job_ids.append(job["id"])
         instance = self
         signal.signal(signal.SIGUSR1, signal_exit)
+        self.start_upload_thread()
+        self.start_heartbeat(num_pages=len(data))
 
         # Loop over jobs to perform actual work
         for job in data:
             emop_job = EmopJob(job_data=job, settings=self.settings, scheduler=self.scheduler)
+            if self.heartbeat:
+                self.heartbeat.start_page(emop_job.id)
             if emop_job.batch_job.job_type == "ocr":
                 job_succcessful = self.do_job(job=emop_job)
                 if not job_succcessful:
@@ -318,8 +400,14 @@ class EmopRun(EmopBase):
             # elif batch_job.job_type == "ground truth compare":
             else:
                 logger.error("JobType of %s is not yet supported." % emop_job.batch_job.job_type)
+                self.stop_upload_thread()
+                self.stop_heartbeat()
                 return False
 
+        # Remaining results are sent by the upload subcommand
+        self.stop_upload_thread()
+        self.stop_heartbeat()
+
         logger.debug("Payload: \n%s" % json.dumps(self.get_results(), sort_keys=True, indent=4))
         self.payload.save_completed_output(data=self.get_results(), overwrite=force)
         return True
@@ -1,8 +1,25 @@
+import copy
+import heapq
 import json
 import logging
+from multiprocessing.pool import ThreadPool
 from emop.lib.emop_base import EmopBase
+from emop.lib.emop_metrics import metrics
 from emop.lib.emop_payload import EmopPayload
+from emop.lib.emop_runtime_model import EmopRuntimeModel, job_runtime
 from emop.lib.emop_scheduler import EmopScheduler
+from emop.lib.emop_simulator import EmopSimulator
+from emop.lib.emop_stats import EmopStats
+
+#: Settings changes compared by simulate, the current settings are always included
+sim_variants = [
+    ("max_jobs", 0.5),
+    ("max_jobs", 2),
+    ("max_job_runtime", 0.5),
+    ("max_job_runtime", 2),
+    ("min_job_runtime", 0.5),
+    ("min_job_runtime", 2),
+]
 
 logger = logging.getLogger('emop')
 
@@ -17,19 +34,71 @@ class EmopSubmit(EmopBase):
         """
         super(self.__class__, self).__init__(config_path)
         self.scheduler = EmopScheduler.get_scheduler_instance(name=self.settings.scheduler, settings=self.settings)
+        metrics.set_label("job", self.scheduler.job_id)
+        self.stats = EmopStats(self.settings.stats_db)
+        self.runtime_model = None
+        self.runtime_estimate = None
+
+    def estimate_runtimes(self, r_filter):
+        """Build a runtime model from completed jobs' logs
+
+        The page runtimes logged since the previous run are added to the
+        stats store, so only new log lines are read.
 
-    def optimize_submit(self, page_count, running_job_count, sim=False):
+        Args:
+            r_filter (dict): Filter of the pages to be submitted
+
+        Returns:
+            tuple: The EmopRuntimeModel and its EmopRuntimeEstimate for r_filter,
+                the estimate is None if there are too few samples.
+        """
+        self.stats.update_runtimes(self.settings.scheduler_logdir, processes=self.settings.stats_processes)
+        model = EmopRuntimeModel(min_samples=self.settings.runtime_model_min_samples)
+        model.load_stats(self.stats)
+        return model, model.estimate(r_filter)
+
+    def load_runtime_estimate(self, r_filter):
+        """Estimate page runtimes from completed jobs' logs
+
+        Only done if the runtime_model setting is enabled.  The estimate is
+        used by optimize_submit and by the scheduler to set walltimes.
+
+        Args:
+            r_filter (dict): Filter of the pages to be submitted
+
+        Returns:
+            EmopRuntimeEstimate: The estimate, None if not enabled or too few samples.
+        """
+        if not self.settings.runtime_model:
+            return None
+        model, estimate = self.estimate_runtimes(r_filter)
+        if estimate:
+            logger.info("Page runtime estimate from %d %s pages: mean=%0.1fs p50=%0.1fs p90=%0.1fs" %
+                        (estimate.count, estimate.source, estimate.mean, estimate.quantile(0.5),
+                         estimate.quantile(0.9)))
+        else:
+            logger.info("Too few page runtimes for an estimate, using avg_page_runtime")
+            model = None
+        self.runtime_model = model
+        self.runtime_estimate = estimate
+        self.scheduler.runtime_estimate = estimate
+        return estimate
+
+    def optimize_submit(self, page_count, running_job_count, sim=False, job_slots=None):
         """Determine optimal job submission
 
         This function attempts to determine the best number of jobs
         and how many pages per job should be submitted to the scheduler.
 
-        This function does not return a value but sets the num_jobs and
-        pages_per_job attributes.
+        If a runtime_estimate was loaded its mean page runtime is used in
+        place of avg_page_runtime and jobs are limited to the pages that finish
+        within max_job_runtime with probability walltime_probability.
 
         Args:
             page_count (int): Number of pages needing to be processed
             running_job_count (int): Number of active jobs
+            job_slots (int, optional): Number of jobs that may be submitted,
+                defaults to max_jobs less running_job_count.
 
         Returns:
             list: First value is number of jobs and second value
@@ -37,10 +106,19 @@ class EmopSubmit(EmopBase):
         """
         num_jobs = 0
         pages_per_job = 1
-        job_slots_available = int(self.settings.max_jobs - running_job_count)
+        if job_slots is None:
+            job_slots_available = int(self.settings.max_jobs - running_job_count)
+        else:
+            job_slots_available = int(job_slots)
+        if self.runtime_estimate:
+            avg_page_runtime = self.runtime_estimate.mean
+            run_option_b = float(self.runtime_estimate.pages_within(self.settings.max_job_runtime,
+                                                                    self.settings.walltime_probability))
+        else:
+            avg_page_runtime = self.settings.avg_page_runtime
+            run_option_b = float(self.settings.max_job_runtime) / float(avg_page_runtime)
         run_option_a = float(page_count) / float(job_slots_available)
-        run_option_b = float(self.settings.max_job_runtime) / float(self.settings.avg_page_runtime)
-        run_option_c = float(self.settings.min_job_runtime) / float(self.settings.avg_page_runtime)
+        run_option_c = float(self.settings.min_job_runtime) / float(avg_page_runtime)
         logger.debug("JobSlotsAvailable: %s, PageCount: %s" % (job_slots_available, page_count))
         logger.debug("RunOptA: %s , RunOptB: %s, RunOptC: %s" % (run_option_a, run_option_b, run_option_c))
 
@@ -72,7 +150,7 @@ class EmopSubmit(EmopBase):
         if not pages_per_job:
             pages_per_job = 1
 
-        expected_runtime = pages_per_job * self.settings.avg_page_runtime
+        expected_runtime = pages_per_job * avg_page_runtime
         expected_runtime_msg = "Expected job runtime: %s seconds" % expected_runtime
         if sim:
             logger.info(expected_runtime_msg)
@@ -89,13 +167,16 @@ class EmopSubmit(EmopBase):
 
         return num_jobs, pages_per_job
 
-    def reserve(self, num_pages, r_filter):
-        """Reserve pages for a job
+    def reserve_request(self, num_pages, r_filter):
+        """Send a reserve request to the dashboard API
 
-        Reserve page(s) for work by sending PUT request to dashboard API.
+        Args:
+            num_pages (int): Number of pages to reserve
+            r_filter (dict): Filter to apply
 
         Returns:
-            str: The reserved work's proc_id.
+            tuple: The reserved work's proc_id and list of job_queues.
+                The proc_id is empty if no pages were reserved.
         """
         reserve_data = {}
         if r_filter and isinstance(r_filter, dict):
@@ -106,7 +187,7 @@ class EmopSubmit(EmopBase):
         reserve_data["job_queue"] = job_queue
         reserve_request = self.emop_api.put_request("/api/job_queues/reserve", reserve_data)
         if not reserve_request:
-            return ""
+            return "", []
         requested = reserve_request.get('requested')
         reserved = reserve_request.get('reserved')
         proc_id = reserve_request.get('proc_id')
@@ -116,9 +197,215 @@ class EmopSubmit(EmopBase):
 
         if reserved < 1:
             logger.error("No pages reserved")
+            return "", []
+        return proc_id, results
+
+    def reserve(self, num_pages, r_filter):
+        """Reserve pages for a job
+
+        Reserve page(s) for work by sending PUT request to dashboard API.
+
+        Returns:
+            str: The reserved work's proc_id.
+        """
+        proc_id, results = self.reserve_request(num_pages=num_pages, r_filter=r_filter)
+        if not proc_id:
             return ""
 
         self.payload = EmopPayload(self.settings, proc_id)
         self.payload.save_input(results)
 
         return proc_id
+
+    def pack_pages(self, pages, num_jobs):
+        """Split pages into jobs of about equal predicted runtime
+
+        Pages are assigned longest predicted runtime first, each to the
+        job with the least predicted runtime so far.  Without a runtime model
+        the pages are split in order into jobs of equal page counts.
+
+        Args:
+            pages (list): Reserved job_queue dicts
+            num_jobs (int): Number of jobs to split the pages into
+
+        Returns:
+            list: (pages, runtime) tuples, one per non-empty job.  runtime is the
+                job's runtime at walltime_probability, None without a runtime model.
+        """
+        num_jobs = max(1, min(num_jobs, len(pages)))
+        estimates = self.runtime_model.page_estimates(pages) if self.runtime_model else None
+        if not estimates:
+            size = -(-len(pages) // num_jobs)
+            return [(pages[i:(i + size)], None) for i in xrange(0, len(pages), size)]
+
+        loads = [(0.0, j) for j in xrange(num_jobs)]
+        assigned = [[] for j in xrange(num_jobs)]
+        for i in sorted(xrange(len(pages)), key=lambda i: -estimates[i].mean):
+            load, j = heapq.heappop(loads)
+            assigned[j].append(i)
+            heapq.heappush(loads, (load + estimates[i].mean, j))
+
+        jobs = []
+        for indexes in assigned:
+            if not indexes:
+                continue
+            indexes.sort()
+            runtime = job_runtime([estimates[i] for i in indexes], self.settings.walltime_probability)
+            jobs.append(([pages[i] for i in indexes], runtime))
+        return jobs
+
+    def reserve_bulk(self, num_jobs, pages_per_job, r_filter):
+        """Reserve pages for many jobs
+
+        Pages for several jobs are reserved with a single request of up to
+        ``reserve_max_pages`` pages.  The reserved pages are split locally
+        into one payload per job and the payload files are written in parallel.
+
+        When a request covers more than one job each job's proc_id is the
+        dashboard's proc_id with the job's index appended, ``<proc_id>_<index>``,
+        see split_request.  With a runtime model the request's pages are packed
+        into jobs of about equal predicted runtime, see pack_pages.
+
+        Args:
+            num_jobs (int): Number of jobs
+            pages_per_job (int): Number of pages per job
+            r_filter (dict): Filter to apply
+
+        Returns:
+            list: (proc_id, num_pages, runtime) tuples of the reserved jobs,
+                runtime is the job's predicted runtime or None.
+                Empty if no pages could be reserved.
+        """
+        jobs_per_request = max(1, self.settings.reserve_max_pages / pages_per_job)
+        payloads = []
+        jobs_left = num_jobs
+        while jobs_left > 0:
+            request_jobs = min(jobs_per_request, jobs_left)
+            proc_id, results = self.reserve_request(num_pages=(request_jobs * pages_per_job), r_filter=r_filter)
+            if not proc_id:
+                break
+            jobs_left -= request_jobs
+            payloads.extend(self.split_request(proc_id, results, request_jobs, pages_per_job))
+            # Fewer pages than requested means none are left to reserve
+            if len(results) < (request_jobs * pages_per_job):
+                break
+
+        return self.save_payloads(payloads)
+
+    def split_request(self, proc_id, results, num_jobs, pages_per_job):
+        """Split the pages of a reserve request into one payload per job
+
+        The pages are packed into at most num_jobs jobs, so a request for
+        a single job is always one job with the dashboard's proc_id.  Every
+        page keeps the dashboard's proc_id in its ``proc_id`` field.
+
+        Args:
+            proc_id (str): The dashboard's proc_id of the request
+            results (list): Reserved job_queue dicts
+            num_jobs (int): Number of jobs requested
+            pages_per_job (int): Number of pages per job
+
+        Returns:
+            list: (proc_id, pages, runtime) tuples, see pack_pages
+        """
+        for result in results:
+            result["proc_id"] = proc_id
+        jobs = self.pack_pages(results, min(num_jobs, -(-len(results) // pages_per_job)))
+        if num_jobs == 1:
+            return [(proc_id, jobs[0][0], jobs[0][1])]
+        payloads = [("%s_%d" % (proc_id, index), pages, runtime) for index, (pages, runtime) in enumerate(jobs)]
+        logger.info("Reserved proc_id %s as jobs %s" % (proc_id, ", ".join(p[0] for p in payloads)))
+        return payloads
+
+    def save_payloads(self, payloads):
+        """Write the input payload of each job in parallel
+
+        Up to ``write_concurrency`` payload files are written at once.
+
+        Args:
+            payloads (list): (proc_id, pages, runtime) tuples
+
+        Returns:
+            list: (proc_id, num_pages, runtime) tuples of the payloads saved.
+        """
+        if not payloads:
+            return []
+
+        def save_input(payload):
+            proc_id, results, runtime = payload
+            return EmopPayload(self.settings, proc_id).save_input(results)
+
+        pool = ThreadPool(min(self.settings.write_concurrency, len(payloads)))
+        try:
+            saved = pool.map(save_input, payloads)
+        finally:
+            pool.close()
+            pool.join()
+
+        reserved = []
+        for (proc_id, results, runtime), save_status in zip(payloads, saved):
+            if not save_status:
+                logger.error("Failed to save payload for proc_id %s" % proc_id)
+                continue
+            if runtime:
+                logger.info("Job %s has %d pages with predicted runtime %d seconds" % (proc_id, len(results), runtime))
+            reserved.append((proc_id, len(results), runtime))
+        return reserved
+
+    def simulate(self, page_count, running_job_count, r_filter):
+        """Simulate submitting the pending pages with optimize_submit
+
+        The current settings and each of ``sim_variants`` are simulated with
+        EmopSimulator.  Page runtimes are sampled from the completed jobs' logs,
+        or are avg_page_runtime if there are too few.
+
+        Args:
+            page_count (int): Number of pages needing to be processed
+            running_job_count (int): Number of active jobs
+            r_filter (dict): Filter of the pages to be submitted
+
+        Returns:
+            list: (name, stats) tuples, see EmopSimulator.run
+        """
+        estimate = self.runtime_estimate
+        if not estimate:
+            model, estimate = self.estimate_runtimes(r_filter)
+        if estimate:
+            page_runtimes = estimate.runtimes
+            logger.info("Simulating with %d %s page runtimes" % (estimate.count, estimate.source))
+        else:
+            page_runtimes = [self.settings.avg_page_runtime]
+            logger.info("Simulating with avg_page_runtime of %s seconds" % self.settings.avg_page_runtime)
+
+        variants = [("current", None, None)]
+        for name, factor in sim_variants:
+            variants.append(("%s x%s" % (name, factor), name, factor))
+
+        results = []
+        for label, name, factor in variants:
+            variant = copy.copy(self)
+            variant.settings = copy.copy(self.settings)
+            if name:
+                setattr(variant.settings, name, max(1, int(getattr(self.settings, name) * factor)))
+            variant.scheduler = copy.copy(self.scheduler)
+            variant.scheduler.settings = variant.settings
+
+            def walltime(num_pages, variant=variant):
+                if variant.settings.scheduler_set_walltime:
+                    return variant.scheduler.walltime(num_pages)
+                return variant.settings.max_job_runtime
+
+            simulator = EmopSimulator(
+                page_runtimes=page_runtimes,
+                max_jobs=variant.settings.max_jobs,
+                queue_wait=self.settings.sim_queue_wait,
+                submit_interval=self.settings.sim_submit_interval,
+                max_job_runtime=variant.settings.max_job_runtime,
+                job_overhead=self.settings.job_overhead,
+                signal_lead_time=self.settings.signal_lead_time,
+                seed=0,
+            )
+            stats = simulator.run_many(self.settings.sim_runs, page_count, running_job_count,
+                                       strategy=variant.optimize_submit, walltime=walltime)
+            results.append((label, stats))
+        return results
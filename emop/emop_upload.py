@@ -2,8 +2,11 @@ import glob
 import json
 import logging
 import os
+import threading
 from emop.lib.emop_base import EmopBase
+from emop.lib.emop_metrics import metrics
 from emop.lib.emop_payload import EmopPayload
+from emop.lib.emop_scheduler import EmopScheduler
 
 logger = logging.getLogger('emop')
 
@@ -12,6 +15,8 @@ class EmopUpload(EmopBase):
 
     def __init__(self, config_path):
         super(self.__class__, self).__init__(config_path)
+        self.scheduler = EmopScheduler.get_scheduler_instance(name=self.settings.scheduler, settings=self.settings)
+        metrics.set_label("job", self.scheduler.job_id)
 
     def upload(self, data):
         # TODO Validate data?
@@ -24,6 +29,154 @@ class EmopUpload(EmopBase):
         logger.debug("Returned data: \n%s" % json.dumps(upload_request, sort_keys=True, indent=4))
         return upload_request
 
+    def get_page_ids(self, payload):
+        """Map job_queue IDs to page IDs
+
+        The output payload does not record which page a job_queue belongs to,
+        so the mapping is taken from the proc_id's input payload.
+
+        Args:
+            payload (EmopPayload): EmopPayload object
+
+        Returns:
+            dict: job_queue ID to page ID.  Empty if the input payload is missing.
+        """
+        if not payload.input_exists():
+            return {}
+        input_data = payload.load_input()
+        if not input_data:
+            return {}
+        page_ids = {}
+        for job in input_data:
+            page_ids[job["id"]] = job["page"]["id"]
+        return page_ids
+
+    def get_units(self, data, page_ids):
+        """Split a payload into units that must be uploaded together
+
+        Each unit holds one job_queue and the page_results and postproc_results
+        for that job_queue's page.  Results whose page does not belong to
+        any job_queue become their own unit.
+
+        Args:
+            data (dict): Output payload data
+            page_ids (dict): job_queue ID to page ID
+
+        Returns:
+            list: (key, data) tuples in payload order.
+        """
+        units = []
+        units_by_page = {}
+        job_queues = data.get("job_queues", {})
+
+        def new_unit(key, page_id):
+            unit = {
+                "job_queues": {"completed": [], "failed": []},
+                "page_results": [],
+                "postproc_results": [],
+            }
+            units.append((key, unit))
+            if page_id is not None:
+                units_by_page[page_id] = unit
+            return unit
+
+        for job_id in job_queues.get("completed", []):
+            unit = new_unit(job_id, page_ids.get(job_id))
+            unit["job_queues"]["completed"].append(job_id)
+        for failed in job_queues.get("failed", []):
+            unit = new_unit(failed["id"], page_ids.get(failed["id"]))
+            unit["job_queues"]["failed"].append(failed)
+        for results_key in ["page_results", "postproc_results"]:
+            for result in data.get(results_key, []):
+                page_id = result.get("page_id")
+                unit = units_by_page.get(page_id)
+                if unit is None:
+                    unit = new_unit("page-%s" % page_id, page_id)
+                unit[results_key].append(result)
+        return units
+
+    def get_chunks(self, units):
+        """Pack units into chunks bounded by page count and size
+
+        The bounds are the ``chunk_pages`` and ``chunk_bytes`` upload settings.
+        A unit larger than ``chunk_bytes`` is sent in a chunk by itself.
+
+        Args:
+            units (list): (key, data) tuples from get_units
+
+        Returns:
+            list: (keys, data) tuples, one per upload request.
+        """
+        max_pages = self.settings.upload_chunk_pages
+        max_bytes = self.settings.upload_chunk_bytes
+        chunks = []
+        keys = []
+        chunk = None
+        chunk_bytes = 0
+        for key, unit in units:
+            unit_bytes = len(json.dumps(unit))
+            if chunk is not None:
+                full_pages = max_pages and len(keys) >= max_pages
+                full_bytes = max_bytes and (chunk_bytes + unit_bytes) > max_bytes
+                if full_pages or full_bytes:
+                    chunks.append((keys, chunk))
+                    chunk = None
+            if chunk is None:
+                keys = []
+                chunk = {
+                    "job_queues": {"completed": [], "failed": []},
+                    "page_results": [],
+                    "postproc_results": [],
+                }
+                chunk_bytes = 0
+            keys.append(key)
+            chunk["job_queues"]["completed"] += unit["job_queues"]["completed"]
+            chunk["job_queues"]["failed"] += unit["job_queues"]["failed"]
+            chunk["page_results"] += unit["page_results"]
+            chunk["postproc_results"] += unit["postproc_results"]
+            chunk_bytes += unit_bytes
+        if chunk is not None:
+            chunks.append((keys, chunk))
+        return chunks
+
+    def upload_chunks(self, data, payload):
+        """Upload a payload in chunks
+
+        Progress is saved after each chunk so that a later upload of the
+        same proc_id only sends the chunks that previously failed.
+
+        If the job_queues cannot be matched to their pages the payload
+        is sent as a single request.
+
+        Args:
+            data (dict): Output payload data
+            payload (EmopPayload): EmopPayload object for the proc_id
+
+        Returns:
+            bool: True if every chunk was uploaded, False otherwise.
+        """
+        page_ids = self.get_page_ids(payload)
+        if not page_ids:
+            logger.debug("EmopUpload: No input payload for proc_id %s, uploading as a single request" % payload.proc_id)
+            return bool(self.upload(data))
+
+        uploaded = payload.load_upload_progress()
+        units = [u for u in self.get_units(data, page_ids) if u[0] not in uploaded]
+        chunks = self.get_chunks(units)
+        failed = 0
+        for i, (keys, chunk) in enumerate(chunks, start=1):
+            logger.debug("EmopUpload: Uploading chunk %d of %d for proc_id %s" % (i, len(chunks), payload.proc_id))
+            if not self.upload(chunk):
+                failed += 1
+                continue
+            uploaded += keys
+            payload.save_upload_progress(uploaded)
+
+        if failed:
+            logger.error("EmopUpload: %d of %d chunks failed to upload for proc_id %s" % (failed, len(chunks), payload.proc_id))
+            return False
+        return True
+
     def upload_proc_id(self, proc_id):
         payload = EmopPayload(self.settings, proc_id)
         if payload.completed_output_exists():
@@ -49,10 +202,11 @@ class EmopUpload(EmopBase):
         with open(filename_path) as datafile:
             data = json.load(datafile)
 
-        uploaded = self.upload(data)
+        uploaded = self.upload_chunks(data, payload)
         if uploaded:
             logger.info("Successfully uploaded payload file %s" % filename_path)
             payload.save_uploaded_output(data)
+            payload.remove_upload_progress()
             return True
         else:
             return False
@@ -70,3 +224,78 @@ class EmopUpload(EmopBase):
 
         # TODO handle failure of individual files
         return True
+
+
+class EmopUploadThread(threading.Thread):
+
+    def __init__(self, emop_upload, payload, get_results):
+        """ Initialize EmopUploadThread object and attributes
+
+        The thread uploads results while a job is still running.  An upload
+        happens once ``progressive_pages`` pages have completed or when
+        ``progressive_interval`` seconds pass with pages waiting.
+
+        Uploads go through EmopUpload.upload_chunks so the upload progress
+        file is shared with the final upload, which then only sends
+        what is left.
+
+        Args:
+            emop_upload (EmopUpload): EmopUpload instance used to send results
+            payload (EmopPayload): EmopPayload object of the running job
+            get_results (callable): Returns a consistent copy of the job's results
+        """
+        super(EmopUploadThread, self).__init__(name="EmopUploadThread")
+        self.daemon = True
+        self.emop_upload = emop_upload
+        self.payload = payload
+        self.get_results = get_results
+        self.pages = emop_upload.settings.upload_progressive_pages
+        self.interval = emop_upload.settings.upload_progressive_interval
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+
+    def page_done(self):
+        """Record a completed page and wake the thread if enough are waiting"""
+        with self.lock:
+            self.pending += 1
+            pending = self.pending
+        if pending >= self.pages:
+            self.wake.set()
+
+    def stop(self):
+        """Stop the thread and wait for any upload in progress to finish"""
+        self.stopping.set()
+        self.wake.set()
+        self.join()
+
+    def flush(self):
+        """Upload all results not yet sent
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = 0
+        if not pending:
+            return True
+        logger.debug("EmopUploadThread: Uploading results for %d pages" % pending)
+        uploaded = self.emop_upload.upload_chunks(self.get_results(), self.payload)
+        if not uploaded:
+            # Keep the count so the failed pages are retried on the next wake up
+            with self.lock:
+                self.pending += pending
+        return uploaded
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopping.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("EmopUploadThread: Failed to upload results: %s" % e)
@@ -1,14 +1,16 @@
 import json
 import logging
 import requests
+import time
 from urlparse import urljoin
+from emop.lib.emop_metrics import metrics
 
 logger = logging.getLogger('emop')
 
 
 class EmopAPI(object):
 
-    def __init__(self, url_base, api_headers):
+    def __init__(self, url_base, api_headers, retries=0, retry_delay=1):
         """ Initialize EmopAPI object and attributes
 
         Args:
@@ -16,9 +18,56 @@ class EmopAPI(object):
                 Example: "http://emop-dashboard.tamu.edu"
             api_headers (dict): The HTTP headers to use for API
                 requests such as Content-Type and Authorization.
+            retries (int, optional): Number of times a failed GET request is retried.
+                PUT requests are never retried as they are not idempotent.
+            retry_delay (int or float, optional): Seconds to wait before the first retry,
+                doubled for each further retry.
         """
         self.url_base = url_base
         self.api_headers = api_headers
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def send_request(self, method, url_path, retries, **kwargs):
+        """Send a request and record its metrics
+
+        Failed requests, those that raise or return a 5xx status,
+        are retried up to ``retries`` times.
+
+        Args:
+            method (str): HTTP method
+            url_path (str): The API URL path excluding hostname.
+            retries (int): Number of times to retry a failed request
+            **kwargs: Arguments passed to requests.request
+
+        Returns:
+            Response: The requests Response of the last attempt.
+        """
+        full_url = urljoin(self.url_base, url_path)
+        request_bytes = len(kwargs.get('data') or '')
+        attempt = 0
+        start = time.time()
+        while True:
+            try:
+                response = requests.request(method, full_url, headers=self.api_headers, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if attempt < retries:
+                    logger.warning("%s %s failed with error %s, retrying" % (method, full_url, e))
+                    time.sleep(self.retry_delay * (2 ** attempt))
+                    attempt += 1
+                    continue
+                metrics.record_api_call(method, url_path, request_bytes, 0, time.time() - start,
+                                        e.__class__.__name__, attempt)
+                raise
+            if response.status_code >= 500 and attempt < retries:
+                logger.warning("%s %s failed with error code %s, retrying" % (method, full_url, response.status_code))
+                time.sleep(self.retry_delay * (2 ** attempt))
+                attempt += 1
+                continue
+            break
+        metrics.record_api_call(method, url_path, request_bytes, len(response.content), time.time() - start,
+                                response.status_code, attempt)
+        return response
 
     def get_request(self, url_path, params={}):
         """Sends a GET request
@@ -38,7 +87,7 @@ class EmopAPI(object):
         logger.debug("Sending GET request to %s" % full_url)
         if params:
             logger.debug("GET request params: %s" % str(params))
-        get_r = requests.get(full_url, params=params, headers=self.api_headers)
+        get_r = self.send_request("GET", url_path, self.retries, params=params)
 
         if get_r.status_code == requests.codes.ok:
             json_data = get_r.json()
@@ -63,7 +112,7 @@ class EmopAPI(object):
         logger.debug("Sending PUT request to %s" % full_url)
         if data:
             logger.debug("PUT request data: %s" % str(data))
-        put_r = requests.put(full_url, data=json.dumps(data), headers=self.api_headers)
+        put_r = self.send_request("PUT", url_path, 0, data=json.dumps(data))
 
         if put_r.status_code == requests.codes.ok:
             json_data = put_r.json()
@@ -5,6 +5,7 @@ import logging.config
 import time
 from emop.lib.emop_settings import EmopSettings
 from emop.lib.emop_api import EmopAPI
+from emop.lib.emop_metrics import metrics
 # from emop.lib.emop_stdlib import EmopStdlib
 
 logger = logging.getLogger('emop')
@@ -14,7 +15,10 @@ class EmopBase(object):
 
     def __init__(self, config_path):
         self.settings = EmopSettings(config_path)
-        self.emop_api = EmopAPI(self.settings.url_base, self.settings.api_headers)
+        self.emop_api = EmopAPI(self.settings.url_base, self.settings.api_headers,
+                                retries=self.settings.api_retries, retry_delay=self.settings.api_retry_delay)
+        metrics.configure(log_filename=self.settings.metrics_log, textfile_path=self.settings.metrics_textfile_path,
+                          textfile_interval=self.settings.metrics_textfile_interval)
         os.environ['EMOP_HOME'] = self.settings.emop_home
 
         logging_level = getattr(logging, self.settings.log_level)
@@ -66,6 +70,7 @@ class EmopBase(object):
             if not ret:
                 return ret
             elapsed = time.time() - start
+            metrics.observe("emop_stage_duration_seconds", elapsed, metrics.stage_buckets, stage=name)
             if name == "Total":
                 logger.info("TOTAL TIME: %0.3f" % elapsed)
             else:
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import time
+from emop.lib.utilities import mkdirs_exists_ok
+
+logger = logging.getLogger('emop')
+
+
+class EmopCache(object):
+
+    def __init__(self, path, name):
+        """ Initialize EmopCache object and attributes
+
+        A small JSON file cache whose values expire after a TTL.
+        Values are stored with the time they were set.
+
+        Args:
+            path (str): Directory that holds cache files
+            name (str): Name of this cache, used as the file name
+        """
+        self.path = path
+        self.filename = os.path.join(path, "%s.json" % name)
+
+    def load(self):
+        if not os.path.isfile(self.filename):
+            return {}
+        try:
+            with open(self.filename) as datafile:
+                return json.load(datafile)
+        except (IOError, ValueError) as e:
+            logger.debug("Ignoring unreadable cache file %s: %s" % (self.filename, e))
+            return {}
+
+    def get(self, key, ttl):
+        """Get a cached value
+
+        Args:
+            key (str): Cache key
+            ttl (int): Maximum age in seconds of the value
+
+        Returns:
+            object: The cached value, None if missing or expired.
+        """
+        entry = self.load().get(key)
+        if not entry:
+            return None
+        if (time.time() - entry["time"]) > ttl:
+            logger.debug("Cache %s entry %s expired" % (self.filename, key))
+            return None
+        return entry["value"]
+
+    def set(self, key, value):
+        """Set a cached value
+
+        The cache file is replaced atomically so concurrent readers
+        never see a partially written file.
+
+        Args:
+            key (str): Cache key
+            value (object): JSON serializable value
+        """
+        data = self.load()
+        data[key] = {"time": time.time(), "value": value}
+        mkdirs_exists_ok(self.path)
+        tmp_filename = "%s.%s.tmp" % (self.filename, os.getpid())
+        with open(tmp_filename, 'w') as outfile:
+            json.dump(data, outfile)
+        os.rename(tmp_filename, self.filename)
@@ -0,0 +1,373 @@
+"""Stand-in for the emop-dashboard API
+
+Implements the parts of the emop-dashboard API used by the controller
+against a local SQLite page queue so that submit, run and upload can
+be tested and benchmarked without the live dashboard.
+
+Example, serving 1000 pending pages with 50ms latency and 1% errors:
+
+    python -m emop.lib.emop_fake_dashboard --port 8000 --pages 1000 --latency 0.05 --error-rate 0.01
+
+Then set ``url_base = http://127.0.0.1:8000`` in the [dashboard] section
+of the config file.
+"""
+import argparse
+import BaseHTTPServer
+import datetime
+import json
+import logging
+import random
+import SocketServer
+import sqlite3
+import threading
+import time
+from urlparse import urlparse, parse_qs
+
+logger = logging.getLogger('emop')
+
+#: job_status IDs and names as defined by the emop-dashboard
+JOB_STATUSES = [
+    (1, "Not Started"),
+    (2, "Processing"),
+    (3, "Pending Postprocess"),
+    (4, "Postprocessing"),
+    (5, "Done"),
+    (6, "Failed"),
+]
+NOT_STARTED = 1
+PROCESSING = 2
+DONE = 5
+FAILED = 6
+
+#: job_queue columns that may be used as filters
+FILTER_COLUMNS = ["batch_id", "work_id", "page_id", "job_status_id"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_queues (
+    id INTEGER PRIMARY KEY,
+    batch_id INTEGER,
+    work_id INTEGER,
+    page_id INTEGER,
+    page_number INTEGER,
+    font_name TEXT,
+    job_status_id INTEGER,
+    proc_id TEXT,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS job_queues_status ON job_queues (job_status_id, batch_id);
+CREATE TABLE IF NOT EXISTS page_results (
+    page_id INTEGER,
+    batch_id INTEGER,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS postproc_results (
+    page_id INTEGER,
+    batch_job_id INTEGER,
+    data TEXT
+);
+"""
+
+
+class EmopFakeDashboardServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class EmopFakeDashboardHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        logger.debug("EmopFakeDashboard: %s" % (format % args))
+
+    def send_json(self, status, data):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        dashboard = self.server.dashboard
+        url = urlparse(self.path)
+        params = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        data = {}
+        length = int(self.headers.getheader("Content-Length") or 0)
+        if length:
+            try:
+                data = json.loads(self.rfile.read(length))
+            except ValueError:
+                self.send_json(400, {"error": "Invalid JSON"})
+                return
+
+        route = dashboard.routes.get((method, url.path))
+        if not route:
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        status, response = dashboard.dispatch(url.path, route, params, data)
+        self.send_json(status, response)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+
+class EmopFakeDashboard(object):
+
+    def __init__(self, db_path=":memory:", host="127.0.0.1", port=0, latency=0, error_rate=0, seed=None):
+        """ Initialize EmopFakeDashboard object and attributes
+
+        Args:
+            db_path (str): Path to the SQLite page queue.  Defaults to an in-memory database.
+            host (str): Address to listen on
+            port (int): Port to listen on, 0 picks a free port
+            latency (float): Seconds to wait before answering each request
+            error_rate (float): Fraction of requests answered with HTTP 500
+            seed (int, optional): Seed for the error injection random generator
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.last_proc_id = None
+        #: Number of requests received per API path
+        self.request_counts = {}
+        self.routes = {
+            ("GET", "/api/job_statuses"): self.job_statuses,
+            ("GET", "/api/batch_jobs"): self.batch_jobs,
+            ("GET", "/api/job_queues/count"): self.job_queues_count,
+            ("PUT", "/api/job_queues/reserve"): self.job_queues_reserve,
+            ("PUT", "/api/batch_jobs/upload_results"): self.upload_results,
+        }
+        self.server = EmopFakeDashboardServer((host, port), EmopFakeDashboardHandler)
+        self.server.dashboard = self
+        self.thread = None
+
+    @property
+    def url_base(self):
+        host, port = self.server.server_address
+        return "http://%s:%s" % (host, port)
+
+    def start(self):
+        """Serve requests from a background thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05},
+                                       name="EmopFakeDashboard")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def add_pages(self, num_pages, batch_id=1, work_id=1, font_name="Fake Font"):
+        """Add Not Started pages to the page queue
+
+        Args:
+            num_pages (int): Number of pages to add
+            batch_id (int): batch_job ID of the pages
+            work_id (int): work ID of the pages
+            font_name (str): Font name of the batch_job
+        """
+        with self.lock:
+            cursor = self.db.execute("SELECT COALESCE(MAX(page_id), 0) FROM job_queues")
+            first_page_id = cursor.fetchone()[0] + 1
+            rows = []
+            for i in xrange(num_pages):
+                rows.append((batch_id, work_id, first_page_id + i, i + 1, font_name, NOT_STARTED))
+            self.db.executemany(
+                "INSERT INTO job_queues (batch_id, work_id, page_id, page_number, font_name, job_status_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+
+    def count(self, job_status_id):
+        """Count job_queues with a job_status
+
+        Args:
+            job_status_id (int): job_status ID
+
+        Returns:
+            int: Number of job_queues
+        """
+        with self.lock:
+            cursor = self.db.execute("SELECT COUNT(*) FROM job_queues WHERE job_status_id = ?", (job_status_id,))
+            return cursor.fetchone()[0]
+
+    def dispatch(self, path, route, params, data):
+        with self.lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 500, {"error": "Injected error"}
+        return route(params, data)
+
+    def get_where(self, q_filter):
+        clauses = []
+        values = []
+        for column in FILTER_COLUMNS:
+            if column in q_filter:
+                clauses.append("%s = ?" % column)
+                values.append(int(q_filter[column]))
+        if not clauses:
+            return "1", values
+        return " AND ".join(clauses), values
+
+    def new_proc_id(self):
+        proc_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")[:-3]
+        if self.last_proc_id and int(proc_id) <= int(self.last_proc_id):
+            proc_id = str(int(self.last_proc_id) + 1)
+        self.last_proc_id = proc_id
+        return proc_id
+
+    def job_statuses(self, params, data):
+        results = []
+        for job_status_id, name in JOB_STATUSES:
+            if params.get("name") and params["name"] != name:
+                continue
+            results.append({"id": job_status_id, "name": name})
+        return 200, {"results": results}
+
+    def batch_jobs(self, params, data):
+        with self.lock:
+            cursor = self.db.execute("SELECT DISTINCT batch_id FROM job_queues ORDER BY batch_id")
+            rows = cursor.fetchall()
+        results = [{"id": row["batch_id"], "name": "Fake Batch %d" % row["batch_id"]} for row in rows]
+        return 200, {"results": results}
+
+    def job_queues_count(self, params, data):
+        where, values = self.get_where(params)
+        with self.lock:
+            cursor = self.db.execute("SELECT COUNT(*) FROM job_queues WHERE %s" % where, values)
+            count = cursor.fetchone()[0]
+        return 200, {"job_queue": {"count": count}}
+
+    def job_queues_reserve(self, params, data):
+        job_queue = dict(data.get("job_queue", {}))
+        num_pages = int(job_queue.pop("num_pages", 1))
+        job_queue["job_status_id"] = NOT_STARTED
+        where, values = self.get_where(job_queue)
+        with self.lock:
+            proc_id = self.new_proc_id()
+            cursor = self.db.execute("SELECT * FROM job_queues WHERE %s ORDER BY id LIMIT ?" % where, values + [num_pages])
+            rows = cursor.fetchall()
+            self.db.executemany(
+                "UPDATE job_queues SET job_status_id = ?, proc_id = ? WHERE id = ?",
+                [(PROCESSING, proc_id, row["id"]) for row in rows])
+            self.db.commit()
+        response = {
+            "requested": num_pages,
+            "reserved": len(rows),
+            "proc_id": proc_id,
+            "results": [self.job_data(row, proc_id) for row in rows],
+        }
+        return 200, response
+
+    def upload_results(self, params, data):
+        job_queues = data.get("job_queues", {})
+        completed = job_queues.get("completed", [])
+        failed = job_queues.get("failed", [])
+        page_results = data.get("page_results", [])
+        postproc_results = data.get("postproc_results", [])
+        with self.lock:
+            self.db.executemany(
+                "UPDATE job_queues SET job_status_id = ? WHERE id = ?",
+                [(DONE, job_id) for job_id in completed])
+            self.db.executemany(
+                "UPDATE job_queues SET job_status_id = ?, results = ? WHERE id = ?",
+                [(FAILED, f.get("results"), f["id"]) for f in failed])
+            self.db.executemany(
+                "INSERT INTO page_results (page_id, batch_id, data) VALUES (?, ?, ?)",
+                [(r.get("page_id"), r.get("batch_id"), json.dumps(r)) for r in page_results])
+            self.db.executemany(
+                "INSERT INTO postproc_results (page_id, batch_job_id, data) VALUES (?, ?, ?)",
+                [(r.get("page_id"), r.get("batch_job_id"), json.dumps(r)) for r in postproc_results])
+            self.db.commit()
+        response = {
+            "job_queues": {"completed": len(completed), "failed": len(failed)},
+            "page_results": len(page_results),
+            "postproc_results": len(postproc_results),
+        }
+        return 200, response
+
+    def job_data(self, row, proc_id):
+        """Build a reserved job_queue in the format returned by the emop-dashboard"""
+        work_directory = "/data/eebo/fake/%d" % row["work_id"]
+        work = {
+            "id": row["work_id"],
+            "wks_organizational_unit": 0,
+            "wks_title": "Fake Work %d" % row["work_id"],
+            "wks_ecco_number": None,
+            "wks_ecco_directory": None,
+            "wks_eebo_image_id": str(row["work_id"]),
+            "wks_eebo_directory": work_directory,
+        }
+        data = {
+            "id": row["id"],
+            "proc_id": proc_id,
+            "results": None,
+            "status": {"id": PROCESSING, "name": "Processing"},
+            "tries": 0,
+            "batch_job": {
+                "id": row["batch_id"],
+                "name": "Fake Batch %d" % row["batch_id"],
+                "notes": "",
+                "parameters": "",
+                "job_type": {"id": 2, "name": "OCR"},
+                "ocr_engine": {"id": 2, "name": "Tesseract"},
+                "font": {"id": 1, "font_name": row["font_name"]},
+            },
+            "page": {
+                "id": row["page_id"],
+                "pg_ref_number": row["page_number"],
+                "pg_image_path": "%s/%05d.000.001.tif" % (work_directory, row["page_number"]),
+                "pg_gale_ocr_file": None,
+                "pg_ground_truth_file": None,
+                "work": work,
+            },
+            "work": work,
+            "page_result": None,
+            "postproc_result": None,
+        }
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for the emop-dashboard API")
+    parser.add_argument('--host', dest='host', action='store', default='127.0.0.1', type=str,
+                        help='address to listen on')
+    parser.add_argument('--port', dest='port', action='store', default=8000, type=int,
+                        help='port to listen on')
+    parser.add_argument('--db', dest='db_path', action='store', default=':memory:', type=str,
+                        help='path to SQLite page queue')
+    parser.add_argument('--pages', dest='pages', action='store', default=0, type=int,
+                        help='number of Not Started pages to add')
+    parser.add_argument('--batch-id', dest='batch_id', action='store', default=1, type=int,
+                        help='batch_job ID of added pages')
+    parser.add_argument('--latency', dest='latency', action='store', default=0, type=float,
+                        help='seconds to wait before answering each request')
+    parser.add_argument('--error-rate', dest='error_rate', action='store', default=0, type=float,
+                        help='fraction of requests answered with HTTP 500')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
+    dashboard = EmopFakeDashboard(db_path=args.db_path, host=args.host, port=args.port,
+                                  latency=args.latency, error_rate=args.error_rate)
+    if args.pages:
+        dashboard.add_pages(args.pages, batch_id=args.batch_id)
+    logger.info("Serving fake emop-dashboard at %s" % dashboard.url_base)
+    try:
+        dashboard.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
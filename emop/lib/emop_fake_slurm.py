@@ -0,0 +1,346 @@
+"""Stand-in for the SLURM commands used by the controller
+
+Implements enough of ``sbatch``, ``squeue``, ``sacct`` and ``sinfo`` against
+a local SQLite job table to test and benchmark submission without a cluster.
+Jobs do not run, their queue wait, runtime and memory use are drawn at
+submission and their state follows from the current time.
+
+The wrappers in tests/fake_slurm call this module, put them first on PATH
+to use them:
+
+    PATH=$PWD/tests/fake_slurm:$PATH ./emop.py submit
+
+Settings are read from environment variables:
+
+    EMOP_FAKE_SLURM_DB          Job table, defaults to emop_fake_slurm.db in the temp directory
+    EMOP_FAKE_SLURM_QUEUE_WAIT  Mean seconds jobs wait before starting, default 0
+    EMOP_FAKE_SLURM_RUNTIME     Mean job runtime in seconds, default 60
+    EMOP_FAKE_SLURM_MAX_RSS     Mean job memory use in MB, default 2000
+    EMOP_FAKE_SLURM_FAIL_RATE   Fraction of jobs that exit with an error, default 0
+    EMOP_FAKE_SLURM_CPUS        CPUs in the partition, default 16
+"""
+import argparse
+import heapq
+import os
+import random
+import re
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    array_job_id INTEGER,
+    array_task_id INTEGER,
+    name TEXT,
+    partition TEXT,
+    comment TEXT,
+    user TEXT,
+    mem_per_cpu INTEGER,
+    cpus INTEGER,
+    time_limit INTEGER,
+    submit_time REAL,
+    start_time REAL,
+    runtime REAL,
+    max_rss INTEGER,
+    exit_code INTEGER
+);
+"""
+
+format_re = re.compile(r"%\.?-?\d*([a-zA-Z])")
+
+#: squeue column headers of the format tokens
+squeue_headers = {
+    "i": "JOBID", "A": "ARRAY_JOB_ID", "K": "ARRAY_TASK_ID", "T": "STATE", "t": "ST", "r": "REASON",
+    "M": "TIME", "l": "TIME_LIMIT", "N": "NODELIST", "j": "NAME", "k": "COMMENT", "P": "PARTITION",
+    "u": "USER", "R": "NODELIST(REASON)", "D": "NODES", "C": "CPUS",
+}
+
+
+def parse_time(value):
+    """Convert a SLURM --time value to seconds
+
+    Accepts minutes, minutes:seconds, hours:minutes:seconds, days-hours,
+    days-hours:minutes and days-hours:minutes:seconds.
+
+    Returns:
+        int: Seconds, None if unlimited.
+    """
+    if value in ("UNLIMITED", "INFINITE", "-1"):
+        return None
+    days = 0
+    if "-" in value:
+        days, value = value.split("-", 1)
+        parts = [int(p) for p in value.split(":")]
+        parts = (parts + [0, 0])[:3]
+        return int(days) * 86400 + parts[0] * 3600 + parts[1] * 60 + parts[2]
+    parts = [int(p) for p in value.split(":")]
+    if len(parts) == 1:
+        return parts[0] * 60
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def format_time(seconds):
+    if seconds is None:
+        return "UNLIMITED"
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return "%d-%02d:%02d:%02d" % (days, hours, minutes, seconds)
+    return "%02d:%02d:%02d" % (hours, minutes, seconds)
+
+
+class EmopFakeSLURM(object):
+
+    def __init__(self, db_path=None, queue_wait=None, runtime=None, max_rss=None, fail_rate=None, cpus=None,
+                 seed=None):
+        """ Initialize EmopFakeSLURM object and attributes
+
+        Arguments not given are read from the EMOP_FAKE_SLURM_* environment variables.
+
+        Args:
+            db_path (str, optional): Path of the SQLite job table
+            queue_wait (float, optional): Mean seconds jobs wait before starting
+            runtime (float, optional): Mean job runtime in seconds
+            max_rss (int, optional): Mean job memory use in MB
+            fail_rate (float, optional): Fraction of jobs that exit with an error
+            cpus (int, optional): CPUs in the partition
+            seed (int, optional): Random seed
+        """
+        env = os.environ.get
+        default_db_path = os.path.join(tempfile.gettempdir(), "emop_fake_slurm.db")
+        self.db_path = db_path or env("EMOP_FAKE_SLURM_DB") or default_db_path
+        self.queue_wait = float(queue_wait if queue_wait is not None else env("EMOP_FAKE_SLURM_QUEUE_WAIT", 0))
+        self.runtime = float(runtime if runtime is not None else env("EMOP_FAKE_SLURM_RUNTIME", 60))
+        self.max_rss = int(max_rss if max_rss is not None else env("EMOP_FAKE_SLURM_MAX_RSS", 2000))
+        self.fail_rate = float(fail_rate if fail_rate is not None else env("EMOP_FAKE_SLURM_FAIL_RATE", 0))
+        self.cpus = int(cpus if cpus is not None else env("EMOP_FAKE_SLURM_CPUS", 16))
+        self.random = random.Random(seed)
+        self.hostname = socket.gethostname()
+        self.conn = sqlite3.connect(self.db_path, timeout=60)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def state(self, job, now):
+        """Get a job's state at a time
+
+        Returns:
+            tuple: The state, pending reason, seconds elapsed and end time or None.
+        """
+        if now < job["start_time"]:
+            return "PENDING", "Priority", 0, None
+        runtime = job["runtime"]
+        if job["time_limit"] is not None:
+            runtime = min(runtime, job["time_limit"])
+        end = job["start_time"] + runtime
+        if now < end:
+            return "RUNNING", "None", now - job["start_time"], None
+        if job["time_limit"] is not None and job["runtime"] > job["time_limit"]:
+            state = "TIMEOUT"
+        elif job["max_rss"] > job["mem_per_cpu"] * job["cpus"] * 1024:
+            state = "OUT_OF_MEMORY"
+        elif job["exit_code"]:
+            state = "FAILED"
+        else:
+            state = "COMPLETED"
+        return state, "None", runtime, end
+
+    def sbatch(self, argv):
+        """Submit a job or job array
+
+        Returns:
+            tuple: Output and exit code
+        """
+        parser = argparse.ArgumentParser(prog="sbatch", add_help=False)
+        parser.add_argument('--parsable', action='store_true')
+        parser.add_argument('-p', '--partition', default="normal")
+        parser.add_argument('-J', '--job-name', dest='name', default="sbatch")
+        parser.add_argument('-o', '--output')
+        parser.add_argument('--mem-per-cpu', type=int, default=4000)
+        parser.add_argument('--cpus-per-task', type=int, default=1)
+        parser.add_argument('-t', '--time')
+        parser.add_argument('-a', '--array')
+        parser.add_argument('--comment', default="")
+        parser.add_argument('script', nargs='?')
+        args, unknown = parser.parse_known_args(argv)
+
+        time_limit = parse_time(args.time) if args.time else None
+        tasks = [None]
+        throttle = None
+        if args.array:
+            array_range = args.array
+            if "%" in array_range:
+                array_range, throttle = array_range.split("%", 1)
+                throttle = int(throttle)
+            first, last = array_range.split("-") if "-" in array_range else (array_range, array_range)
+            tasks = range(int(first), int(last) + 1)
+
+        now = time.time()
+        slots = [now] * throttle if throttle else None
+        array_job_id = None
+        for task in tasks:
+            start = now + (self.random.expovariate(1.0 / self.queue_wait) if self.queue_wait else 0)
+            runtime = self.random.uniform(0.5, 1.5) * self.runtime
+            if slots is not None:
+                start = max(start, heapq.heappop(slots))
+                heapq.heappush(slots, start + (min(runtime, time_limit) if time_limit else runtime))
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (array_job_id, array_task_id, name, partition, comment, user, mem_per_cpu, cpus, "
+                "time_limit, submit_time, start_time, runtime, max_rss, exit_code) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (array_job_id, task, args.name, args.partition, args.comment, os.environ.get("USER", "emop"),
+                 args.mem_per_cpu, args.cpus_per_task, time_limit, now, start, runtime,
+                 int(self.random.uniform(0.5, 1.5) * self.max_rss * 1024),
+                 int(self.random.random() < self.fail_rate))
+            )
+            if task is not None and array_job_id is None:
+                array_job_id = cursor.lastrowid
+                self.conn.execute("UPDATE jobs SET array_job_id = ? WHERE id = ?", (array_job_id, array_job_id))
+        self.conn.commit()
+        job_id = array_job_id or cursor.lastrowid
+        if args.parsable:
+            return "%s\n" % job_id, 0
+        return "Submitted batch job %s\n" % job_id, 0
+
+    def job_ids(self, job):
+        """Get a job's ID as shown by squeue and sacct, its job ID and its array task ID"""
+        if job["array_task_id"] is None:
+            return str(job["id"]), str(job["id"]), "N/A"
+        return ("%s_%s" % (job["array_job_id"], job["array_task_id"]), str(job["array_job_id"]),
+                str(job["array_task_id"]))
+
+    def squeue(self, argv):
+        """List pending and running jobs
+
+        Array tasks are always listed individually, as with ``-r``.
+
+        Returns:
+            tuple: Output and exit code
+        """
+        parser = argparse.ArgumentParser(prog="squeue", add_help=False)
+        parser.add_argument('-r', '--array', action='store_true')
+        parser.add_argument('-h', '--noheader', action='store_true')
+        parser.add_argument('-p', '--partition')
+        parser.add_argument('-n', '--name')
+        parser.add_argument('-o', '--format', default="%.18i %.9P %.8j %.8u %.8T %.10M %.9l %R")
+        args, unknown = parser.parse_known_args(argv)
+
+        now = time.time()
+        lines = []
+        if not args.noheader:
+            lines.append(format_re.sub(lambda m: squeue_headers.get(m.group(1), ""), args.format))
+        for job in self.conn.execute("SELECT * FROM jobs ORDER BY id"):
+            if args.partition and job["partition"] != args.partition:
+                continue
+            if args.name and job["name"] != args.name:
+                continue
+            state, reason, elapsed, end = self.state(job, now)
+            if state not in ("PENDING", "RUNNING"):
+                continue
+            display_id, job_id, task_id = self.job_ids(job)
+            node = self.hostname if state == "RUNNING" else ""
+            fields = {
+                "i": display_id, "A": job_id, "K": task_id, "T": state, "t": state[:2], "r": reason,
+                "M": format_time(elapsed), "l": format_time(job["time_limit"]), "N": node, "j": job["name"],
+                "k": job["comment"] or "(null)", "P": job["partition"], "u": job["user"],
+                "R": node if state == "RUNNING" else "(%s)" % reason, "D": "1", "C": str(job["cpus"]),
+            }
+            lines.append(format_re.sub(lambda m: fields.get(m.group(1), ""), args.format))
+        return "".join(line + "\n" for line in lines), 0
+
+    def sacct(self, argv):
+        """List job accounting records
+
+        Unless ``-X`` is given each job is followed by its ``.batch`` step,
+        which, as with SLURM, is the record with MaxRSS and TotalCPU.
+
+        Returns:
+            tuple: Output and exit code
+        """
+        parser = argparse.ArgumentParser(prog="sacct", add_help=False)
+        parser.add_argument('-n', '--noheader', action='store_true')
+        parser.add_argument('-P', '--parsable2', action='store_true')
+        parser.add_argument('-X', '--allocations', action='store_true')
+        parser.add_argument('--name')
+        parser.add_argument('-S', '--starttime')
+        parser.add_argument('-o', '--format', default="JobID,JobName,Partition,State,ExitCode")
+        args, unknown = parser.parse_known_args(argv)
+        fields = args.format.split(",")
+        separator = "|" if args.parsable2 else " "
+
+        now = time.time()
+        lines = []
+        if not args.noheader:
+            lines.append(separator.join(fields))
+        for job in self.conn.execute("SELECT * FROM jobs ORDER BY id"):
+            if args.name and job["name"] != args.name:
+                continue
+            state, reason, elapsed, end = self.state(job, now)
+            display_id = self.job_ids(job)[0]
+            exit_code = {"FAILED": "1:0", "OUT_OF_MEMORY": "0:125", "TIMEOUT": "0:0"}.get(state, "0:0")
+            record = {
+                "JobID": display_id, "JobName": job["name"], "Partition": job["partition"], "State": state,
+                "ExitCode": exit_code, "Elapsed": format_time(elapsed), "Timelimit": format_time(job["time_limit"]),
+                "Comment": job["comment"], "NodeList": self.hostname if state != "PENDING" else "None assigned",
+                "ReqMem": "%sMc" % job["mem_per_cpu"], "AllocCPUS": str(job["cpus"]), "MaxRSS": "",
+                "TotalCPU": "", "Submit": format_timestamp(job["submit_time"]),
+                "Start": format_timestamp(job["start_time"]) if state != "PENDING" else "Unknown",
+                "End": format_timestamp(end) if end else "Unknown",
+            }
+            lines.append(separator.join(record.get(f, "") for f in fields))
+            if args.allocations or state in ("PENDING", "RUNNING"):
+                continue
+            record.update({
+                "JobID": "%s.batch" % display_id, "JobName": "batch",
+                "MaxRSS": "%sK" % min(job["max_rss"], job["mem_per_cpu"] * job["cpus"] * 1024),
+                "TotalCPU": format_time(elapsed * 0.9),
+            })
+            lines.append(separator.join(record.get(f, "") for f in fields))
+        return "".join(line + "\n" for line in lines), 0
+
+    def sinfo(self, argv):
+        """Report the partition's CPUs as allocated/idle/other/total
+
+        Returns:
+            tuple: Output and exit code
+        """
+        now = time.time()
+        allocated = 0
+        for job in self.conn.execute("SELECT * FROM jobs"):
+            if self.state(job, now)[0] == "RUNNING":
+                allocated += job["cpus"]
+        allocated = min(allocated, self.cpus)
+        return "%d/%d/0/%d\n" % (allocated, self.cpus - allocated, self.cpus), 0
+
+
+def format_timestamp(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    commands = ["sbatch", "squeue", "sacct", "sinfo"]
+    if not argv or argv[0] not in commands:
+        sys.stderr.write("usage: python -m emop.lib.emop_fake_slurm {%s} [args]\n" % ",".join(commands))
+        return 2
+    slurm = EmopFakeSLURM()
+    try:
+        output, exitcode = getattr(slurm, argv[0])(argv[1:])
+    finally:
+        slurm.close()
+    sys.stdout.write(output)
+    return exitcode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
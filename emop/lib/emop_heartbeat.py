@@ -0,0 +1,141 @@
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from emop.lib.utilities import mkdirs_exists_ok
+
+logger = logging.getLogger('emop')
+
+
+def heartbeat_filename(settings, proc_id):
+    return os.path.join(settings.heartbeat_path, "%s.json" % proc_id)
+
+
+def load_heartbeats(settings):
+    """Load the progress files of all jobs
+
+    Files that can not be read, such as one being replaced, are skipped.
+
+    Returns:
+        dict: The status dict of each job by proc_id.
+    """
+    heartbeats = {}
+    for filename in glob.glob(os.path.join(settings.heartbeat_path, "*.json")):
+        try:
+            with open(filename) as f:
+                status = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug("Unable to read heartbeat %s: %s" % (filename, e))
+            continue
+        heartbeats[status["proc_id"]] = status
+    return heartbeats
+
+
+class EmopHeartbeat(threading.Thread):
+
+    def __init__(self, settings, proc_id, job_id, num_pages):
+        """ Initialize EmopHeartbeat object and attributes
+
+        The thread writes the progress of a running job to its heartbeat
+        file every ``heartbeat_interval`` seconds.  Each write replaces the
+        file atomically so readers never see a partial file.  The file is
+        removed when the job stops.
+
+        Args:
+            settings (EmopSettings): Application settings
+            proc_id (str or int): proc-id of the job
+            job_id (str): The scheduler's job ID
+            num_pages (int): Number of pages in the job
+        """
+        super(EmopHeartbeat, self).__init__(name="EmopHeartbeat")
+        self.daemon = True
+        self.filename = heartbeat_filename(settings, proc_id)
+        self.interval = settings.heartbeat_interval
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.page_started = None
+        self.page_times = 0.0
+        self.status = {
+            "proc_id": str(proc_id),
+            "job_id": job_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "num_pages": num_pages,
+            "pages_done": 0,
+            "pages_failed": 0,
+            "page": None,
+            "stage": None,
+            "stage_started": None,
+            "started": time.time(),
+            "updated": None,
+            "mean_page_time": None,
+            "eta": None,
+        }
+
+    def start_page(self, page_id):
+        with self.lock:
+            self.page_started = time.time()
+            self.status["page"] = page_id
+
+    def start_stage(self, stage):
+        with self.lock:
+            self.status["stage"] = stage
+            self.status["stage_started"] = time.time()
+
+    def page_done(self, failed=False):
+        """Record a finished page and predict when the job finishes
+
+        The finish time is predicted from the mean time of the pages done so far.
+
+        Args:
+            failed (bool, optional): Sets if the page failed
+        """
+        now = time.time()
+        with self.lock:
+            if failed:
+                self.status["pages_failed"] += 1
+            else:
+                self.status["pages_done"] += 1
+            if self.page_started is not None:
+                self.page_times += now - self.page_started
+                self.page_started = None
+            finished = self.status["pages_done"] + self.status["pages_failed"]
+            self.status["mean_page_time"] = self.page_times / finished
+            remaining = max(0, self.status["num_pages"] - finished)
+            self.status["eta"] = now + remaining * self.status["mean_page_time"]
+            self.status["page"] = None
+            self.status["stage"] = None
+            self.status["stage_started"] = None
+
+    def get_status(self):
+        with self.lock:
+            return dict(self.status)
+
+    def write(self):
+        """Replace the heartbeat file with the current status"""
+        status = self.get_status()
+        status["updated"] = time.time()
+        mkdirs_exists_ok(os.path.dirname(self.filename))
+        tmp_filename = "%s.%d.tmp" % (self.filename, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            json.dump(status, f, sort_keys=True)
+        os.rename(tmp_filename, self.filename)
+
+    def stop(self):
+        """Stop the thread and remove the heartbeat file"""
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.write()
+            except (IOError, OSError) as e:
+                logger.error("EmopHeartbeat: Failed to write %s: %s" % (self.filename, e))
+            self.stopping.wait(self.interval)
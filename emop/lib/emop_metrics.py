@@ -0,0 +1,337 @@
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from emop.lib.utilities import mkdirs_exists_ok
+
+logger = logging.getLogger('emop')
+
+#: Type and help text of the metrics written to the textfile
+textfile_metrics = {
+    "emop_pages_total": ("counter", "Pages finished by the run command, by result"),
+    "emop_stage_duration_seconds": ("histogram", "Seconds spent in each stage of a page or job"),
+    "emop_stage_failures_total": ("counter", "Pages that failed, by the stage that failed"),
+    "emop_api_requests_total": ("counter", "API requests sent, by HTTP status of the last attempt"),
+    "emop_api_request_duration_seconds": ("histogram", "Seconds spent on API requests including retries"),
+    "emop_api_sent_bytes_total": ("counter", "Bytes of API request bodies sent"),
+    "emop_api_received_bytes_total": ("counter", "Bytes of API response bodies received"),
+    "emop_payload_written_bytes_total": ("counter", "Bytes of payload files written"),
+    "emop_denoise_relabel_iterations_total": ("counter", "Denoise relabeling iterations, summed over columns"),
+    "emop_denoise_averaged_words_total": ("counter", "Neighbor label averages computed by Denoise relabeling"),
+    "emop_denoise_scored_words_total": ("counter", "Words scored by the Denoise network during relabeling"),
+}
+
+
+def format_labels(labels):
+    """Format labels as a Prometheus label set
+
+    Args:
+        labels (tuple): Sorted (name, value) pairs
+
+    Returns:
+        str: Labels like ``{host="c0101",job="1"}``.
+    """
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        escaped.append('%s="%s"' % (name, value))
+    return "{%s}" % ",".join(escaped)
+
+
+class EmopMetrics(object):
+
+    #: Upper bounds in seconds of the API latency histogram buckets
+    latency_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+    #: Upper bounds in seconds of the stage duration histogram buckets
+    stage_buckets = [1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600]
+
+    def __init__(self):
+        """ Initialize EmopMetrics object and attributes
+
+        Collects measurements for the current process.  A single
+        instance, ``metrics``, is shared by the whole application.
+
+        Attributes:
+            api_calls (list): One dict per API request sent
+            log_filename (str): Path of the structured metrics log,
+                None disables writing the log.
+            textfile_path (str): Directory the Prometheus textfile is
+                written to, None disables writing it.
+            labels (dict): Labels of every metric in the textfile
+        """
+        self.lock = threading.Lock()
+        self.textfile_lock = threading.Lock()
+        self.api_calls = []
+        self.log_filename = None
+        self.hostname = socket.gethostname()
+        self.textfile_path = None
+        self.textfile_interval = 0
+        self.textfile_written = 0
+        self.labels = {"host": self.hostname, "job": "", "command": ""}
+        self.counters = {}
+        self.histograms = {}
+
+    def configure(self, log_filename, textfile_path=None, textfile_interval=0):
+        self.log_filename = log_filename
+        self.textfile_path = textfile_path
+        self.textfile_interval = textfile_interval
+
+    def set_label(self, name, value):
+        with self.lock:
+            self.labels[name] = value if value is not None else ""
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter of the textfile
+
+        Args:
+            name (str): A key of ``textfile_metrics``
+            value (int or float, optional): Amount to add
+            **labels: Labels of the counter in addition to ``labels``
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.write_textfile()
+
+    def observe(self, name, value, buckets, **labels):
+        """Add a measurement to a histogram of the textfile
+
+        Args:
+            name (str): A key of ``textfile_metrics``
+            value (float): The measurement
+            buckets (list): Upper bounds of the histogram's buckets
+            **labels: Labels of the histogram in addition to ``labels``
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets),
+                                                    "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self.write_textfile()
+
+    def record_api_call(self, method, endpoint, request_bytes, response_bytes, latency, status, retries):
+        """Record an API request
+
+        Args:
+            method (str): HTTP method
+            endpoint (str): API URL path excluding hostname and params
+            request_bytes (int): Size of the request body
+            response_bytes (int): Size of the response body
+            latency (float): Seconds spent on the request including retries
+            status (int or str): HTTP status code of the last attempt,
+                or the exception name if the request raised
+            retries (int): Number of attempts after the first
+        """
+        record = {
+            "method": method,
+            "endpoint": endpoint,
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "latency": latency,
+            "status": status,
+            "retries": retries,
+            "time": time.time(),
+        }
+        with self.lock:
+            self.api_calls.append(record)
+        self.inc("emop_api_requests_total", method=method, endpoint=endpoint, status=status)
+        self.inc("emop_api_sent_bytes_total", request_bytes, method=method, endpoint=endpoint)
+        self.inc("emop_api_received_bytes_total", response_bytes, method=method, endpoint=endpoint)
+        self.observe("emop_api_request_duration_seconds", latency, self.latency_buckets, method=method,
+                     endpoint=endpoint)
+
+    def api_summary(self):
+        """Summarize the recorded API requests per endpoint
+
+        Returns:
+            list: One dict per method and endpoint with count, errors, retries,
+                latency totals, percentiles and histogram bucket counts.
+        """
+        with self.lock:
+            api_calls = list(self.api_calls)
+        groups = {}
+        for call in api_calls:
+            groups.setdefault((call["method"], call["endpoint"]), []).append(call)
+
+        summary = []
+        for (method, endpoint), calls in sorted(groups.items()):
+            latencies = sorted(c["latency"] for c in calls)
+            buckets = []
+            for bound in self.latency_buckets:
+                buckets.append((bound, len([latency for latency in latencies if latency <= bound])))
+            buckets.append(("+Inf", len(latencies)))
+            summary.append({
+                "method": method,
+                "endpoint": endpoint,
+                "count": len(calls),
+                "errors": len([c for c in calls if c["status"] != 200]),
+                "retries": sum(c["retries"] for c in calls),
+                "request_bytes": sum(c["request_bytes"] for c in calls),
+                "response_bytes": sum(c["response_bytes"] for c in calls),
+                "latency_total": sum(latencies),
+                "latency_p50": self.percentile(latencies, 50),
+                "latency_p90": self.percentile(latencies, 90),
+                "latency_max": latencies[-1],
+                "buckets": buckets,
+            })
+        return summary
+
+    @staticmethod
+    def percentile(values, pct):
+        """Nearest-rank percentile of sorted values
+
+        Args:
+            values (list): Sorted values
+            pct (int or float): Percentile between 0 and 100
+
+        Returns:
+            float: The percentile, 0 if values is empty.
+        """
+        if not values:
+            return 0
+        rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+        return values[max(0, min(rank, len(values) - 1))]
+
+    def format_api_summary(self):
+        """Format the API summary for printing
+
+        Returns:
+            list: Lines of text, empty if no API requests were sent.
+        """
+        lines = []
+        for s in self.api_summary():
+            lines.append(
+                "API %s %s: count=%d errors=%d retries=%d bytes_sent=%d bytes_received=%d "
+                "total=%0.3fs p50=%0.3fs p90=%0.3fs max=%0.3fs" %
+                (s["method"], s["endpoint"], s["count"], s["errors"], s["retries"], s["request_bytes"],
+                 s["response_bytes"], s["latency_total"], s["latency_p50"], s["latency_p90"], s["latency_max"])
+            )
+            histogram = " ".join("le%s=%d" % (bound, count) for bound, count in s["buckets"])
+            lines.append("API %s %s: histogram %s" % (s["method"], s["endpoint"], histogram))
+        return lines
+
+    def write_log(self, command):
+        """Append this process' API requests to the structured metrics log
+
+        Each line of the log is a JSON object.
+
+        Args:
+            command (str): The emop.py subcommand that was run
+        """
+        if not self.log_filename:
+            return
+        with self.lock:
+            api_calls = list(self.api_calls)
+        if not api_calls:
+            return
+        mkdirs_exists_ok(os.path.dirname(self.log_filename))
+        lines = []
+        for call in api_calls:
+            record = {"type": "api_call", "command": command, "host": self.hostname, "pid": os.getpid()}
+            record.update(call)
+            lines.append(json.dumps(record, sort_keys=True))
+        with open(self.log_filename, 'a') as logfile:
+            logfile.write("\n".join(lines) + "\n")
+
+    def format_textfile(self):
+        """Format the counters and histograms in the Prometheus text format
+
+        Returns:
+            list: Lines of text, empty if nothing was measured.
+        """
+        with self.lock:
+            common = self.labels.items()
+            samples = {}
+            for (name, labels), value in self.counters.items():
+                samples.setdefault(name, []).append((name, tuple(sorted(common + list(labels))), value))
+            for (name, labels), histogram in self.histograms.items():
+                labels = common + list(labels)
+                lines = samples.setdefault(name, [])
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(("%s_bucket" % name, tuple(sorted(labels + [("le", bound)])), count))
+                lines.append(("%s_bucket" % name, tuple(sorted(labels + [("le", "+Inf")])), histogram["count"]))
+                lines.append(("%s_sum" % name, tuple(sorted(labels)), histogram["sum"]))
+                lines.append(("%s_count" % name, tuple(sorted(labels)), histogram["count"]))
+
+        lines = []
+        for name in sorted(samples):
+            metric_type, help_text = textfile_metrics[name]
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, metric_type))
+            for sample, labels, value in sorted(samples[name]):
+                lines.append("%s%s %s" % (sample, format_labels(labels), repr(float(value))))
+        return lines
+
+    def textfile_filename(self):
+        """Get the path of this process' textfile
+
+        Each command and job writes its own file so jobs sharing a node do not
+        replace each other's metrics.
+
+        Returns:
+            str: Path of the textfile.
+        """
+        name = "emop-%s-%s.prom" % (self.labels["command"] or "emop", self.labels["job"] or os.getpid())
+        return os.path.join(self.textfile_path, name)
+
+    def write_textfile(self, force=False):
+        """Replace the Prometheus textfile with the current metrics
+
+        The file is written at most once every ``textfile_interval``
+        seconds unless forced, and never by two threads at once.  It is
+        written to a temporary file first and renamed so the node exporter
+        never reads a partial file.
+
+        Args:
+            force (bool, optional): Write even if written within the interval
+        """
+        if not self.textfile_path:
+            return
+        if not force and time.time() - self.textfile_written < self.textfile_interval:
+            return
+        if not self.textfile_lock.acquire(False):
+            return
+        try:
+            self.textfile_written = time.time()
+            lines = self.format_textfile()
+            if not lines:
+                return
+            filename = self.textfile_filename()
+            mkdirs_exists_ok(self.textfile_path)
+            tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+            with open(tmp_filename, 'w') as textfile:
+                textfile.write("\n".join(lines) + "\n")
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError) as e:
+            logger.error("Failed to write metrics textfile in %s: %s" % (self.textfile_path, e))
+        finally:
+            self.textfile_lock.release()
+
+    def report(self, command):
+        """Log the API summary and write the metrics log
+
+        Intended to be called once at the end of each emop.py subcommand.
+        The textfile is also written a last time.
+
+        Args:
+            command (str): The emop.py subcommand that was run
+        """
+        for line in self.format_api_summary():
+            logger.info(line)
+        try:
+            self.write_log(command)
+        except (IOError, OSError) as e:
+            logger.error("Failed to write metrics log %s: %s" % (self.log_filename, e))
+        self.write_textfile(force=True)
+
+
+metrics = EmopMetrics()
@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+from emop.lib.emop_metrics import metrics
 from emop.lib.utilities import mkdirs_exists_ok
 
 logger = logging.getLogger('emop')
@@ -19,6 +20,7 @@ class EmopPayload(object):
         self.output_filename = os.path.join(self.output_path, "%s.json" % self.proc_id)
         self.completed_output_filename = os.path.join(self.completed_output_path, "%s.json" % self.proc_id)
         self.uploaded_output_filename = os.path.join(self.uploaded_output_path, "%s.json" % self.proc_id)
+        self.upload_progress_filename = os.path.join(self.uploaded_output_path, "%s.progress" % self.proc_id)
 
     def file_exists(self, filename):
         if os.path.isfile(filename):
@@ -50,6 +52,7 @@ class EmopPayload(object):
 
         with open(filename, 'w') as outfile:
             json.dump(data, outfile)
+            metrics.inc("emop_payload_written_bytes_total", outfile.tell())
         return True
 
     def load(self, filename):
@@ -97,6 +100,34 @@ class EmopPayload(object):
                 os.remove(self.output_filename)
         return save_status
 
+    def load_upload_progress(self):
+        """Load the keys of result units already uploaded for this proc_id
+
+        Returns:
+            list: Keys of the uploaded units, empty if no
+                upload has been attempted.
+        """
+        if not os.path.isfile(self.upload_progress_filename):
+            return []
+        data = self.load(filename=self.upload_progress_filename)
+        return data.get("uploaded", [])
+
+    def save_upload_progress(self, uploaded):
+        dirname = self.uploaded_output_path
+        filename = self.upload_progress_filename
+        # Write to a temporary file first so an interrupted write never
+        # leaves a truncated progress file behind
+        tmp_filename = "%s.tmp" % filename
+        save_status = self.save(data={"uploaded": uploaded}, dirname=dirname, filename=tmp_filename, overwrite=True)
+        if save_status:
+            os.rename(tmp_filename, filename)
+        return save_status
+
+    def remove_upload_progress(self):
+        if os.path.isfile(self.upload_progress_filename):
+            logger.debug("Removing upload progress file %s" % self.upload_progress_filename)
+            os.remove(self.upload_progress_filename)
+
     def load_input(self):
         filename = self.input_filename
         data = self.load(filename=filename)
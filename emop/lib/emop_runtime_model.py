@@ -0,0 +1,202 @@
+import logging
+import math
+
+logger = logging.getLogger('emop')
+
+
+def normal_quantile(probability):
+    """Quantile of the standard normal distribution
+
+    Found by bisection of the normal CDF.
+
+    Args:
+        probability (float): Probability between 0 and 1 exclusive
+
+    Returns:
+        float: The z value whose CDF equals probability.
+    """
+    low, high = -10.0, 10.0
+    for _ in xrange(100):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < probability:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def job_runtime(estimates, probability):
+    """Runtime a job of differing pages finishes within with the given probability
+
+    Like EmopRuntimeEstimate.job_runtime but each page has its own estimate.
+
+    Args:
+        estimates (list): EmopRuntimeEstimate of each page
+        probability (float): Target completion probability
+
+    Returns:
+        float: The job runtime in seconds.
+    """
+    if not estimates:
+        return 0
+    mean = sum(e.mean for e in estimates)
+    std = math.sqrt(sum(e.std ** 2 for e in estimates))
+    runtime = mean + normal_quantile(probability) * std
+    return max(runtime, max(e.quantile(probability) for e in estimates))
+
+
+class EmopRuntimeEstimate(object):
+
+    def __init__(self, runtimes, source):
+        """ Initialize EmopRuntimeEstimate object and attributes
+
+        Page runtime statistics of a set of samples.
+
+        Args:
+            runtimes (list): Page runtimes in seconds
+            source (str): Which samples were used, such as "batch_id=16"
+        """
+        self.runtimes = sorted(runtimes)
+        self.source = source
+        self.count = len(self.runtimes)
+        self.mean = float(sum(self.runtimes)) / self.count
+        variance = sum((r - self.mean) ** 2 for r in self.runtimes) / self.count
+        self.std = math.sqrt(variance)
+
+    def quantile(self, probability):
+        """Nearest-rank quantile of the page runtimes
+
+        Args:
+            probability (float): Probability between 0 and 1
+
+        Returns:
+            float: The page runtime in seconds.
+        """
+        rank = int(math.ceil(probability * self.count)) - 1
+        return self.runtimes[max(0, min(rank, self.count - 1))]
+
+    def job_runtime(self, num_pages, probability):
+        """Runtime a job finishes within with the given probability
+
+        The sum of the pages' runtimes is approximated as normally distributed.
+        A job is never given less than the same quantile of a single page.
+
+        Args:
+            num_pages (int): Number of pages in the job
+            probability (float): Target completion probability
+
+        Returns:
+            float: The job runtime in seconds.
+        """
+        num_pages = int(num_pages)
+        runtime = num_pages * self.mean + normal_quantile(probability) * self.std * math.sqrt(num_pages)
+        return max(runtime, self.quantile(probability))
+
+    def pages_within(self, runtime, probability):
+        """Largest number of pages whose job_runtime fits in runtime
+
+        Args:
+            runtime (int): Job runtime in seconds
+            probability (float): Target completion probability
+
+        Returns:
+            int: Number of pages, at least 1.
+        """
+        z = max(normal_quantile(probability), 0)
+        # Solve num_pages * mean + z * std * sqrt(num_pages) = runtime for sqrt(num_pages)
+        b = z * self.std
+        if not self.mean:
+            return 1
+        root = (-b + math.sqrt(b * b + 4 * self.mean * runtime)) / (2 * self.mean)
+        return max(1, int(root * root))
+
+
+class EmopRuntimeModel(object):
+
+    def __init__(self, min_samples=20):
+        """ Initialize EmopRuntimeModel object and attributes
+
+        Page runtimes recorded by completed jobs, grouped by batch and font.
+
+        Attributes:
+            samples (list): (runtime, batch_id, font) tuples
+
+        Args:
+            min_samples (int): Fewest samples used to estimate a group's runtimes.
+                Groups with fewer samples fall back to a broader group.
+        """
+        self.min_samples = min_samples
+        self.samples = []
+        self.batch_estimates = {}
+
+    def add_sample(self, runtime, batch_id=None, font=None):
+        self.samples.append((float(runtime), batch_id, font))
+
+    def load_stats(self, stats):
+        """Add the page runtimes stored by EmopStats
+
+        Pages without a "Got job" line giving their batch and font are only
+        used for the overall estimate.
+
+        Args:
+            stats (EmopStats): The store, updated from the job logs by the caller
+        """
+        for runtime, batch_id, font in stats.page_samples():
+            self.add_sample(runtime, batch_id=batch_id, font=font)
+        logger.debug("Runtime model loaded %d page runtimes from %s" % (len(self.samples), stats.path))
+
+    def estimate(self, r_filter=None, font=None):
+        """Estimate page runtimes for the pages matching a filter
+
+        The samples from the filter's batches are used if there are enough, then the
+        samples of those batches' fonts, then all samples.
+
+        Args:
+            r_filter (dict, optional): The job_queue filter, only batch_id is used
+            font (str, optional): Font of the filter's batches, when known
+
+        Returns:
+            EmopRuntimeEstimate: The estimate, None if there are too few samples.
+        """
+        batch_ids = (r_filter or {}).get("batch_id")
+        if batch_ids is not None:
+            if not isinstance(batch_ids, list):
+                batch_ids = [batch_ids]
+            batch_ids = set(str(b) for b in batch_ids)
+            batch_samples = [s for s in self.samples if s[1] in batch_ids]
+            if len(batch_samples) >= self.min_samples:
+                return EmopRuntimeEstimate([s[0] for s in batch_samples], "batch_id=%s" % ",".join(sorted(batch_ids)))
+            fonts = set(s[2] for s in batch_samples if s[2])
+            if font:
+                fonts.add(font)
+            font_samples = [s for s in self.samples if s[2] in fonts]
+            if fonts and len(font_samples) >= self.min_samples:
+                return EmopRuntimeEstimate([s[0] for s in font_samples], "font=%s" % ",".join(sorted(fonts)))
+        if len(self.samples) >= self.min_samples:
+            return EmopRuntimeEstimate([s[0] for s in self.samples], "all")
+        return None
+
+    def page_estimates(self, pages):
+        """Estimate the runtime of each page
+
+        Pages are estimated by their batch, see estimate.
+
+        Args:
+            pages (list): job_queue dicts as returned by the reserve API
+
+        Returns:
+            list: EmopRuntimeEstimate of each page, None if there are too few samples.
+        """
+        estimates = []
+        for page in pages:
+            batch_job = page.get("batch_job", {})
+            batch_id = batch_job.get("id")
+            if batch_id not in self.batch_estimates:
+                r_filter = {"batch_id": batch_id} if batch_id is not None else None
+                font = batch_job.get("font", {}).get("font_name")
+                self.batch_estimates[batch_id] = self.estimate(r_filter, font=font)
+            estimate = self.batch_estimates[batch_id]
+            if estimate is None:
+                return None
+            estimates.append(estimate)
+        return estimates
@@ -1,8 +1,24 @@
+import collections
 import logging
+import math
 import os
+import time
 
 logger = logging.getLogger('emop')
 
+#: A job in the scheduler's queue.  state uses SLURM's names, such as RUNNING
+#: and PENDING, elapsed and time_limit are seconds or None if unknown.
+EmopSchedulerJob = collections.namedtuple(
+    'EmopSchedulerJob', ['job_id', 'state', 'reason', 'elapsed', 'time_limit', 'node', 'name', 'proc_id']
+)
+
+#: The accounting record of a job.  elapsed, time_limit and total_cpu are
+#: seconds, max_rss and req_mem (per CPU) are MB, any may be None if unknown.
+EmopSchedulerAccounting = collections.namedtuple(
+    'EmopSchedulerAccounting', ['job_id', 'state', 'exit_code', 'elapsed', 'time_limit', 'max_rss', 'total_cpu',
+                                'alloc_cpus', 'req_mem', 'end_time', 'proc_id']
+)
+
 
 class EmopScheduler(object):
 
@@ -10,6 +26,7 @@ class EmopScheduler(object):
     #: To add a new scheduler this dict must be updated.
     supported_schedulers = {
         "slurm": {"module": "emop.lib.schedulers.emop_slurm", "class": "EmopSLURM"},
+        "local": {"module": "emop.lib.schedulers.emop_local", "class": "EmopLocal"},
     }
 
     #: The name of the scheduler must be defined in a child class.
@@ -25,6 +42,9 @@ class EmopScheduler(object):
             name (str): Name of the scheduler, defined in a child class.
             job_id (str or int): Current job ID and the value is determined
                 by environment variable list defined in a child class.
+            runtime_estimate (EmopRuntimeEstimate): Page runtimes used for walltimes,
+                None to use avg_page_runtime.
+            snapshot_jobs (list): Jobs returned by the last get_jobs, see snapshot.
 
         Args:
             settings (object): EmopSettings instance
@@ -32,6 +52,9 @@ class EmopScheduler(object):
         self.settings = settings
         self.name = self.get_name()
         self.job_id = self.get_job_id()
+        self.runtime_estimate = None
+        self.snapshot_jobs = None
+        self.snapshot_time = 0
 
     @classmethod
     def get_scheduler_instance(cls, name, settings):
@@ -62,12 +85,77 @@ class EmopScheduler(object):
             logger.error("Unsupported scheduler %s" % name)
             raise NotImplementedError
 
-    def current_job_count(self):
+    def get_jobs(self):
         raise NotImplementedError
 
-    def submit_job(self, proc_id, num_pages):
+    def get_accounting(self, start):
+        """Get the accounting records of this application's jobs
+
+        Args:
+            start (float): Only jobs pending, running or ended since this Unix time
+
+        Returns:
+            list: EmopSchedulerAccounting of each job, None if the query failed.
+        """
         raise NotImplementedError
 
+    def snapshot(self):
+        """Get this application's jobs in the scheduler's queue
+
+        The scheduler is queried at most once every ``snapshot_ttl`` seconds,
+        everything needing the queue's state should use this.
+
+        Returns:
+            list: EmopSchedulerJob of each job
+        """
+        if self.snapshot_jobs is None or (time.time() - self.snapshot_time) > self.settings.scheduler_snapshot_ttl:
+            self.snapshot_jobs = self.get_jobs()
+            self.snapshot_time = time.time()
+        return self.snapshot_jobs
+
+    def clear_snapshot(self):
+        self.snapshot_jobs = None
+
+    def current_job_count(self):
+        """Get count of this application's active jobs
+
+        The current jobs are those that are Running+Pending.
+
+        Returns:
+            int: The number of current jobs
+        """
+        return len(self.snapshot())
+
+    def submit_job(self, proc_id, num_pages, runtime=None):
+        raise NotImplementedError
+
+    def available_job_slots(self):
+        """Get the number of new jobs that should be submitted
+
+        Schedulers able to see the cluster's state may override this.
+
+        Returns:
+            int: Number of jobs, max_jobs less the current jobs.
+        """
+        return max(0, self.settings.max_jobs - self.current_job_count())
+
+    def submit_jobs(self, jobs):
+        """Submit many jobs
+
+        Schedulers able to submit many jobs at once should override this.
+
+        Args:
+            jobs (list): (proc_id, num_pages, runtime) tuples, see submit_job
+
+        Returns:
+            int: Number of jobs submitted.
+        """
+        submitted = 0
+        for proc_id, num_pages, runtime in jobs:
+            if self.submit_job(proc_id=proc_id, num_pages=num_pages, runtime=runtime):
+                submitted += 1
+        return submitted
+
     def is_job_environment(self):
         """Test if currently in a valid scheduler job environment.
 
@@ -120,26 +208,57 @@ class EmopScheduler(object):
             if jobid:
                 return jobid
 
-    def walltime(self, num_pages):
+    def walltime(self, num_pages, runtime=None):
         """Determine walltime used for submitting job
 
         This function determines the appropriate walltime to use
         when submitting a job.
 
-        The optimal walltime is determined by using
+        The walltime is the time for the job's pages plus the
+        ``job_overhead`` and ``signal_lead_time``, so the pages are not cut
+        short by the job's bootstrap and upload or by the signal sent before
+        the walltime.  It never exceeds max_job_runtime, so when the overhead
+        leaves no time within max_job_runtime the pages get no budget.
+
+        The optimal time for the pages is determined by using
         avg_page_runtime * N * num_pages, where N is either
         400%, 200% or 150%.  The first optimal walltime to be less
         than the max_job_runtime is used.
 
+        If a runtime_estimate is set the time for the pages is the runtime
+        the job finishes within with probability walltime_probability.
+        A job's own predicted runtime takes precedence over both.
+
         Args:
             num_pages (int): Number of pages to be run
+            runtime (float, optional): Predicted runtime of the job's pages
 
         Returns:
             int: A walltime value in seconds.
         """
+        overhead = self.settings.job_overhead + self.settings.signal_lead_time
+        max_runtime = self.settings.max_job_runtime
+        if runtime:
+            walltime = math.ceil(runtime + overhead)
+        elif self.runtime_estimate:
+            runtime = self.runtime_estimate.job_runtime(num_pages, self.settings.walltime_probability)
+            walltime = math.ceil(runtime + overhead)
+        else:
+            walltime = self.average_walltime(num_pages, max(max_runtime - overhead, 0)) + overhead
+        return int(min(walltime, max_runtime))
+
+    def average_walltime(self, num_pages, max_runtime):
+        """Determine the time for a job's pages from avg_page_runtime
+
+        Args:
+            num_pages (int): Number of pages to be run
+            max_runtime (int): Most seconds for the pages
+
+        Returns:
+            float: Seconds for the pages.
+        """
         avg_page_runtime = int(self.settings.avg_page_runtime)
         num_pages = int(num_pages)
-        max_runtime = self.settings.max_job_runtime
         walltimes = []
         walltime = max_runtime
         # 400% the average
@@ -153,4 +272,4 @@ class EmopScheduler(object):
             if w <= max_runtime:
                 walltime = w
                 break
-        return int(walltime)
+        return walltime
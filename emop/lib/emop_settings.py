@@ -4,15 +4,57 @@ import os
 
 # TODO: Need sane defaults for all settings
 defaults = {
+    "dashboard": {
+        "job_status_cache_ttl": "86400",
+        "concurrency": "8",
+        "retries": "0",
+        "retry_delay": "1",
+        "reserve_max_pages": "1000",
+    },
     "controller": {
         "scheduler": "slurm",
-        "skip_existing": True
+        "skip_existing": True,
+        "cache_path": None,
+        "metrics_log": None,
+        "metrics_textfile_path": None,
+        "metrics_textfile_interval": "15",
+        "write_concurrency": "8",
+        "stats_db": None,
+        "stats_processes": "0",
+        "heartbeat_path": None,
+        "heartbeat_interval": "10",
+        "heartbeat_stall": "1800",
     },
     "scheduler": {
         "mem_per_cpu": "4000",
         "cpus_per_task": "1",
         "set_walltime": False,
         "extra_args": '[]',
+        "array": False,
+        "max_array_size": "1001",
+        "runtime_model": False,
+        "runtime_model_min_samples": "20",
+        "walltime_probability": "0.95",
+        "job_overhead": "0",
+        "signal_lead_time": "0",
+        "snapshot_ttl": "10",
+        "local_processes": "0",
+        "local_job_db": None,
+        "opportunistic": False,
+        "min_jobs": "0",
+        "burst_max_jobs": None,
+        "max_pending_jobs": "10",
+        "sim_queue_wait": "300",
+        "sim_submit_interval": "3600",
+        "sim_runs": "10",
+        "accounting_lookback": "30",
+    },
+    "upload": {
+        "chunk_pages": "100",
+        "chunk_bytes": "1048576",
+        "progressive": False,
+        "progressive_pages": "10",
+        "progressive_interval": "300",
     },
     "multi-column-skew": {
         "enabled": True,
@@ -72,6 +114,11 @@ class EmopSettings(object):
             'Accept': 'application/emop; version=%s' % self.api_version,
             'Authorization': 'Token token=%s' % self.auth_token,
         }
+        self.job_status_cache_ttl = int(self.get_value('dashboard', 'job_status_cache_ttl'))
+        self.api_concurrency = int(self.get_value('dashboard', 'concurrency'))
+        self.api_retries = int(self.get_value('dashboard', 'retries'))
+        self.api_retry_delay = float(self.get_value('dashboard', 'retry_delay'))
+        self.reserve_max_pages = int(self.get_value('dashboard', 'reserve_max_pages'))
 
         # Settings used by controller
         self.payload_input_path = self.get_value('controller', 'payload_input_path')
@@ -84,6 +131,22 @@ class EmopSettings(object):
         self.log_level = self.get_value('controller', 'log_level')
         self.scheduler = self.get_value('controller', 'scheduler')
         self.controller_skip_existing = self.get_bool_value('controller', 'skip_existing')
+        self.cache_path = self.get_value('controller', 'cache_path')
+        if not self.cache_path:
+            self.cache_path = os.path.join(self.emop_home, ".cache")
+        self.metrics_log = self.get_value('controller', 'metrics_log')
+        self.metrics_textfile_path = self.get_value('controller', 'metrics_textfile_path')
+        self.metrics_textfile_interval = int(self.get_value('controller', 'metrics_textfile_interval'))
+        self.write_concurrency = int(self.get_value('controller', 'write_concurrency'))
+        self.stats_db = self.get_value('controller', 'stats_db')
+        if not self.stats_db:
+            self.stats_db = os.path.join(self.cache_path, "stats.db")
+        self.stats_processes = int(self.get_value('controller', 'stats_processes'))
+        self.heartbeat_path = self.get_value('controller', 'heartbeat_path')
+        if not self.heartbeat_path:
+            self.heartbeat_path = os.path.join(self.cache_path, "heartbeats")
+        self.heartbeat_interval = int(self.get_value('controller', 'heartbeat_interval'))
+        self.heartbeat_stall = int(self.get_value('controller', 'heartbeat_stall'))
 
         # Settings used to interact with the cluster scheduler
         self.max_jobs = int(self.get_value('scheduler', 'max_jobs'))
@@ -99,6 +162,34 @@ class EmopSettings(object):
         self.scheduler_set_walltime = self.get_bool_value('scheduler', 'set_walltime')
         # Allow to fail if invalid type provided
         self.scheduler_extra_args = json.loads(self.get_value('scheduler', 'extra_args'))
+        self.scheduler_array = self.get_bool_value('scheduler', 'array')
+        self.scheduler_max_array_size = int(self.get_value('scheduler', 'max_array_size'))
+        self.runtime_model = self.get_bool_value('scheduler', 'runtime_model')
+        self.runtime_model_min_samples = int(self.get_value('scheduler', 'runtime_model_min_samples'))
+        self.walltime_probability = float(self.get_value('scheduler', 'walltime_probability'))
+        self.job_overhead = int(self.get_value('scheduler', 'job_overhead'))
+        self.signal_lead_time = int(self.get_value('scheduler', 'signal_lead_time'))
+        self.scheduler_snapshot_ttl = int(self.get_value('scheduler', 'snapshot_ttl'))
+        self.local_processes = int(self.get_value('scheduler', 'local_processes'))
+        self.local_job_db = self.get_value('scheduler', 'local_job_db')
+        if not self.local_job_db:
+            self.local_job_db = os.path.join(self.cache_path, "local_jobs.db")
+        self.scheduler_opportunistic = self.get_bool_value('scheduler', 'opportunistic')
+        self.scheduler_min_jobs = int(self.get_value('scheduler', 'min_jobs'))
+        burst_max_jobs = self.get_value('scheduler', 'burst_max_jobs')
+        self.scheduler_burst_max_jobs = int(burst_max_jobs) if burst_max_jobs else self.max_jobs
+        self.scheduler_max_pending_jobs = int(self.get_value('scheduler', 'max_pending_jobs'))
+        self.sim_queue_wait = int(self.get_value('scheduler', 'sim_queue_wait'))
+        self.sim_submit_interval = int(self.get_value('scheduler', 'sim_submit_interval'))
+        self.sim_runs = int(self.get_value('scheduler', 'sim_runs'))
+        self.accounting_lookback = int(self.get_value('scheduler', 'accounting_lookback'))
+
+        # Settings used when uploading results
+        self.upload_chunk_pages = int(self.get_value('upload', 'chunk_pages'))
+        self.upload_chunk_bytes = int(self.get_value('upload', 'chunk_bytes'))
+        self.upload_progressive = self.get_bool_value('upload', 'progressive')
+        self.upload_progressive_pages = int(self.get_value('upload', 'progressive_pages'))
+        self.upload_progressive_interval = int(self.get_value('upload', 'progressive_interval'))
 
         # Settings used by MultiColumnSkew
         self.multi_column_skew_enabled = self.get_bool_value('multi-column-skew', 'enabled')
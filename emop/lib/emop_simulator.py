@@ -0,0 +1,188 @@
+import heapq
+import logging
+import random
+
+logger = logging.getLogger('emop')
+
+#: Statistics reported by EmopSimulator.run, averaged over the runs
+stats_keys = [
+    "makespan",
+    "node_hours",
+    "jobs",
+    "killed_jobs",
+    "kill_rate",
+    "idle_slot_hours",
+    "idle_fraction",
+    "incomplete_pages",
+]
+
+
+class EmopSimulator(object):
+
+    def __init__(self, page_runtimes, max_jobs, queue_wait, submit_interval, max_job_runtime, job_overhead=0,
+                 signal_lead_time=0, seed=None):
+        """ Initialize EmopSimulator object and attributes
+
+        A discrete-event simulation of submitting pages to the cluster.
+
+        Every ``submit_interval`` seconds, like the submit cron, jobs are sized
+        by a strategy and submitted to the free job slots.  Each job waits in the
+        queue, then runs its pages one after another until they are done or its
+        walltime, less the signal lead time, is reached.  Pages not done by a
+        killed job are pending again.  Each job also spends ``job_overhead``
+        seconds outside its pages, which counts toward its node-hours.
+
+        Args:
+            page_runtimes (list): Page runtimes in seconds, sampled with replacement
+            max_jobs (int): Number of job slots
+            queue_wait (int): Mean seconds a job waits in the queue, 0 to start immediately
+            submit_interval (int): Seconds between submissions
+            max_job_runtime (int): Maximum job runtime, used for already running jobs
+            job_overhead (int, optional): Seconds each job spends outside its pages
+            signal_lead_time (int, optional): Seconds before the walltime a job stops running pages
+            seed (int, optional): Random seed
+
+        Raises:
+            ValueError: If submit_interval is not greater than 0.
+        """
+        if submit_interval <= 0:
+            raise ValueError("submit_interval must be greater than 0, got %s" % submit_interval)
+        self.page_runtimes = page_runtimes
+        self.max_jobs = max_jobs
+        self.queue_wait = queue_wait
+        self.submit_interval = submit_interval
+        self.max_job_runtime = max_job_runtime
+        self.job_overhead = job_overhead
+        self.signal_lead_time = signal_lead_time
+        self.random = random.Random(seed)
+
+    def run_job(self, num_pages, walltime):
+        """Run a job's pages
+
+        The pages run within the walltime less ``job_overhead`` and
+        ``signal_lead_time``, and are done once the job's overhead is spent.
+
+        Returns:
+            tuple: Pages done, seconds until the last page was done, seconds
+                the job ran and whether it was killed at its walltime.
+        """
+        budget = walltime - self.job_overhead - self.signal_lead_time
+        elapsed = 0
+        for done in xrange(num_pages):
+            runtime = self.random.choice(self.page_runtimes)
+            if elapsed + runtime > budget:
+                return done, elapsed + self.job_overhead, walltime, True
+            elapsed += runtime
+        return num_pages, elapsed + self.job_overhead, elapsed + self.job_overhead, False
+
+    def run(self, page_count, running_job_count, strategy, walltime, horizon=31536000):
+        """Simulate processing the pending pages
+
+        Jobs already running hold their slot until a uniformly random time
+        within max_job_runtime.
+
+        Args:
+            page_count (int): Number of pending pages
+            running_job_count (int): Number of jobs already running
+            strategy (callable): Called with pending pages and active jobs,
+                returns the number of jobs and pages per job to submit.
+            walltime (callable): Called with a job's number of pages, returns its walltime.
+            horizon (int, optional): Seconds after which the simulation stops
+
+        Returns:
+            dict: The statistics in ``stats_keys``.
+        """
+        stats = dict((k, 0) for k in stats_keys)
+        events = [(0, "submit", None)]
+        pending = page_count
+        completed = 0
+        active = min(running_job_count, self.max_jobs)
+        busy = self.add_running_jobs(events, active)
+        makespan = 0
+
+        while events:
+            now, event, data = heapq.heappop(events)
+            if now > horizon:
+                break
+            if event == "end":
+                returned, done = data
+                active -= 1
+                pending += returned
+                completed += done
+                continue
+
+            # Submit event
+            if pending and active < self.max_jobs:
+                num_jobs, pages_per_job = strategy(pending, active)
+                for _ in xrange(min(num_jobs, self.max_jobs - active)):
+                    num_pages = min(pages_per_job, pending)
+                    if not num_pages:
+                        break
+                    pending -= num_pages
+                    active += 1
+                    start = now + (self.random.expovariate(1.0 / self.queue_wait) if self.queue_wait else 0)
+                    done, finished, ran, killed = self.run_job(num_pages, walltime(num_pages))
+                    stats["jobs"] += 1
+                    stats["killed_jobs"] += int(killed)
+                    stats["node_hours"] += ran / 3600.0
+                    busy += ran
+                    if done:
+                        makespan = max(makespan, start + finished)
+                    heapq.heappush(events, (start + ran, "end", (num_pages - done, done)))
+            if pending or active:
+                heapq.heappush(events, (now + self.submit_interval, "submit", None))
+
+        stats["incomplete_pages"] = page_count - completed
+        return self.finish_stats(stats, makespan, busy)
+
+    def add_running_jobs(self, events, running_job_count):
+        """Add the end events of the jobs already running
+
+        Returns:
+            float: Seconds the jobs will run for.
+        """
+        busy = 0
+        for _ in xrange(running_job_count):
+            end = self.random.uniform(0, self.max_job_runtime)
+            busy += end
+            heapq.heappush(events, (end, "end", (0, 0)))
+        return busy
+
+    def finish_stats(self, stats, makespan, busy):
+        """Add the makespan, kill rate and idle job slots to a run's statistics
+
+        Args:
+            stats (dict): The run's statistics
+            makespan (float): Seconds until the last page was done
+            busy (float): Seconds the jobs ran for
+
+        Returns:
+            dict: stats
+        """
+        stats["makespan"] = makespan
+        if stats["jobs"]:
+            stats["kill_rate"] = float(stats["killed_jobs"]) / stats["jobs"]
+        slot_seconds = self.max_jobs * makespan
+        if slot_seconds:
+            idle = max(0, slot_seconds - busy)
+            stats["idle_slot_hours"] = idle / 3600.0
+            stats["idle_fraction"] = float(idle) / slot_seconds
+        return stats
+
+    def run_many(self, runs, *args, **kwargs):
+        """Average the statistics of several runs
+
+        Args:
+            runs (int): Number of runs
+            *args: Arguments passed to run
+            **kwargs: Arguments passed to run
+
+        Returns:
+            dict: The averaged statistics in ``stats_keys``.
+        """
+        totals = dict((k, 0) for k in stats_keys)
+        for _ in xrange(runs):
+            stats = self.run(*args, **kwargs)
+            for k in stats_keys:
+                totals[k] += stats[k]
+        return dict((k, float(totals[k]) / runs) for k in stats_keys)
@@ -0,0 +1,682 @@
+import collections
+import glob
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sqlite3
+from emop.lib.utilities import mkdirs_exists_ok
+
+logger = logging.getLogger('emop')
+
+#: Processes whose runtimes are read from the job logs
+processes = [
+    "OCR",
+    "Denoise",
+    "MultiColumnSkew",
+    "XML_To_Text",
+    "PageEvaluator",
+    "PageCorrector",
+    "JuxtaCompare",
+    # "RetasCompare",
+]
+
+meta_schema = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+#: Version of the log_files and runtimes tables.  They are derived from the
+#: job logs and are rebuilt from the logs in logdir when this changes.
+log_schema_version = "1"
+
+#: Job overheads timed by emop.slrm, mapped from the name it logs them with
+#: to the process they are stored as
+overheads = collections.OrderedDict([
+    ("BOOTSTRAP", "bootstrap"),
+    ("START MARIADB", "start_mariadb"),
+    ("UPLOAD", "upload"),
+    ("JOB", "job"),
+])
+
+#: Where the node time of a job is spent, in the order it is reported
+overhead_stages = ["bootstrap", "start_mariadb"] + processes + ["upload", "idle"]
+
+#: Events counted in the job logs: errors logged by the controller and
+#: SLURM killing the job for its time or memory limit
+events = [
+    "error",
+    "time_limit",
+    "memory_limit",
+]
+
+#: Matches the log lines read into the runtimes table: the runtimes logged by
+#: EmopBase.run_timing for a page ("Job"), a process or the job's TOTAL TIME,
+#: the overheads logged by emop.slrm, the "Got job" line giving a page's
+#: batch and font, the "started on" line of emop.slrm giving the job's ID
+#: and host, and the ``events``.
+log_re = re.compile(
+    r"^(?:\[(?P<time>[^\]]*)\] )?.*?(?:"
+    r"(?P<process>Job|%s) \[(?P<item>.*)\] COMPLETE: Duration: (?P<runtime>[0-9.]+) secs"
+    r"|TOTAL TIME: (?P<total>[0-9.]+)$"
+    r"|(?P<overhead>%s) TIME: (?P<overhead_runtime>[0-9.]+)$"
+    r"|Got job \[(?P<got_item>.*?)\] - .* BatchID: (?P<batch_id>\S+) Font: (?P<font>.*)$"
+    r"|(?P<job_id>\S+) started on (?P<host>\S+) at "
+    r"|(?P<error>ERROR):"
+    r"|(?P<time_limit>TIME LIMIT)"
+    r"|^(?P<memory_limit>slurmstepd: Exceeded job memory limit)$)" % ("|".join(processes), "|".join(overheads))
+)
+
+#: Fields page runtimes can be broken down by, mapped to their runtimes column
+runtime_by_fields = {
+    "batch": "batch_id",
+    "font": "font",
+    "host": "host",
+    "job": "job_id",
+}
+
+#: Throughput windows, mapped to the length of the log time prefix shared by
+#: a window's runtimes and the window's hours
+throughput_windows = {
+    "hour": (13, 1),
+    "day": (10, 24),
+}
+
+#: Percentiles reported of runtimes
+percentiles = [0.5, 0.9, 0.99]
+
+#: Matches the job ID in a log file's name, see the scheduler's logfile setting
+log_job_id_re = re.compile(r"-([0-9_]+)\.out$")
+
+schema = """
+CREATE TABLE IF NOT EXISTS log_files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    offset INTEGER NOT NULL,
+    context TEXT
+);
+CREATE TABLE IF NOT EXISTS runtimes (
+    path TEXT NOT NULL,
+    process TEXT NOT NULL,
+    runtime REAL NOT NULL,
+    item TEXT,
+    batch_id TEXT,
+    font TEXT,
+    job_id TEXT,
+    host TEXT,
+    time TEXT
+);
+CREATE INDEX IF NOT EXISTS runtimes_process_runtime ON runtimes (process, runtime);
+CREATE INDEX IF NOT EXISTS runtimes_path ON runtimes (path);
+CREATE TABLE IF NOT EXISTS log_events (
+    path TEXT NOT NULL,
+    event TEXT NOT NULL,
+    job_id TEXT,
+    host TEXT,
+    time TEXT
+);
+CREATE INDEX IF NOT EXISTS log_events_path ON log_events (path);
+CREATE TABLE IF NOT EXISTS accounting (
+    job_id TEXT PRIMARY KEY,
+    proc_id TEXT,
+    num_pages INTEGER,
+    state TEXT NOT NULL,
+    exit_code TEXT,
+    elapsed INTEGER,
+    time_limit INTEGER,
+    max_rss REAL,
+    total_cpu REAL,
+    alloc_cpus INTEGER,
+    req_mem REAL,
+    end_time TEXT
+);
+"""
+
+#: Accounting states of jobs that have not ended
+active_states = [
+    "PENDING",
+    "RUNNING",
+    "REQUEUED",
+    "RESIZING",
+    "SUSPENDED",
+]
+
+
+def quantile(values, probability):
+    """Nearest-rank quantile
+
+    Args:
+        values (list): Numbers, need not be sorted
+        probability (float): Probability between 0 and 1
+
+    Returns:
+        float: The quantile, None if there are no values.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(probability * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def summarize(runtimes):
+    """Count, total, mean, percentiles and max of runtimes
+
+    Args:
+        runtimes (list): Runtimes sorted in ascending order
+
+    Returns:
+        dict: The statistics, percentiles are keyed such as p90.
+    """
+    count = len(runtimes)
+    total = sum(runtimes)
+    summary = {"count": count, "total": total, "mean": total / count, "max": runtimes[-1]}
+    for probability in percentiles:
+        summary["p%d" % round(probability * 100)] = quantile(runtimes, probability)
+    return summary
+
+
+def parse_runtimes(path, offset=0, context=None):
+    """Read the runtimes logged in a job log
+
+    Only complete lines are read, a line still being written is read by the next call.
+
+    Args:
+        path (str): Path of the log file
+        offset (int): Byte offset to start reading from
+        context (dict, optional): The context returned by the previous call for this file
+
+    Returns:
+        tuple: The path, the byte offset after the last line read, the context
+            to pass to the next call, a list of runtime dicts and a list of
+            event dicts.  The process of a runtime is "page" for pages, "total"
+            for the controller's total time or one of ``overheads``.
+    """
+    if not context:
+        job_id = log_job_id_re.search(path)
+        context = {"job_id": job_id.group(1) if job_id else None, "host": None, "items": {}}
+    items = context["items"]
+    samples = []
+    found = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            offset += len(line)
+            match = log_re.search(line.rstrip("\r\n"))
+            if not match:
+                continue
+            groups = match.groupdict()
+            if groups["got_item"] is not None:
+                items[groups["got_item"]] = [groups["batch_id"], groups["font"].strip()]
+                continue
+            if groups["host"] is not None:
+                context["job_id"] = groups["job_id"]
+                context["host"] = groups["host"]
+                continue
+            event = [e for e in events if groups[e] is not None]
+            if event:
+                found.append({"event": event[0], "job_id": context["job_id"], "host": context["host"],
+                              "time": groups["time"]})
+                continue
+            if groups["total"] is not None:
+                process, runtime, item = "total", groups["total"], None
+            elif groups["overhead"] is not None:
+                process, runtime, item = overheads[groups["overhead"]], groups["overhead_runtime"], None
+            else:
+                process = "page" if groups["process"] == "Job" else groups["process"]
+                runtime, item = groups["runtime"], groups["item"]
+            batch_id, font = items.get(item, (None, None))
+            samples.append({
+                "process": process,
+                "runtime": float(runtime),
+                "item": item,
+                "batch_id": batch_id,
+                "font": font,
+                "job_id": context["job_id"],
+                "host": context["host"],
+                "time": groups["time"],
+            })
+    return path, offset, context, samples, found
+
+
+def parse_runtimes_task(args):
+    """parse_runtimes with its arguments as a tuple, for Pool.map"""
+    return parse_runtimes(*args)
+
+
+class EmopStats(object):
+
+    #: Memory recommended over the most used per CPU by a completed job
+    mem_headroom = 1.2
+    #: Memory recommended over the most requested by a job killed for memory
+    oom_increase = 1.5
+    #: Quantile of jobs whose CPU use is covered by the recommended cpus_per_task
+    cpu_quantile = 0.95
+
+    def __init__(self, path):
+        """ Initialize EmopStats object and attributes
+
+        A SQLite store of job statistics that is added to incrementally.
+
+        Args:
+            path (str): Path of the SQLite database
+        """
+        self.path = path
+
+    def connect(self):
+        mkdirs_exists_ok(os.path.dirname(self.path))
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(meta_schema)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'log_schema'").fetchone()
+        if not row or row["value"] != log_schema_version:
+            conn.executescript("DROP TABLE IF EXISTS log_files; DROP TABLE IF EXISTS runtimes; "
+                               "DROP TABLE IF EXISTS log_events;")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('log_schema', ?)", (log_schema_version,))
+            conn.commit()
+        conn.executescript(schema)
+        return conn
+
+    def get_meta(self, key):
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+        finally:
+            conn.close()
+
+    def update_runtimes(self, logdir, processes=None):
+        """Add the runtimes logged since the previous update
+
+        Each log file is read from the byte offset reached by the previous
+        update.  Files replaced or truncated since are read again from the
+        start.  Runtimes of log files that were removed are kept unless
+        ``log_schema_version`` changes.
+
+        Args:
+            logdir (str): Directory of the ``*.out`` job logs
+            processes (int, optional): Number of processes reading log files, defaults to one per CPU
+
+        Returns:
+            int: Number of runtimes added.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT * FROM log_files").fetchall()
+        finally:
+            conn.close()
+        known = dict((r["path"], (r["inode"], r["offset"])) for r in rows)
+        contexts = dict((r["path"], r["context"]) for r in rows)
+
+        tasks = []
+        inodes = {}
+        for path in glob.glob(os.path.join(logdir, "*.out")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            inodes[path] = stat.st_ino
+            inode, offset = known.get(path, (None, 0))
+            context = contexts.get(path)
+            if inode != stat.st_ino or offset > stat.st_size:
+                offset, context = 0, None
+            if offset < stat.st_size:
+                tasks.append((path, offset, json.loads(context) if context else None))
+        if not tasks:
+            return 0
+
+        processes = min(processes or multiprocessing.cpu_count(), len(tasks))
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(parse_runtimes_task, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [parse_runtimes(*task) for task in tasks]
+
+        added = 0
+        conn = self.connect()
+        try:
+            with conn:
+                for (path, start, _), (_, offset, context, samples, found) in zip(tasks, results):
+                    # Skip files another update read while these were
+                    row = conn.execute("SELECT inode, offset FROM log_files WHERE path = ?", (path,)).fetchone()
+                    if (tuple(row) if row else None) != known.get(path):
+                        continue
+                    if start == 0:
+                        conn.execute("DELETE FROM runtimes WHERE path = ?", (path,))
+                        conn.execute("DELETE FROM log_events WHERE path = ?", (path,))
+                    conn.executemany(
+                        "INSERT INTO runtimes (path, process, runtime, item, batch_id, font, job_id, host, time) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(path, r["process"], r["runtime"], r["item"], r["batch_id"], r["font"], r["job_id"],
+                          r["host"], r["time"]) for r in samples]
+                    )
+                    conn.executemany(
+                        "INSERT INTO log_events (path, event, job_id, host, time) VALUES (?, ?, ?, ?, ?)",
+                        [(path, e["event"], e["job_id"], e["host"], e["time"]) for e in found]
+                    )
+                    conn.execute("INSERT OR REPLACE INTO log_files (path, inode, offset, context) VALUES (?, ?, ?, ?)",
+                                 (path, inodes[path], offset, json.dumps(context)))
+                    added += len(samples)
+        finally:
+            conn.close()
+        logger.debug("Read %d runtimes from %d log files in %s" % (added, len(tasks), logdir))
+        return added
+
+    def runtime_totals(self):
+        """Count and sum the stored runtimes of each process
+
+        Returns:
+            dict: (count, total seconds) by process, "page" and "total" included.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT process, COUNT(*) AS count, SUM(runtime) AS total FROM runtimes GROUP BY process"
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict((r["process"], (r["count"], r["total"])) for r in rows)
+
+    def page_samples(self):
+        """Get the stored page runtimes with their batch and font
+
+        Returns:
+            list: (runtime, batch_id, font) tuples, batch_id and font are None if not logged.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT runtime, batch_id, font FROM runtimes WHERE process = 'page'").fetchall()
+        finally:
+            conn.close()
+        return [tuple(r) for r in rows]
+
+    def runtime_stages(self):
+        """Summarize the runtimes of pages, jobs and each process
+
+        Percentiles are looked up by rank in the (process, runtime) index
+        so no runtimes are read into memory.
+
+        Returns:
+            list: dicts like summarize with the stage's name, in the order
+                page, each process and total.  Stages without runtimes are left out.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT process, COUNT(*) AS count, SUM(runtime) AS total, MAX(runtime) AS max "
+                "FROM runtimes GROUP BY process"
+            ).fetchall()
+            totals = dict((r["process"], r) for r in rows)
+            stages = []
+            for process in ["page"] + processes + ["total"]:
+                row = totals.get(process)
+                if not row:
+                    continue
+                stage = {"name": process, "count": row["count"], "total": row["total"],
+                         "mean": row["total"] / row["count"], "max": row["max"]}
+                for probability in percentiles:
+                    rank = max(0, int(math.ceil(probability * row["count"])) - 1)
+                    stage["p%d" % round(probability * 100)] = conn.execute(
+                        "SELECT runtime FROM runtimes WHERE process = ? ORDER BY runtime LIMIT 1 OFFSET ?",
+                        (process, rank)
+                    ).fetchone()[0]
+                stages.append(stage)
+        finally:
+            conn.close()
+        return stages
+
+    def throughput(self, window="hour"):
+        """Count the pages completed in each time window
+
+        Args:
+            window (str): A key of ``throughput_windows``
+
+        Returns:
+            list: dicts of the window's start, such as 2015-01-01T13 for an
+                hour, its pages and pages per hour, in time order.
+        """
+        length, hours = throughput_windows[window]
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT substr(time, 1, ?) AS window, COUNT(*) AS pages FROM runtimes "
+                "WHERE process = 'page' AND time IS NOT NULL GROUP BY window ORDER BY window", (length,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"window": r["window"], "pages": r["pages"], "pages_per_hour": float(r["pages"]) / hours}
+                for r in rows]
+
+    def page_runtimes_by(self, by):
+        """Summarize page runtimes grouped by a field
+
+        Args:
+            by (str): A key of ``runtime_by_fields``
+
+        Returns:
+            list: dicts like summarize with the group's name, the groups
+                with the most total runtime first.
+        """
+        column = runtime_by_fields[by]
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT %s AS name, runtime FROM runtimes WHERE process = 'page' ORDER BY name, runtime" % column
+            ).fetchall()
+        finally:
+            conn.close()
+        groups = []
+        for name, group in itertools.groupby(rows, key=lambda r: r["name"]):
+            summary = summarize([r["runtime"] for r in group])
+            summary["name"] = name
+            groups.append(summary)
+        return sorted(groups, key=lambda g: g["total"], reverse=True)
+
+    def overhead_report(self):
+        """Break the node time of each job down by where it was spent
+
+        A job is one log file.  Its node time is the JOB TIME logged by
+        emop.slrm or, for jobs that did not log it, the sum of its overheads
+        and the controller's TOTAL TIME.  ``idle`` is the node time not spent
+        in an overhead or process, such as the controller waiting on the
+        dashboard.  The productive fraction is the time spent in processes
+        over the node time.
+
+        Returns:
+            dict: ``jobs``, a list of dicts of each job's ID, host, seconds
+                by ``overhead_stages``, node time, productive fraction and
+                event counts, and ``aggregate``, the same summed over all jobs.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT path, MAX(job_id) AS job_id, MAX(host) AS host, process, SUM(runtime) AS runtime "
+                "FROM runtimes WHERE process != 'page' GROUP BY path, process ORDER BY path"
+            ).fetchall()
+            event_rows = conn.execute(
+                "SELECT path, MAX(job_id) AS job_id, MAX(host) AS host, event, COUNT(*) AS count "
+                "FROM log_events GROUP BY path, event ORDER BY path"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        logs = collections.OrderedDict()
+        for row in sorted(rows + event_rows, key=lambda r: r["path"]):
+            log = logs.setdefault(row["path"], {"job_id": None, "host": None, "runtimes": {}, "events": {}})
+            log["job_id"] = log["job_id"] or row["job_id"]
+            log["host"] = log["host"] or row["host"]
+            if "process" in row.keys():
+                log["runtimes"][row["process"]] = row["runtime"]
+            else:
+                log["events"][row["event"]] = row["count"]
+
+        jobs = []
+        aggregate = {"jobs": 0, "times": dict((s, 0.0) for s in overhead_stages), "node": 0.0,
+                     "events": dict((e, 0) for e in events)}
+        for path, log in logs.items():
+            runtimes = log["runtimes"]
+            times = dict((s, runtimes.get(s, 0.0)) for s in overhead_stages if s != "idle")
+            if "job" in runtimes:
+                node = runtimes["job"]
+            else:
+                controller = runtimes.get("total", sum(times[p] for p in processes))
+                node = times["bootstrap"] + times["start_mariadb"] + controller + times["upload"]
+            times["idle"] = max(0.0, node - sum(times.values()))
+            job = {
+                "path": path,
+                "job_id": log["job_id"],
+                "host": log["host"],
+                "times": times,
+                "node": node,
+                "productive": sum(times[p] for p in processes) / node if node else None,
+                "events": dict((e, log["events"].get(e, 0)) for e in events),
+            }
+            jobs.append(job)
+            aggregate["jobs"] += 1
+            aggregate["node"] += node
+            for stage in overhead_stages:
+                aggregate["times"][stage] += times[stage]
+            for event in events:
+                aggregate["events"][event] += job["events"][event]
+        productive = sum(aggregate["times"][p] for p in processes)
+        aggregate["productive"] = productive / aggregate["node"] if aggregate["node"] else None
+        return {"jobs": jobs, "aggregate": aggregate}
+
+    def add_accounting(self, records):
+        """Store job accounting records
+
+        A job already stored is replaced by its newer record.
+
+        Args:
+            records (list): (EmopSchedulerAccounting, num_pages) tuples
+        """
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO accounting (job_id, proc_id, num_pages, state, exit_code, elapsed, "
+                    "time_limit, max_rss, total_cpu, alloc_cpus, req_mem, end_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(r.job_id, r.proc_id, num_pages, r.state, r.exit_code, r.elapsed, r.time_limit, r.max_rss,
+                      r.total_cpu, r.alloc_cpus, r.req_mem, r.end_time) for r, num_pages in records]
+                )
+        finally:
+            conn.close()
+        logger.debug("Stored %d job accounting records in %s" % (len(records), self.path))
+
+    def accounting(self):
+        """Get the stored job accounting records
+
+        Returns:
+            list: sqlite3.Row of each job, in the order they ended.
+        """
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT * FROM accounting ORDER BY end_time, job_id").fetchall()
+        finally:
+            conn.close()
+
+    def page_runtime(self, completed):
+        """Mean page runtime from the job logs, or else from completed jobs
+
+        Args:
+            completed (list): Accounting records of the completed jobs
+
+        Returns:
+            tuple: The mean runtime in seconds and its source, "logs" or
+                "jobs", or None and None if neither has runtimes.
+        """
+        count, total = self.runtime_totals().get("page", (0, 0))
+        if count:
+            return total / count, "logs"
+        paged = [r for r in completed if r["num_pages"] and r["elapsed"] is not None]
+        if paged:
+            return sum(float(r["elapsed"]) / r["num_pages"] for r in paged) / len(paged), "jobs"
+        return None, None
+
+    def accounting_report(self):
+        """Summarize the stored job accounting records and recommend settings
+
+        ``mem_per_cpu`` is the most memory per CPU used by a completed job plus
+        ``mem_headroom``, raised to ``oom_increase`` times the most requested by
+        a job killed for memory.  ``cpus_per_task`` covers the CPUs used by
+        ``cpu_quantile`` of completed jobs.  ``avg_page_runtime`` is the mean
+        of the page runtimes read from the job logs, or if none were read the
+        mean runtime per page of completed jobs.  Timed out jobs are left out
+        as their elapsed time includes pages they did not finish.
+
+        Returns:
+            dict: Job counts by state, memory, CPU and walltime use, jobs
+                killed for memory, jobs that timed out and recommended
+                settings.  Values are None if no job recorded them.
+        """
+        rows = self.accounting()
+        states = {}
+        for row in rows:
+            states[row["state"]] = states.get(row["state"], 0) + 1
+        completed = [r for r in rows if r["state"] == "COMPLETED"]
+        killed = [r for r in rows if r["state"] == "OUT_OF_MEMORY"]
+        timed_out = [r for r in rows if r["state"] == "TIMEOUT"]
+
+        mem_used = [r["max_rss"] / (r["alloc_cpus"] or 1) for r in completed if r["max_rss"] is not None]
+        mem_requested = [r["req_mem"] for r in completed if r["req_mem"]]
+        oom_requested = [r["req_mem"] for r in killed if r["req_mem"]]
+        mem_per_cpu = None
+        if mem_used:
+            mem_per_cpu = max(mem_used) * self.mem_headroom
+        if oom_requested:
+            mem_per_cpu = max(mem_per_cpu or 0, max(oom_requested) * self.oom_increase)
+        if mem_per_cpu is not None:
+            mem_per_cpu = int(math.ceil(mem_per_cpu / 100.0)) * 100
+
+        timed = [r for r in completed if r["elapsed"] and r["total_cpu"] is not None]
+        cpus_used = [r["total_cpu"] / r["elapsed"] for r in timed]
+        cpu_efficiency = None
+        cpus_per_task = None
+        if timed:
+            allocated = sum(r["elapsed"] * (r["alloc_cpus"] or 1) for r in timed)
+            cpu_efficiency = sum(r["total_cpu"] for r in timed) / float(allocated)
+            cpus_per_task = max(1, int(round(quantile(cpus_used, self.cpu_quantile))))
+
+        page_runtime, page_runtime_source = self.page_runtime(completed)
+        limit_used = [float(r["elapsed"]) / r["time_limit"] for r in completed
+                      if r["time_limit"] and r["elapsed"] is not None]
+
+        return {
+            "jobs": len(rows),
+            "states": states,
+            "mem_used_max": max(mem_used) if mem_used else None,
+            "mem_used_p95": quantile(mem_used, 0.95),
+            "mem_requested": max(mem_requested) if mem_requested else None,
+            "cpu_efficiency": cpu_efficiency,
+            "cpus_used_p95": quantile(cpus_used, 0.95),
+            "page_runtime": page_runtime,
+            "page_runtime_source": page_runtime_source,
+            "time_limit_used_p95": quantile(limit_used, 0.95),
+            "killed": killed,
+            "timed_out": timed_out,
+            "recommended": {
+                "mem_per_cpu": mem_per_cpu,
+                "cpus_per_task": cpus_per_task,
+                "avg_page_runtime": int(math.ceil(page_runtime)) if page_runtime is not None else None,
+            },
+        }
@@ -1,6 +1,7 @@
 import os
 import re
 from emop.lib.utilities import exec_cmd
+from emop.lib.emop_metrics import metrics
 from emop.lib.processes.processes_base import ProcessesBase
 
 
@@ -37,4 +38,11 @@ class Denoise(ProcessesBase):
             value = noisemsr_match.group(1)
             self.job.postproc_result.pp_noisemsr = value
 
+        # Each column relabeled prints its iteration counts
+        relabel_matches = re.findall("RELABEL ITERATIONS: ([0-9]+) AVERAGED: ([0-9]+) SCORED: ([0-9]+)", out)
+        if relabel_matches:
+            metrics.inc("emop_denoise_relabel_iterations_total", sum(int(m[0]) for m in relabel_matches))
+            metrics.inc("emop_denoise_averaged_words_total", sum(int(m[1]) for m in relabel_matches))
+            metrics.inc("emop_denoise_scored_words_total", sum(int(m[2]) for m in relabel_matches))
+
         return self.results(stdout=None, stderr=None, exitcode=0)
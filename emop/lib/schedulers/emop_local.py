@@ -0,0 +1,346 @@
+import argparse
+import errno
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import time
+import subprocess32
+from emop.lib.emop_scheduler import EmopScheduler, EmopSchedulerAccounting, EmopSchedulerJob
+from emop.lib.emop_settings import EmopSettings
+from emop.lib.utilities import mkdirs_exists_ok
+
+logger = logging.getLogger('emop')
+
+schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    proc_id TEXT NOT NULL,
+    num_pages INTEGER,
+    walltime INTEGER,
+    state TEXT NOT NULL,
+    pid INTEGER,
+    submit_time REAL,
+    start_time REAL,
+    end_time REAL,
+    exitcode INTEGER
+);
+"""
+
+
+class EmopLocal(EmopScheduler):
+
+    name = "local"
+
+    jobid_env_vars = [
+        'EMOP_LOCAL_JOB_ID',
+    ]
+
+    #: Seconds a job has after SIGUSR1 at its walltime before it is killed
+    kill_grace = 60
+    #: Seconds between checks of a running job
+    poll_interval = 1
+
+    def __init__(self, settings):
+        """Initialize EmopLocal object and attributes
+
+        Runs jobs on this machine.  Submitted jobs are kept in a SQLite job
+        table and at most ``local_processes`` run at once.  Each job is run by
+        a detached runner process which, when its job ends, starts the next
+        pending jobs, so jobs keep running after submit exits.
+
+        Args:
+            settings (object): instance of EmopSettings
+        """
+        super(self.__class__, self).__init__(settings)
+        self.db_path = settings.local_job_db
+        self.processes = settings.local_processes or multiprocessing.cpu_count()
+        self.hostname = socket.gethostname()
+
+    def connect(self):
+        mkdirs_exists_ok(os.path.dirname(self.db_path))
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(schema)
+        return conn
+
+    @staticmethod
+    def pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+    def refresh(self, conn):
+        """Mark running jobs whose runner died as failed
+
+        Must be called within a transaction.
+        """
+        for row in conn.execute("SELECT id, pid, start_time FROM jobs WHERE state = 'RUNNING'").fetchall():
+            # The runner's pid is set just after the job is marked RUNNING
+            if row["pid"] is None and (time.time() - row["start_time"]) < 60:
+                continue
+            if row["pid"] is None or not self.pid_alive(row["pid"]):
+                logger.error("Local job %s runner exited unexpectedly" % row["id"])
+                conn.execute("UPDATE jobs SET state = 'FAILED', end_time = ? WHERE id = ?", (time.time(), row["id"]))
+
+    def get_jobs(self):
+        """Get the pending and running jobs from the job table
+
+        Returns:
+            list: EmopSchedulerJob of each job
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self.refresh(conn)
+            conn.execute("COMMIT")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state IN ('PENDING', 'RUNNING') ORDER BY id"
+            ).fetchall()
+        finally:
+            conn.close()
+        jobs = []
+        now = time.time()
+        for row in rows:
+            running = row["state"] == "RUNNING"
+            jobs.append(EmopSchedulerJob(
+                job_id=str(row["id"]),
+                state=row["state"],
+                reason="None" if running else "Resources",
+                elapsed=int(now - row["start_time"]) if running else 0,
+                time_limit=row["walltime"],
+                node=self.hostname if running else "",
+                name=self.settings.scheduler_job_name,
+                proc_id=row["proc_id"],
+            ))
+        return jobs
+
+    def get_accounting(self, start):
+        """Get the accounting records of jobs from the job table
+
+        Memory and CPU use are not recorded.
+
+        Args:
+            start (float): Only jobs pending, running or ended since this Unix time
+
+        Returns:
+            list: EmopSchedulerAccounting of each job
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE end_time IS NULL OR end_time >= ? ORDER BY id", (start,)
+            ).fetchall()
+        finally:
+            conn.close()
+        records = []
+        now = time.time()
+        for row in rows:
+            if row["start_time"] is None:
+                elapsed = 0
+            else:
+                elapsed = int((row["end_time"] or now) - row["start_time"])
+            end_time = None
+            if row["end_time"] is not None:
+                end_time = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(row["end_time"]))
+            records.append(EmopSchedulerAccounting(
+                job_id=str(row["id"]),
+                state=row["state"],
+                exit_code="%s:0" % row["exitcode"] if row["exitcode"] is not None else "",
+                elapsed=elapsed,
+                time_limit=row["walltime"],
+                max_rss=None,
+                total_cpu=None,
+                alloc_cpus=1,
+                req_mem=None,
+                end_time=end_time,
+                proc_id=row["proc_id"],
+            ))
+        return records
+
+    def submit_job(self, proc_id, num_pages, runtime=None):
+        """Add a job to the job table and start it if a process is free
+
+        Args:
+            proc_id (str or int): proc_id to be used by submitted job
+            num_pages (int): Number of pages being scheduled
+            runtime (float, optional): Predicted runtime of the job's pages
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        if not proc_id:
+            logger.error("EmopLocal#submit_job(): Must provide valid proc_id.")
+            return False
+        if self.settings.scheduler_set_walltime:
+            walltime = self.walltime(num_pages, runtime=runtime)
+        else:
+            walltime = None
+        conn = self.connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO jobs (proc_id, num_pages, walltime, state, submit_time) VALUES (?, ?, ?, 'PENDING', ?)",
+                (proc_id, num_pages, walltime, time.time())
+            )
+            job_id = cursor.lastrowid
+        finally:
+            conn.close()
+        logger.info("Local job %s submitted for PROC_ID %s" % (job_id, proc_id))
+        self.clear_snapshot()
+        self.dispatch()
+        return True
+
+    def dispatch(self):
+        """Start pending jobs while fewer than ``local_processes`` are running
+
+        Returns:
+            list: IDs of the jobs started
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self.refresh(conn)
+            running = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'RUNNING'").fetchone()[0]
+            free = max(0, self.processes - running)
+            rows = conn.execute("SELECT id FROM jobs WHERE state = 'PENDING' ORDER BY id LIMIT ?", (free,)).fetchall()
+            job_ids = [row["id"] for row in rows]
+            for job_id in job_ids:
+                conn.execute("UPDATE jobs SET state = 'RUNNING', start_time = ? WHERE id = ?", (time.time(), job_id))
+            conn.execute("COMMIT")
+            for job_id in job_ids:
+                pid = self.start_runner(job_id)
+                conn.execute("UPDATE jobs SET pid = ? WHERE id = ?", (pid, job_id))
+        finally:
+            conn.close()
+        return job_ids
+
+    def start_runner(self, job_id):
+        """Start a detached runner process for a job
+
+        Returns:
+            int: The runner's pid
+        """
+        cmd = [sys.executable, "-m", "emop.lib.schedulers.emop_local", "--config", self.settings.config_path,
+               str(job_id)]
+        devnull = open(os.devnull, 'w')
+        process = subprocess32.Popen(cmd, stdout=devnull, stderr=devnull, close_fds=True, preexec_fn=os.setsid,
+                                     cwd=self.settings.emop_home)
+        devnull.close()
+        logger.debug("Local job %s runner started with pid %s" % (job_id, process.pid))
+        return process.pid
+
+    def get_run_cmd(self, proc_id):
+        return [sys.executable, os.path.join(self.settings.emop_home, "emop.py"),
+                "-c", self.settings.config_path, "run", "--proc-id", proc_id]
+
+    def get_upload_cmd(self, proc_id):
+        return [sys.executable, os.path.join(self.settings.emop_home, "emop.py"),
+                "-c", self.settings.config_path, "upload", "--proc-id", proc_id]
+
+    def run_job(self, job_id):
+        """Run a job and record how it ended
+
+        Called by the job's runner process.  Like emop.slrm, the job runs the
+        controller then uploads the results left by a completed or timed out
+        run, and logs the UPLOAD TIME and JOB TIME.  The job's output goes to
+        the scheduler logfile with ``%j`` replaced by the job ID.
+
+        Args:
+            job_id (int): ID of the job in the job table
+
+        Returns:
+            str: The job's final state, COMPLETED, FAILED or TIMEOUT.
+        """
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            conn.execute("UPDATE jobs SET pid = ? WHERE id = ?", (os.getpid(), job_id))
+        finally:
+            conn.close()
+
+        env = os.environ.copy()
+        env['EMOP_LOCAL_JOB_ID'] = str(job_id)
+        env['PROC_ID'] = row["proc_id"]
+        env['EMOP_CONFIG_PATH'] = self.settings.config_path
+        logfile = self.settings.scheduler_logfile.replace("%j", str(job_id))
+        mkdirs_exists_ok(os.path.dirname(logfile))
+        job_begin = time.time()
+        with open(logfile, 'a') as log:
+            state, exitcode = self.run_controller(job_id, row, log, env)
+            if state in ("COMPLETED", "TIMEOUT"):
+                self.upload(job_id, row["proc_id"], log, env)
+            log.write("JOB TIME: %d\n" % (time.time() - job_begin))
+
+        conn = self.connect()
+        try:
+            conn.execute("UPDATE jobs SET state = ?, end_time = ?, exitcode = ? WHERE id = ?",
+                         (state, time.time(), exitcode, job_id))
+        finally:
+            conn.close()
+        logger.info("Local job %s %s with exit code %s" % (job_id, state, exitcode))
+        return state
+
+    def run_controller(self, job_id, row, log, env):
+        """Run the controller of a job
+
+        A job reaching its walltime is sent SIGUSR1, like SLURM does, then
+        killed after ``kill_grace`` seconds.
+
+        Returns:
+            tuple: The state, COMPLETED, FAILED or TIMEOUT, and exit code of the run.
+        """
+        process = subprocess32.Popen(self.get_run_cmd(row["proc_id"]), stdout=log, stderr=subprocess32.STDOUT,
+                                     env=env, cwd=self.settings.emop_home)
+        state = None
+        walltime = row["walltime"]
+        start = time.time()
+        while process.poll() is None:
+            elapsed = time.time() - start
+            if walltime and state is None and elapsed > walltime:
+                logger.error("Local job %s reached its walltime of %s seconds" % (job_id, walltime))
+                state = "TIMEOUT"
+                process.send_signal(signal.SIGUSR1)
+            elif state == "TIMEOUT" and elapsed > (walltime + self.kill_grace):
+                process.kill()
+            time.sleep(self.poll_interval)
+
+        exitcode = process.returncode
+        if state is None:
+            state = "COMPLETED" if exitcode == 0 else "FAILED"
+        return state, exitcode
+
+    def upload(self, job_id, proc_id, log, env):
+        """Upload the results a job left in its payload output
+
+        Returns:
+            int: Exit code of the upload.
+        """
+        upload_begin = time.time()
+        cmd = self.get_upload_cmd(proc_id)
+        log.write("Executing: %s\n" % " ".join(cmd))
+        log.flush()
+        exitcode = subprocess32.call(cmd, stdout=log, stderr=subprocess32.STDOUT, env=env,
+                                     cwd=self.settings.emop_home)
+        if exitcode != 0:
+            logger.error("Local job %s upload failed with exit code %s" % (job_id, exitcode))
+        log.write("UPLOAD TIME: %d\n" % (time.time() - upload_begin))
+        return exitcode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a job of the local scheduler")
+    parser.add_argument('--config', dest='config_path', required=True, help="path to config file")
+    parser.add_argument('job_id', type=int, help="ID of the job in the job table")
+    args = parser.parse_args()
+    scheduler = EmopLocal(EmopSettings(args.config_path))
+    scheduler.run_job(args.job_id)
+    scheduler.dispatch()
+
+
+if __name__ == '__main__':
+    main()
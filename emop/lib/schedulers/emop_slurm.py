@@ -1,7 +1,10 @@
+import collections
 import logging
+import math
 import os
-from emop.lib.utilities import exec_cmd
-from emop.lib.emop_scheduler import EmopScheduler
+import time
+from emop.lib.utilities import exec_cmd, mkdirs_exists_ok
+from emop.lib.emop_scheduler import EmopScheduler, EmopSchedulerAccounting, EmopSchedulerJob
 
 logger = logging.getLogger('emop')
 
@@ -15,6 +18,25 @@ class EmopSLURM(EmopScheduler):
         'SLURM_JOBID',
     ]
 
+    #: Multipliers to MB of the memory units used by sacct
+    memory_units = {
+        'K': 1.0 / 1024,
+        'M': 1,
+        'G': 1024,
+        'T': 1024 * 1024,
+    }
+
+    #: Pending reasons of jobs that will start once resources free up.
+    #: Jobs pending for any other reason, such as a QOS or association
+    #: limit, mean more jobs would only wait too.
+    waiting_reasons = [
+        'None',
+        'Priority',
+        'Resources',
+        'BeginTime',
+        'Dependency',
+    ]
+
     def __init__(self, settings):
         """Initialize EmopSLURM object and attributes
 
@@ -23,30 +45,269 @@ class EmopSLURM(EmopScheduler):
         """
         super(self.__class__, self).__init__(settings)
 
-    def current_job_count(self):
-        """Get count of this application's active jobs
+    @staticmethod
+    def parse_time(value):
+        """Convert a SLURM time, such as 1-02:03:04, to seconds
+
+        Args:
+            value (str): Time in [days-]hours:minutes:seconds or minutes:seconds,
+                seconds may have a fraction as in sacct's TotalCPU.
+
+        Returns:
+            int: Seconds, None if the time is not set or unlimited.
+        """
+        days = 0
+        if "-" in value:
+            days, value = value.split("-", 1)
+        try:
+            parts = [float(p) for p in value.split(":")]
+            days = int(days)
+        except ValueError:
+            return None
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + part
+        return int(days * 86400 + seconds)
+
+    @classmethod
+    def parse_memory(cls, value, cpus=None):
+        """Convert a sacct memory value, such as 1500K or 4000Mc, to MB
+
+        Args:
+            value (str): Memory with a unit, optionally followed by c (per CPU) or n (per node)
+            cpus (int, optional): CPUs of the job, to convert per node values to per CPU
+
+        Returns:
+            float: MB, per CPU if the value is per node and cpus is given, None if not set.
+        """
+        per_node = value.endswith("n")
+        value = value.rstrip("cn")
+        if not value:
+            return None
+        multiplier = 1.0 / (1024 * 1024)
+        if value[-1] in cls.memory_units:
+            multiplier = cls.memory_units[value[-1]]
+            value = value[:-1]
+        try:
+            memory = float(value) * multiplier
+        except ValueError:
+            return None
+        if per_node and cpus:
+            memory = memory / cpus
+        return memory
+
+    def comment_proc_id(self, comment, array_task_id, manifests):
+        """Get a job's proc_id from its comment
+
+        Args:
+            comment (str): The job's comment, a proc_id or a job array manifest
+            array_task_id (str): The job's array task ID
+            manifests (dict): Manifests already read, by filename
+
+        Returns:
+            str: The proc_id, None if unknown.
+        """
+        proc_id = comment if comment not in ("", "(null)") else None
+        if proc_id and proc_id.endswith(".manifest"):
+            if proc_id not in manifests:
+                manifests[proc_id] = self.read_manifest(proc_id)
+            task_proc_ids = manifests[proc_id]
+            if array_task_id.isdigit() and int(array_task_id) < len(task_proc_ids):
+                proc_id = task_proc_ids[int(array_task_id)]
+            else:
+                proc_id = None
+        return proc_id
+
+    def get_jobs(self):
+        """Get this application's jobs from squeue
+
+        The proc_id is read from each job's comment, which is the proc_id or for a
+        job array the manifest of proc_ids.
+
+        Example command used:
+            squeue -r --noheader -p idhmc -n emop-controller -o %i|%T|%r|%M|%l|%N|%j|%k|%K
+
+        Returns:
+            list: EmopSchedulerJob of each job
+        """
+        cmd = [
+            "squeue", "-r", "--noheader", "-p", self.settings.scheduler_queue, "-n", self.settings.scheduler_job_name,
+            "-o", "%i|%T|%r|%M|%l|%N|%j|%k|%K",
+        ]
+        proc = exec_cmd(cmd, log_level="debug")
+        jobs = []
+        manifests = {}
+        for line in proc.stdout.splitlines():
+            fields = line.strip().split("|")
+            if len(fields) != 9:
+                continue
+            job_id, state, reason, elapsed, time_limit, node, name, comment, array_task_id = fields
+            jobs.append(EmopSchedulerJob(
+                job_id=job_id,
+                state=state,
+                reason=reason,
+                elapsed=self.parse_time(elapsed),
+                time_limit=self.parse_time(time_limit),
+                node=node,
+                name=name,
+                proc_id=self.comment_proc_id(comment, array_task_id, manifests),
+            ))
+        return jobs
+
+    def get_accounting(self, start):
+        """Get the accounting records of this application's jobs from sacct
+
+        MaxRSS is only recorded for job steps, so a job's max_rss is the most
+        of any of its steps and its state is OUT_OF_MEMORY if any step's was.
+
+        Example command used:
+            sacct -n -P --name emop-controller -S 2015-01-01T00:00:00 -o JobID,...,Comment
+
+        Args:
+            start (float): Only jobs pending, running or ended since this Unix time
+
+        Returns:
+            list: EmopSchedulerAccounting of each job, None if sacct failed.
+        """
+        cmd = [
+            "sacct", "-n", "-P", "--name", self.settings.scheduler_job_name,
+            "-S", time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start)),
+            "-o", "JobID,State,ExitCode,Elapsed,Timelimit,MaxRSS,TotalCPU,AllocCPUS,ReqMem,End,Comment",
+        ]
+        proc = exec_cmd(cmd, log_level="debug")
+        if proc.exitcode != 0:
+            logger.error("Failed to get job accounting from sacct: %s" % proc.stderr)
+            return None
+        records = collections.OrderedDict()
+        step_cpu = {}
+        manifests = {}
+        for line in proc.stdout.splitlines():
+            fields = line.strip().split("|")
+            if len(fields) != 11:
+                continue
+            job_id, state, exit_code, elapsed, time_limit, max_rss, total_cpu, alloc_cpus, req_mem, end, comment = fields
+            # States such as "CANCELLED by 1234" are reduced to CANCELLED
+            state = state.split(" ")[0]
+            if "." in job_id:
+                job_id = job_id.split(".")[0]
+                if job_id not in records:
+                    continue
+                record = records[job_id]
+                step_rss = self.parse_memory(max_rss)
+                if step_rss is not None and step_rss > (record["max_rss"] or 0):
+                    record["max_rss"] = step_rss
+                if state == "OUT_OF_MEMORY":
+                    record["state"] = state
+                step_cpu[job_id] = step_cpu.get(job_id, 0) + (self.parse_time(total_cpu) or 0)
+                continue
+            cpus = int(alloc_cpus) if alloc_cpus.isdigit() else None
+            array_task_id = job_id.split("_", 1)[1] if "_" in job_id else ""
+            records[job_id] = {
+                "job_id": job_id,
+                "state": state,
+                "exit_code": exit_code,
+                "elapsed": self.parse_time(elapsed),
+                "time_limit": self.parse_time(time_limit),
+                "max_rss": self.parse_memory(max_rss),
+                "total_cpu": self.parse_time(total_cpu) if total_cpu else None,
+                "alloc_cpus": cpus,
+                "req_mem": self.parse_memory(req_mem, cpus=cpus),
+                "end_time": end if end != "Unknown" else None,
+                "proc_id": self.comment_proc_id(comment, array_task_id, manifests),
+            }
+        for job_id, cpu in step_cpu.items():
+            if not records[job_id]["total_cpu"]:
+                records[job_id]["total_cpu"] = cpu
+        return [EmopSchedulerAccounting(**r) for r in records.values()]
+
+    def read_manifest(self, filename):
+        try:
+            with open(filename) as f:
+                return f.read().splitlines()
+        except IOError:
+            return []
 
-        The currentjobs are those that are Running+Pending.
+    def idle_cpus(self):
+        """Get the number of idle CPUs in the partition
 
         Example command used:
-            squeue -r --noheader -p idhmc -n emop-controller
+            sinfo --noheader -p idhmc -o %C
 
         Returns:
-            int: The numberof current jobs
+            int: Idle CPUs, None if sinfo failed.
         """
-        cmd = ["squeue", "-r", "--noheader", "-p", self.settings.scheduler_queue, "-n", self.settings.scheduler_job_name]
+        cmd = ["sinfo", "--noheader", "-p", self.settings.scheduler_queue, "-o", "%C"]
         proc = exec_cmd(cmd, log_level="debug")
-        lines = proc.stdout.splitlines()
-        num = len(lines)
-        return num
+        if proc.exitcode != 0:
+            logger.error("Failed to get idle CPUs from sinfo: %s" % proc.stderr)
+            return None
+        idle = 0
+        # Format is allocated/idle/other/total
+        for line in proc.stdout.splitlines():
+            fields = line.strip().split("/")
+            if len(fields) == 4:
+                idle += int(fields[1])
+        return idle
+
+    def available_job_slots(self):
+        """Get the number of new jobs that should be submitted
+
+        Unless the ``opportunistic`` setting is enabled this is max_jobs
+        less the current jobs.
+
+        Opportunistic submission allows as many jobs as the partition's idle
+        CPUs can start, less our pending jobs, plus up to ``max_pending_jobs``
+        left pending.  Nothing more is left pending if any of our jobs are pending
+        for a reason other than ``waiting_reasons``.  The total jobs are kept
+        between ``min_jobs`` and ``burst_max_jobs``.
 
-    def get_submit_cmd(self, num_pages):
+        Returns:
+            int: Number of jobs
+        """
+        if not self.settings.scheduler_opportunistic:
+            return super(EmopSLURM, self).available_job_slots()
+
+        jobs = self.snapshot()
+        running = len([j for j in jobs if j.state == "RUNNING"])
+        pending = [j for j in jobs if j.state == "PENDING"]
+        active = len(jobs)
+        blocked = [j for j in pending if j.reason not in self.waiting_reasons]
+        idle_cpus = self.idle_cpus() or 0
+        startable = max(0, (idle_cpus // int(self.settings.scheduler_cpus_per_task)) - len(pending))
+        if blocked:
+            reasons = sorted(set(j.reason for j in blocked))
+            logger.info("%d jobs pending for %s, not queueing more" % (len(blocked), ", ".join(reasons)))
+            queue_room = 0
+        else:
+            queue_room = max(0, self.settings.scheduler_max_pending_jobs - len(pending))
+        slots = min(startable + queue_room, self.settings.scheduler_burst_max_jobs - active)
+        slots = max(slots, self.settings.scheduler_min_jobs - active, 0)
+        logger.info("Jobs running: %d, pending: %d, idle CPUs: %d, job slots: %d" %
+                    (running, len(pending), idle_cpus, slots))
+        return slots
+
+    def array_throttle(self):
+        """Get the number of a job array's tasks SLURM may run at once
+
+        Returns:
+            int: max_jobs, or burst_max_jobs if ``opportunistic`` is enabled
+        """
+        if self.settings.scheduler_opportunistic:
+            return self.settings.scheduler_burst_max_jobs
+        return self.settings.max_jobs
+
+    def get_submit_cmd(self, num_pages, array_size=None, runtime=None, comment=None, array_throttle=None):
         """Generates a sbatch command
 
         Based on settings a sbatch command is generated.
 
         Args:
             num_pages (int): Number of pages being scheduled
+            array_size (int, optional): Number of tasks if submitting a job array.
+            runtime (float, optional): Predicted runtime used for the walltime
+            comment (str, optional): The job's comment, the proc_id or job array manifest
+            array_throttle (int, optional): Number of array tasks running at once,
+                defaults to array_throttle().
 
         Returns:
             list: The command to be executed
@@ -59,11 +320,19 @@ class EmopSLURM(EmopScheduler):
             "--mem-per-cpu", self.settings.scheduler_mem_per_cpu,
             "--cpus-per-task", self.settings.scheduler_cpus_per_task,
         ]
+        if comment:
+            cmd.append("--comment")
+            cmd.append(comment)
+        if array_size:
+            if not array_throttle:
+                array_throttle = self.array_throttle()
+            cmd.append("--array")
+            cmd.append("0-%d%%%d" % (array_size - 1, array_throttle))
         # Set walltime if configured to do so
         if self.settings.scheduler_set_walltime:
-            walltime_seconds = self.walltime(num_pages)
-            # Convert walltime from seconds to minutes
-            walltime_minutes = int(walltime_seconds / 60)
+            walltime_seconds = self.walltime(num_pages, runtime=runtime)
+            # Convert walltime from seconds to minutes, rounding up as SLURM takes --time 0 as no limit
+            walltime_minutes = int(math.ceil(walltime_seconds / 60.0))
             cmd.append("--time")
             cmd.append(str(walltime_minutes))
         extra_args = self.settings.scheduler_extra_args
@@ -72,10 +341,10 @@ class EmopSLURM(EmopScheduler):
         cmd.append("emop.slrm")
         return cmd
 
-    def submit_job(self, proc_id, num_pages):
+    def submit_job(self, proc_id, num_pages, runtime=None):
         """Submit a job to SLURM
 
-        Before the job is submitted some environment variables are set
+        The job is submitted with some environment variables set
         which are then used by SLURM.
 
         ``PROC_ID`` tells the SLURM job which JSON file to load.
@@ -84,6 +353,7 @@ class EmopSLURM(EmopScheduler):
         Args:
             proc_id (str or int): proc_id to be used by submitted job
             num_pages (int): Number of pages being scheduled
+            runtime (float, optional): Predicted runtime of the job's pages
 
         Returns:
             bool: True if successful, False otherwise.
@@ -92,13 +362,76 @@ class EmopSLURM(EmopScheduler):
             logger.error("EmopSLURM#submit_job(): Must provide valid proc_id.")
             return False
 
-        os.environ['PROC_ID'] = proc_id
-        os.environ['EMOP_CONFIG_PATH'] = self.settings.config_path
-        cmd = self.get_submit_cmd(num_pages)
-        proc = exec_cmd(cmd, log_level="debug")
+        env = os.environ.copy()
+        env['PROC_ID'] = proc_id
+        env['EMOP_CONFIG_PATH'] = self.settings.config_path
+        cmd = self.get_submit_cmd(num_pages, runtime=runtime, comment=proc_id)
+        proc = exec_cmd(cmd, log_level="debug", env=env)
         if proc.exitcode != 0:
             logger.error("Failed to submit job to SLURM: %s" % proc.stderr)
             return False
         slurm_job_id = proc.stdout.rstrip()
         logger.info("SLURM job %s submitted for PROC_ID %s" % (slurm_job_id, proc_id))
+        self.clear_snapshot()
         return True
+
+    def submit_jobs(self, jobs):
+        """Submit many jobs to SLURM
+
+        When the ``array`` scheduler setting is enabled the jobs are
+        submitted as job arrays of at most ``max_array_size`` tasks, as SLURM
+        rejects arrays larger than its MaxArraySize.
+
+        Args:
+            jobs (list): (proc_id, num_pages, runtime) tuples
+
+        Returns:
+            int: Number of jobs submitted.
+        """
+        if not self.settings.scheduler_array or len(jobs) < 2:
+            return super(EmopSLURM, self).submit_jobs(jobs)
+
+        submitted = 0
+        size = max(1, self.settings.scheduler_max_array_size)
+        for i in range(0, len(jobs), size):
+            submitted += self.submit_array(jobs[i:i + size])
+        return submitted
+
+    def submit_array(self, jobs):
+        """Submit jobs to SLURM as a job array
+
+        The proc_ids are written one per line to a manifest file and
+        emop.slrm uses ``SLURM_ARRAY_TASK_ID`` to pick its proc_id from
+        ``EMOP_PROC_ID_MANIFEST``.
+
+        The array's walltime is based on the job with the most pages,
+        or the longest predicted runtime if every job has one.
+
+        Args:
+            jobs (list): (proc_id, num_pages, runtime) tuples
+
+        Returns:
+            int: Number of jobs submitted.
+        """
+        proc_ids = [j[0] for j in jobs]
+        num_pages = max(int(j[1]) for j in jobs)
+        runtimes = [j[2] for j in jobs]
+        runtime = max(runtimes) if all(runtimes) else None
+        manifest_dir = self.settings.payload_input_path
+        mkdirs_exists_ok(manifest_dir)
+        manifest = os.path.join(manifest_dir, "%s.manifest" % proc_ids[0])
+        with open(manifest, 'w') as f:
+            f.write("\n".join(proc_ids) + "\n")
+
+        env = os.environ.copy()
+        env['EMOP_PROC_ID_MANIFEST'] = manifest
+        env['EMOP_CONFIG_PATH'] = self.settings.config_path
+        cmd = self.get_submit_cmd(num_pages, array_size=len(proc_ids), runtime=runtime, comment=manifest)
+        proc = exec_cmd(cmd, log_level="debug", env=env)
+        if proc.exitcode != 0:
+            logger.error("Failed to submit job array to SLURM: %s" % proc.stderr)
+            return 0
+        slurm_job_id = proc.stdout.rstrip()
+        logger.info("SLURM job array %s submitted for %d PROC_IDs in %s" % (slurm_job_id, len(proc_ids), manifest))
+        self.clear_snapshot()
+        return len(proc_ids)
@@ -50,7 +50,7 @@ def mkdirs_exists_ok(path):
         if exception.errno != errno.EEXIST:
             raise
 
-def exec_cmd(cmd, log_level="info", timeout=-1):
+def exec_cmd(cmd, log_level="info", timeout=-1, env=None):
     """Executes a command
 
     This is the method used by this application to execute
@@ -66,6 +66,8 @@ def exec_cmd(cmd, log_level="info", timeout=-1):
             about the command being executed.
         timeout (int, optional): The time in seconds the command should
             be allowed to run before timing out.
+        env (dict, optional): Environment for the command, defaults
+            to os.environ.
 
     Returns:
         tuple: (stdout, stderr, exitcode)
@@ -93,7 +95,8 @@ def exec_cmd(cmd, log_level="info", timeout=-1):
     try:
         # TODO Eventually may just need to redirect all stderr to stdout for simplicity
         # process = subprocess32.Popen(cmd, stdout=subprocess32.PIPE, stderr=subprocess32.STDOUT, env=os.environ)
-        process = subprocess32.Popen(cmd, stdout=subprocess32.PIPE, stderr=subprocess32.PIPE, env=os.environ)
+        process = subprocess32.Popen(cmd, stdout=subprocess32.PIPE, stderr=subprocess32.PIPE,
+                                     env=os.environ if env is None else env)
         out, err = process.communicate(timeout=timeout)
         retval = process.returncode
         return Proc(stdout=out, stderr=err, exitcode=retval)
@@ -6,6 +6,7 @@ import json
 import numpy as np;
 import parseOCR as p;
 import peaks_find as pks;
+import intersection_profile as ip;
 #import matplotlib.pyplot as pl
 
 def multiColumnDetect(inFile):
@@ -33,24 +34,6 @@ def multiColumnDetect(inFile):
             return 0.0
         else:
             return x_overlap*y_overlap
-    def findIntercept(coor2,coor1):
-        slope = np.divide(1,np.subtract(coor1,coor2))
-        b = np.subtract(1,np.multiply(slope,coor1))
-        return b
-    
-    def calculateIntersectionA(s,i):
-        # s = slope and i = intercept
-        return np.add(np.multiply(s,wordInfo[indexToConsider,1]),np.subtract(i,wordInfo[indexToConsider,2]))
-    
-    def calculateIntersectionB(s,i):
-        return np.add(np.multiply(s,wordInfo[indexToConsider,3]),np.subtract(i,wordInfo[indexToConsider,4]))
-    
-    def calculateIntersectionC(s,i):
-        return np.add(np.multiply(s,wordInfo[indexToConsider,1]),np.subtract(i,wordInfo[indexToConsider,4]))
-    
-    def calculateIntersectionD(s,i):
-        return np.add(np.multiply(s,wordInfo[indexToConsider,3]),np.subtract(i,wordInfo[indexToConsider,2]))
-    
     # Supporter functions
     def movingaverage(interval, window_size):
         window = np.ones(int(window_size))/float(window_size)
@@ -67,51 +50,6 @@ def multiColumnDetect(inFile):
     def convertArrToTuple(arr):
         return arr[0]
     
-    def find_X_Profile(xPointsUp,min_x,min_y):
-        if ((xPointsUp-0.1)<=min_x) and (xPointsUp+0.1)<max_x:
-            if xPointsUp<min_x:
-                xPointBelow= np.arange(min_x,(xPointsUp+0.1+(min_x-xPointsUp)),0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-            else:
-                xPointBelow= np.arange(min_x,(xPointsUp+0.1),0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        if ((xPointsUp-0.1)>min_x) and (xPointsUp+0.1)>=max_x:
-            if xPointsUp>max_x:
-                xPointBelow=np.arange((xPointsUp-0.1-(xPointsUp-max_x)),max_x,0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-            else:
-                xPointBelow=np.arange((xPointsUp-0.1),max_x,0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        if ((xPointsUp-0.1)>min_x) and (xPointsUp+0.1)<max_x:
-            xPointBelow=np.arange((xPointsUp-0.1),(xPointsUp+0.1),0.01)
-            xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        if ((xPointsUp-0.1)<min_x) and (xPointsUp+0.1)>max_x:
-            xPointBelow=np.arange((xPointsUp-0.1),(xPointsUp+0.1),0.01)
-            xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        slopeTemp = np.divide(1,np.subtract(xPointsUp,xPointBelow))
-        
-        func1 = np.vectorize(findIntercept)
-    
-        intercept = func1(xPointBelow,xPointsUp)
-        
-        countArray = np.ndarray((np.size(slopeTemp),1),int)
-        for i in range(0,np.size(slopeTemp)):
-            ixA = calculateIntersectionA(slopeTemp[i],intercept[i])
-            ixB = calculateIntersectionB(slopeTemp[i],intercept[i])
-            tempB = np.multiply(ixA,ixB);
-            ixC = calculateIntersectionC(slopeTemp[i],intercept[i])
-            ixD = calculateIntersectionD(slopeTemp[i],intercept[i])
-            tempC = np.multiply(ixC,ixD)
-            tempB = tempB<0;
-            tempC = tempC<0;
-            countArray[i] = np.size(np.ix_(tempB | tempC))
-        return np.min(countArray)
-    
-    
     # Calculate page bounds
     max_x =(np.max(wordInfo[:,3]));
     max_y = (np.max(wordInfo[:,2]));
@@ -128,8 +66,7 @@ def multiColumnDetect(inFile):
     indexToConsider = wordInfo[:,2]<((max_y-stepFromTop))
     indexToConsiderTemp = wordInfo[:,4]>((min_y+stepFromTop))
     indexToConsider = indexToConsider & indexToConsiderTemp;    
-    xProfileFunc = np.vectorize(find_X_Profile)
-    intersectionCountProfile = xProfileFunc(xPointsUp,min_x,min_y)
+    intersectionCountProfile = ip.intersection_profile(xPointsUp,wordInfo[indexToConsider,:],min_x,max_x)
     
     # Smooth the signal
     zerosIndex = np.ix_(intersectionCountProfile==0);
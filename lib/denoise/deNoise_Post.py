@@ -4,7 +4,6 @@
 
 #sys.path.append('/home/anshulg/PythonPackages/lib/python')
 
-import bs4
 import numpy as np
 #import matplotlib.pyplot as pl
 #import peaks_find as pks
@@ -15,6 +14,10 @@ from math import pi, log
 from scipy import fft, ifft
 from scipy.optimize import curve_fit
 import os;
+import intersection_profile as ip
+import hocr_output as ho
+import neighbor_graph as ng
+import relabeling as rl
 #from memory_profiler import profile
 
 #@profile    
@@ -662,55 +665,6 @@ def deNoise(filePath,fileName,debugFlag):
         return indices 
         # used this to test the fft function's sensitivity to spectral leakage
         #return indices + np.asarray(30 * np.random.randn(len(indices)), int)
-        # Calculate X profile for page split
-    def find_X_Profile(xPointsUp,min_x,min_y):
-        if ((xPointsUp-0.1)<=min_x) and (xPointsUp+0.1)<max_x:
-            if xPointsUp<min_x:
-                xPointBelow= np.arange(min_x,(xPointsUp+0.1+(min_x-xPointsUp)),0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-            else:
-                xPointBelow= np.arange(min_x,(xPointsUp+0.1),0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        if ((xPointsUp-0.1)>min_x) and (xPointsUp+0.1)>=max_x:
-            if xPointsUp>max_x:
-                xPointBelow=np.arange((xPointsUp-0.1-(xPointsUp-max_x)),max_x,0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-            else:
-                xPointBelow=np.arange((xPointsUp-0.1),max_x,0.01)
-                xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        if ((xPointsUp-0.1)>min_x) and (xPointsUp+0.1)<max_x:
-            xPointBelow=np.arange((xPointsUp-0.1),(xPointsUp+0.1),0.01)
-            xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        if ((xPointsUp-0.1)<min_x) and (xPointsUp+0.1)>max_x:
-            xPointBelow=np.arange((xPointsUp-0.1),(xPointsUp+0.1),0.01)
-            xPointBelow = xPointBelow[abs(xPointBelow-xPointsUp)>0.001]
-        
-        slopeTemp = np.divide(1,np.subtract(xPointsUp,xPointBelow))
-        
-        func1 = np.vectorize(findIntercept)
-
-        intercept = func1(xPointBelow,xPointsUp)
-        
-        countArray = np.ndarray((np.size(slopeTemp),1),int)
-
-        
-        for i in range(0,np.size(slopeTemp)):
-            ixA = calculateIntersectionA(slopeTemp[i],intercept[i])
-            ixB = calculateIntersectionB(slopeTemp[i],intercept[i])
-            tempB = np.multiply(ixA,ixB);
-            ixC = calculateIntersectionC(slopeTemp[i],intercept[i])
-            ixD = calculateIntersectionD(slopeTemp[i],intercept[i])
-            tempC = np.multiply(ixC,ixD)
-            tempB = tempB<0;
-            tempC = tempC<0;
-            countArray[i] = np.size(np.ix_(tempB | tempC))
-    
-            
-        return np.min(countArray)
-          
     def intersectArea(coor1,coor2):
         x11 = coor1[0]
         y11 = coor1[1]
@@ -726,24 +680,6 @@ def deNoise(filePath,fileName,debugFlag):
             return 0.0
         else:
             return x_overlap*y_overlap
-    def findIntercept(coor2,coor1):
-        slope = np.divide(1,np.subtract(coor1,coor2))
-        b = np.subtract(1,np.multiply(slope,coor1))
-        return b
-    
-    def calculateIntersectionA(s,i):
-        # s = slope and i = intercept
-        return np.add(np.multiply(s,preFilteredData[indexToConsider,1]),np.subtract(i,preFilteredData[indexToConsider,2]))
-    
-    def calculateIntersectionB(s,i):
-        return np.add(np.multiply(s,preFilteredData[indexToConsider,3]),np.subtract(i,preFilteredData[indexToConsider,4]))
-    
-    def calculateIntersectionC(s,i):
-        return np.add(np.multiply(s,preFilteredData[indexToConsider,1]),np.subtract(i,preFilteredData[indexToConsider,4]))
-    
-    def calculateIntersectionD(s,i):
-        return np.add(np.multiply(s,preFilteredData[indexToConsider,3]),np.subtract(i,preFilteredData[indexToConsider,2]))    
-    
     # Supporter functions
     def movingaverage(interval, window_size):
         window = np.ones(int(window_size))/float(window_size)
@@ -757,78 +693,11 @@ def deNoise(filePath,fileName,debugFlag):
                 break;
         return cut_
     
-    def distCalulationNew(a,b):
-        distWord = np.subtract(a[:,[1,2]],b);
-        distWord = np.power(distWord,2);
-        distWord1 = np.power(np.sum(distWord,axis=1),0.5);
-        
-        distWord = np.subtract(a[:,[3,2]],b);
-        distWord = np.power(distWord,2);
-        distWord2 = np.power(np.sum(distWord,axis=1),0.5);
-        
-        distWord = np.subtract(a[:,[1,4]],b);
-        distWord = np.power(distWord,2);
-        distWord3 = np.power(np.sum(distWord,axis=1),0.5);
-        
-        distWord = np.subtract(a[:,[3,4]],b);
-        distWord = np.power(distWord,2);
-        distWord4 = np.power(np.sum(distWord,axis=1),0.5);
-        
-        distVec = np.array([distWord1,distWord2,distWord3,distWord4])
-        
-        return distVec
-    
-    # Neural Netwrok Parameters
-    # Netwrok Weight Matrix            
-    IW =np.matrix( np.array([[-0.594140000082075,	0.0284426552800584,	0.633962614499578	,3.28625526733271,	0.135357920986002,	0.0744090237062824,	-0.104335668169507],
-                   [0.582301257544410,	1.02518630598767,	-9.11772639809179	,-0.402524297693123,	0.0102389560044855,	-0.0791970693550233,	0.369262689723785],
-                    [0.239984949103749,	-87.5269134098991	,-33.8991260602495,	1.17564645973248,	-1.12089713455975	,-0.983194853356573,	-47.6282329029053],
-                    [0.235158115252368,	-19.1996471786875	,-440.781581422114	,7.55469040107880,	0.316909768618500	,-0.0395229877154089,	0.210814777210327],
-                    [4.40901664698217,	16.1450856630481,	0.0906903536753684,	-5.39330399600042,	-0.617335318223031,	-0.223181914782527,	-0.0180602735321480],
-                    [-0.540902931519254,	-131.891721211789	,-55.5540477615985	,-3.04419286543500	,-0.0953696784219757,	-0.118330193755444,	-0.0293326608826203],
-                    [0.268341734790750,	6.21756468534859,	1.10959003485922,	15.1283657342125,	0.00161804321049251,	-0.0196312514795930,	0.178605142680341],
-                    [0.361328059849469,	0.210300855715019,	-0.607497545986723,	-3.22209066515691,	-0.112050733164288,	-0.0519265549320669,	0.0699452632434586]])  ) 
-                    
-    # Bias for hidden layer    
-    b1 = np.matrix(np.array([[ 1.23003200158914],
-        [-10.3246201755893],
-      [-82.9226929464117],
-        [-457.603059874791],
-       [ 16.7138065068903],
-        [-188.825283911144],
-      [10.1739148122845],
-      [-1.13862142860185]])   )
-    
-    # Bias for output layer
-    b2 = np.matrix(np.array([[-31.8507],
-                    [33.0516]]))
-    
-    LW =np.matrix( np.array([[ -34.0506100659894,	31.2573651380090,	0.466550632307331	,-4.00279418916034,	-1.25936711908938	,-51.8134696327409,	-4.00089910338376,	-46.4067607691938],
-                   [35.1466171843005,	-30.8357383677796,	-0.887824702053121,	4.38946074239154,	1.40004866498257,	51.6906113788625,	4.50615099912734	,47.1133076956261]])     )
-    
-    maxVec = np.array([0.939940000000000 , 89.1880000000000 ,   0.0399480000000000 , 57.1560000000000   , 1.0   , 0.999020000000000  , 0.544920000000000]);
-    minVec = np.array([0.0    ,   0.0125960000000000   ,     5.96050000000000e-08 , -34.9380000000000,  -1    ,     0.0  ,     0.0]);
-    
-    # Neural netwrok activation function
-    def tansig(dat):
-        return np.subtract(np.divide(2,(1+np.exp(np.multiply(-2,dat)))),1);
-    
-    def softmax(dat):
-        temp=np.exp(dat)
-        tempSum = np.sum(temp)
-        out = np.divide(temp,tempSum)
-        return out
-        
-    # Neural Network Simulation funtion
-    def nnSim(normDat,IW,LW,b1,b2):
-        hiddenOutput = tansig(IW*normDat + b1);
-        outputActivation = (LW*hiddenOutput + b2)
-        return softmax(outputActivation)
     #Extract word coordinate information, ocr conf and height and width information
     fileName1 = "%s%s"%(filePath,fileName) #"53211844_160.xml"
     if os.path.isfile(fileName1)==False:
         return 0
-    soup = bs4.BeautifulSoup(open(fileName1)) #51150019_1 - test 379_1 ; 2271337_13 - test id=6, 380_13; 45949734_1 , 45444878_5, 53211844_160 - 132 and 160; 48898051_301 131 and 301 ; 45509238_1 - 128 and 1; 45977751_1 128 and 
+    soup = ho.parse_hocr(fileName1) #51150019_1 - test 379_1 ; 2271337_13 - test id=6, 380_13; 45949734_1 , 45444878_5, 53211844_160 - 132 and 160; 48898051_301 131 and 301 ; 45509238_1 - 128 and 1; 45977751_1 128 and 
     pageInfo = soup.find_all('div',class_="ocr_page")# id='page_1'
     if pageInfo.__len__()>1:
         f_log = open("multiple-page-errors.txt","a") 
@@ -841,8 +710,8 @@ def deNoise(filePath,fileName,debugFlag):
     pageWidth = float(pageWidth)
     pageHeight = float(pageHeight)
     
-    allSpanTags = [];
-    allSpanTags=soup.find_all("span",class_="ocrx_word")
+    # Index the words by id so the predictions are set without searching the page
+    allSpanTags,wordSpans = ho.index_words(soup)
     
     wordInfo = np.ndarray((allSpanTags.__len__(),8))
     wordInfoNon_Scaled = np.ndarray((allSpanTags.__len__(),8))
@@ -905,8 +774,7 @@ def deNoise(filePath,fileName,debugFlag):
             indexToConsider = preFilteredData[:,2]<((max_y-stepFromTop))
             indexToConsiderTemp = preFilteredData[:,4]>((min_y+stepFromTop))
             indexToConsider = indexToConsider & indexToConsiderTemp;    
-            xProfileFunc = np.vectorize(find_X_Profile)
-            intersectionCountProfile = xProfileFunc(xPointsUp,min_x,min_y)
+            intersectionCountProfile = ip.intersection_profile(xPointsUp,preFilteredData[indexToConsider,:],min_x,max_x)
             
             # Smooth the signal
             zerosIndex = np.ix_(intersectionCountProfile==0);
@@ -1064,7 +932,6 @@ def deNoise(filePath,fileName,debugFlag):
                 k=11;
                 alpha = 7;
                 max_iter = 20;
-                k1=k;k2=k;k3=k;k4=k;
                 finalFilterTemp = finalFilter[actualIndexToConsider];
                 finalFilterTemp1 = np.zeros(finalFilterTemp.shape)
                 #nnArea = np.zeros(finalFilterTemp.shape);
@@ -1076,8 +943,6 @@ def deNoise(filePath,fileName,debugFlag):
                 tempWidth = bboxcenterRelabellingActual[:,6];
                 tempArea = np.multiply(tempHeight,tempWidth);
                 
-                prevfinalFilterTemp = 999;
-                
                 if np.size(preFilteredData[indexToConsider,5])>0:
                     iqrHeight = np.percentile(preFilteredData[indexToConsider,5],[25,75])
                     iqrHeight = abs(iqrHeight[0] - iqrHeight[1])
@@ -1091,165 +956,17 @@ def deNoise(filePath,fileName,debugFlag):
                     iqrHeight = 1.0
                 
                 confTemp = wordInfo[actualIndexToConsider,7];
-                iter_ = 0;
-                count_ = 0;
-                numPrevError = -999;
-                numCurrentError = 0;
-                onlyOneBoxFlag = 0;
-                if np.size(finalFilterTemp)==1:
-                    onlyOneBoxFlag=1;
-                while(((np.size(np.ix_(finalFilterTemp!=prevfinalFilterTemp)) > 1) and (iter_< max_iter) and (count_<3)) or onlyOneBoxFlag==1): 
-                    numCurrentError = (np.size(np.ix_(finalFilterTemp!=prevfinalFilterTemp)))
-                    if numPrevError==numCurrentError:
-                        count_ = count_+1;
-                    numPrevError=numCurrentError    
-                    #print iter_  ,(np.size(np.ix_(finalFilterTemp!=prevfinalFilterTemp)))              
-                    iter_ = iter_ + 1;
-                    prevfinalFilterTemp = np.copy(finalFilterTemp);
-                    preLabel = np.copy(finalFilterTemp);
-                    for word in range(0,np.size(finalFilterTemp)):
-                        k1=k;k2=k;k3=k;k4=k;
-                        fillterWord = np.ones(finalFilterTemp.shape);
-                        fillterWord[word] = 0;
-                        kNeigh=np.array([]);
-                        remainingBbox = fillterWord==1
-                        wordInOrgDoc = bboxcenterRelabellingActual[word,:];                    
-                        dist1 = np.min(distCalulationNew(bboxcenterRelabellingActual[remainingBbox,:],wordInOrgDoc[[1,2]]),axis=0)
-                        dist2 = np.min(distCalulationNew(bboxcenterRelabellingActual[remainingBbox,:],wordInOrgDoc[[1,4]]),axis=0)
-                        dist3 = np.min(distCalulationNew(bboxcenterRelabellingActual[remainingBbox,:],wordInOrgDoc[[3,2]]),axis=0)
-                        dist4 = np.min(distCalulationNew(bboxcenterRelabellingActual[remainingBbox,:],wordInOrgDoc[[3,4]]),axis=0)
-                        
-                        selInd1 = np.ix_(dist1<D_max);
-                        selInd2 = np.ix_(dist2<D_max);
-                        selInd3 = np.ix_(dist3<D_max);
-                        selInd4 = np.ix_(dist4<D_max);
-                        
-                        if np.size(selInd1)<k:
-                            k1 = np.size(selInd1)
-                        
-                        if np.size(selInd2)<k:
-                            k2 = np.size(selInd2)    
-                        
-                        if np.size(selInd3)<k:
-                            k3 = np.size(selInd3)
-                        
-                        if np.size(selInd4)<k:
-                            k4 = np.size(selInd4)
-                            
-                        if np.any(np.array([k1,k2,k3,k4])>0):
-                            ind1 = np.argsort(dist1[selInd1])
-                            val1 = dist1[selInd1[0][ind1]]
-                            
-                            ind2 = np.argsort(dist2[selInd2])
-                            val2 = dist2[selInd2[0][ind2]]
-        
-                            ind3 = np.argsort(dist3[selInd3])
-                            val3 = dist3[selInd3[0][ind3]]                                           
-                            
-                            ind4 = np.argsort(dist4[selInd4])
-                            val4 = dist4[selInd4[0][ind4]]
-                            remainingBbox = np.ix_(remainingBbox)
-                            if k1!=0:
-                                index = ind1;
-                                kNeigh = np.array([dist1[selInd1[0][index[range(0,k1)]]],finalFilterTemp[remainingBbox[0][selInd1[0][index[range(0,k1)]]]],tempArea[remainingBbox[0][selInd1[0][index[range(0,k1)]]]],remainingBbox[0][selInd1[0][index[range(0,k1)]]],tempWidth[remainingBbox[0][selInd1[0][index[range(0,k1)]]]],tempHeight[remainingBbox[0][selInd1[0][index[range(0,k1)]]]]]);
-        
-                            if k2!=0:
-                                index = ind2;
-                                if np.size(kNeigh)>0:
-                                    kNeigh = np.append(kNeigh,np.array([dist2[selInd2[0][index[range(0,k2)]]],finalFilterTemp[remainingBbox[0][selInd2[0][index[range(0,k2)]]]],tempArea[remainingBbox[0][selInd2[0][index[range(0,k2)]]]],remainingBbox[0][selInd2[0][index[range(0,k2)]]],tempWidth[remainingBbox[0][selInd2[0][index[range(0,k2)]]]],tempHeight[remainingBbox[0][selInd2[0][index[range(0,k2)]]]]]),1);                            
-                                else:
-                                    kNeigh = np.array([dist2[selInd2[0][index[range(0,k2)]]],finalFilterTemp[remainingBbox[0][selInd2[0][index[range(0,k2)]]]],tempArea[remainingBbox[0][selInd2[0][index[range(0,k2)]]]],remainingBbox[0][selInd2[0][index[range(0,k2)]]],tempWidth[remainingBbox[0][selInd2[0][index[range(0,k2)]]]],tempHeight[remainingBbox[0][selInd2[0][index[range(0,k2)]]]]])
-                                
-                                
-                            if k3!=0:
-                                index = ind3[range(0,k3)];
-                                
-                                for i3 in range(0,np.size(index)):
-                                    if k1!=0:
-                                        if np.any(index[i3]==ind1[range(0,k1)]):
-                                            index[i3] = -999
-                                    else:
-                                        break
-                                index = index[index!=-999]
-                                k3 = np.size(index)
-                                if k3!=0:
-                                    if np.size(kNeigh)>0:
-                                        kNeigh = np.append(kNeigh,np.array([dist3[selInd3[0][index[range(0,k3)]]],finalFilterTemp[remainingBbox[0][selInd3[0][index[range(0,k3)]]]],tempArea[remainingBbox[0][selInd3[0][index[range(0,k3)]]]],remainingBbox[0][selInd3[0][index[range(0,k3)]]],tempWidth[remainingBbox[0][selInd3[0][index[range(0,k3)]]]],tempHeight[remainingBbox[0][selInd3[0][index[range(0,k3)]]]]]),1);    
-                                    else:
-                                        kNeigh = np.array([dist3[selInd3[0][index[range(0,k3)]]],finalFilterTemp[remainingBbox[0][selInd3[0][index[range(0,k3)]]]],tempArea[remainingBbox[0][selInd3[0][index[range(0,k3)]]]],remainingBbox[0][selInd3[0][index[range(0,k3)]]],tempWidth[remainingBbox[0][selInd3[0][index[range(0,k3)]]]],tempHeight[remainingBbox[0][selInd3[0][index[range(0,k3)]]]]])
-                                        
-                                
-                            if k4!=0:
-                                index = ind4[range(0,k4)];
-                                for i4 in range(0,np.size(index)):
-                                    if k2!=0:
-                                        if np.any(index[i4]==ind2[range(0,k2)]):
-                                            index[i4] = -999
-                                    else:
-                                        break
-                                index = index[index!=-999]
-                                k4 = np.size(index)
-                                if k4!=0:
-                                    if np.size(kNeigh)>0:
-                                        kNeigh = np.append(kNeigh,np.array([dist4[selInd4[0][index[range(0,k4)]]],finalFilterTemp[remainingBbox[0][selInd4[0][index[range(0,k4)]]]],tempArea[remainingBbox[0][selInd4[0][index[range(0,k4)]]]],remainingBbox[0][selInd4[0][index[range(0,k4)]]],tempWidth[remainingBbox[0][selInd4[0][index[range(0,k4)]]]],tempHeight[remainingBbox[0][selInd4[0][index[range(0,k4)]]]]]),1);    
-                                    else:
-                                        kNeigh = np.array([dist4[selInd4[0][index[range(0,k4)]]],finalFilterTemp[remainingBbox[0][selInd4[0][index[range(0,k4)]]]],tempArea[remainingBbox[0][selInd4[0][index[range(0,k4)]]]],remainingBbox[0][selInd4[0][index[range(0,k4)]]],tempWidth[remainingBbox[0][selInd4[0][index[range(0,k4)]]]],tempHeight[remainingBbox[0][selInd4[0][index[range(0,k4)]]]]])
-                                
-                            if np.size(kNeigh)>0:
-                                wNeigh = np.divide(1,kNeigh[0,:])
-                                for inD in range(0,np.size(wNeigh)):
-                                    if np.isnan(wNeigh[inD]) or np.isinf(wNeigh[inD]):
-                                        wNeigh[inD]=1.0;
-                                preLabel[word] = np.divide(np.sum(np.multiply(kNeigh[1,:],wNeigh)),np.sum(wNeigh))
-                                #areaAA = tempArea[word];
-                                #nnArea[word] = np.average(abs(np.divide(np.subtract(areaAA,kNeigh[2,:]),areaAA)))
-                                #nnCoordinates = bboxcenterRelabellingActual[kNeigh[3,:],:];
-                                #overlapArea = 0.0;
-                                #for i in range(0,kNeigh[3,:].shape[0]):
-                                #    overlapArea = overlapArea + intersectArea([bboxcenterRelabellingActual[kNeigh[3,i],1],bboxcenterRelabellingActual[kNeigh[3,i],4],kNeigh[4,i],kNeigh[5,i]],[bboxcenterRelabellingActual[word,1],bboxcenterRelabellingActual[word,4],tempWidth[word],tempHeight[word]])
-                                #overlapNN[word] = overlapArea;
-        
-                    xTemp = np.array([])
-                    bbox_center = np.array([np.mean(bboxcenterRelabellingActual[:,[1,3]],axis=1),np.mean(bboxcenterRelabellingActual[:,[2,4]],axis=1)]);
-                    y_dist1 = abs(1-bbox_center[1,:]);
-                    x_dist1 = abs(((tempCutPoint+prevCutPoint)/2)-bbox_center[0,:]);
-                    if iqrHeight==0.0:
-                        iqrHeight = 1.0;
-                    xTemp = np.array([confTemp,np.divide(tempHeight,tempWidth),np.multiply(tempHeight,tempWidth),np.divide(np.subtract(tempHeight,medianHeight),iqrHeight),preLabel,y_dist1,x_dist1])
-                    removeBboxesWithConf = xTemp[0,:]<0.95;
-                    removeRatioInf = np.isinf(xTemp[1,:])
-                    removeRatioInf1 = ~removeRatioInf
-                    removeRatioNan = np.isnan(xTemp[1,:])
-                    removeRatioNan1 = ~removeRatioNan
-                    fullRemove = removeBboxesWithConf & removeRatioInf1 & removeRatioNan1
-                    xTemp= xTemp[:,fullRemove];
-                    normX = np.zeros(xTemp.shape)
-                    for v in range(0,xTemp.shape[0]):
-                        normX[v,:] = np.divide(np.subtract(xTemp[v,:],minVec[v]),(maxVec[v] - minVec[v]))
-                    for v in range(0,xTemp.shape[0]):
-                        normX[v,:] = 2*normX[v,:] -1
-                    normX = np.matrix(normX);
-                    confValTemp = 0.95*np.ones(finalFilterTemp.shape);
-                    confValTempAfterConfRem = confValTemp[removeBboxesWithConf] 
-                    tempPred = finalFilterTemp[removeBboxesWithConf]
-                    for col in range(0,normX.shape[1]):
-                        simOut = nnSim(normX[:,col],IW,LW,b1,b2)   
-                        index_max=np.argmax(simOut)
-                        max_value = simOut[index_max]
-                       # print max_value
-                        confValTempAfterConfRem[col] = max_value
-                        if index_max==1:
-                            tempPred[col] = -1
-                        else:
-                            tempPred[col] = 1
-                    confValTemp[removeBboxesWithConf] = confValTempAfterConfRem;
-                    finalFilterTemp[removeBboxesWithConf]  = tempPred
-                    if np.size(finalFilterTemp)==1:
-                        onlyOneBoxFlag=0;
-                    #New addition
-                    #finalFilterTemp[removeRatioInf]=-1
-                    #finalFilterTemp[removeRatioNan]=-1
-                    
+                bbox_center = np.array([np.mean(bboxcenterRelabellingActual[:,[1,3]],axis=1),np.mean(bboxcenterRelabellingActual[:,[2,4]],axis=1)]);
+                y_dist1 = abs(1-bbox_center[1,:]);
+                x_dist1 = abs(((tempCutPoint+prevCutPoint)/2)-bbox_center[0,:]);
+                if iqrHeight==0.0:
+                    iqrHeight = 1.0;
+                # Only the neighbor label average changes between iterations, it is filled in by relabel_column
+                xTemp = np.array([confTemp,np.divide(tempHeight,tempWidth),np.multiply(tempHeight,tempWidth),np.divide(np.subtract(tempHeight,medianHeight),iqrHeight),finalFilterTemp,y_dist1,x_dist1])
+                # The neighbors only depend on the box positions, find them once for every iteration
+                neighborGraph = ng.NeighborGraph(bboxcenterRelabellingActual,D_max,k)
+                finalFilterTemp,confValTemp,relabelStats = rl.relabel_column(neighborGraph,xTemp,finalFilterTemp,confTemp<0.95,max_iter)
+                print "RELABEL ITERATIONS: %d AVERAGED: %d SCORED: %d CONVERGED: %d" % (relabelStats["iterations"],relabelStats["averaged"],relabelStats["scored"],relabelStats["converged"])
                     
                 indactualIndexToConsider= np.ix_(actualIndexToConsider)[0];
                 #print np.size(indactualIndexToConsider)
@@ -1268,104 +985,25 @@ def deNoise(filePath,fileName,debugFlag):
             #f_log.close()
             Noisemeasure = float(np.ix_(MLFilter==0)[0].__len__())/float(MLFilter.__len__());
             #make two hOCR files
-            soupTemp1 = bs4.BeautifulSoup(open(fileName1))
-            pgInfo1 = soupTemp1.find_all('div',class_="ocr_page")
-            soup1= pgInfo1[0];      
-            for word_id in range(0,np.size(wordInfo[:,0])):
-                confValTemp = confVal[word_id];
-                if MLFilter[word_id]==1:
-                    confValTemp = 1.0 - confVal[word_id];                    
-                temp = soup.find("span",class_="ocrx_word",id="word_%d"%(wordInfo[word_id,0]))
-                temp1 = temp['title'].split(';');
-                temp['title'] = "%s;%s; pred %d; noiseConf %.4f"%(temp1[0],temp1[1 ],MLFilter[word_id],confValTemp)
-                if MLFilter[word_id]==0:
-                    temp1 = soup1.find("span",class_="ocrx_word",id="word_%d"%(wordInfo[word_id,0]))
-                    temp1.extract()
-            
-            # insert noisemeasure
-            tempNoiseM = soup["title"];
-            tempNoiseM1 = tempNoiseM.split(";");
-            soup["title"]="%s;%s;%s; noisiness %.4f"%(tempNoiseM1[0],tempNoiseM1[1 ],tempNoiseM1[2],Noisemeasure);
-            
-            f = open("%s%s_TEMP.xml"%(filePath,fileName.replace('.xml','')),'w')
-            f.write(soupInit.encode())
-            f.close()
-            os.remove("%s%s.xml"%(filePath,fileName.replace('.xml','')))
-            os.rename("%s%s_TEMP.xml"%(filePath,fileName.replace('.xml','')),"%s%s.xml"%(filePath,fileName.replace('.xml','')))
-
-#            toDel = np.ix_(MLFilter==0)[0]
-#            soup1 = bs4.BeautifulSoup(open(fileName1))
-#            for word_id in range(0,np.size(toDel)):
-#                temp = soup1.find("span",class_="ocrx_word",id="word_%d"%(wordInfo[toDel[word_id],0]))
-#                temp.extract()
-             # insert noisemeasure
-            tempNoiseM = soup1["title"];
-            tempNoiseM1 = tempNoiseM.split(";");
-            soup1["title"]="%s;%s;%s; noisiness %.4f"%(tempNoiseM1[0],tempNoiseM1[1 ],tempNoiseM1[2],Noisemeasure);
-            f = open("%s%s_IDHMC.xml"%(filePath,fileName.replace('.xml','')),'w')
-            f.write(soupTemp1.encode())
-            f.close()
+            noiseConf = np.where(MLFilter==1,1.0 - confVal,confVal)
+            titles = ho.annotate_words(wordSpans,wordInfo[:,0],MLFilter,noiseConf)
+            ho.annotate_page(soup,Noisemeasure)
+            # The _IDHMC copy leaves out the noise words and keeps their original titles
+            noiseIds = ["word_%d"%(wordInfo[word_id,0]) for word_id in np.ix_(MLFilter==0)[0]]
+            ho.write_outputs(soupInit,"%s%s"%(filePath,fileName.replace('.xml','')),wordSpans,titles,noiseIds)
             return Noisemeasure;
         else:
             #make two hOCR files
-            for word_id in range(0,np.size(wordInfo[:,0])):
-                temp = soup.find("span",class_="ocrx_word",id="word_%d"%(wordInfo[word_id,0]))
-                temp1 = temp['title'].split(';');
-                temp['title'] = "%s;%s; pred %d; noiseConf %.4f"%(temp1[0],temp1[1 ],-1,-1)
-            
-            tempNoiseM = soup["title"];
-            tempNoiseM1 = tempNoiseM.split(";");
-            soup["title"]="%s;%s;%s; noisiness %.4f"%(tempNoiseM1[0],tempNoiseM1[1 ],tempNoiseM1[2],0.0);
-            
-            f = open("%s%s_TEMP.xml"%(filePath,fileName.replace('.xml','')),'w')
-            f.write(soupInit.encode())
-            f.close()
-            os.remove("%s%s.xml"%(filePath,fileName.replace('.xml','')))
-            os.rename("%s%s_TEMP.xml"%(filePath,fileName.replace('.xml','')),"%s%s.xml"%(filePath,fileName.replace('.xml','')))
-            
-            
-            soupTemp1 = bs4.BeautifulSoup(open(fileName1))
-            pgInfo1 = soupTemp1.find_all('div',class_="ocr_page")
-            soup1= pgInfo1[0];      
-            # insert noisemeasure
-            tempNoiseM = soup1["title"];
-            tempNoiseM1 = tempNoiseM.split(";");
-            soup1["title"]="%s;%s;%s; noisiness %.4f"%(tempNoiseM1[0],tempNoiseM1[1 ],tempNoiseM1[2],0.0);
-            
-            f = open("%s%s_IDHMC.xml"%(filePath,fileName.replace('.xml','')),'w')
-            f.write(soupTemp1.encode())
-            f.close()
+            ho.annotate_words(wordSpans,wordInfo[:,0],-np.ones(np.size(wordInfo[:,0])),-np.ones(np.size(wordInfo[:,0])))
+            ho.annotate_page(soup,0.0)
+            ho.write_outputs(soupInit,"%s%s"%(filePath,fileName.replace('.xml','')))
             Noisemeasure = 0.0;
             return Noisemeasure;
     else:      
         #make two hOCR files
-        for word_id in range(0,np.size(wordInfo[:,0])):
-            temp = soup.find("span",class_="ocrx_word",id="word_%d"%(wordInfo[word_id,0]))
-            temp1 = temp['title'].split(';');
-            temp['title'] = "%s;%s; pred %d; noiseConf %.4f"%(temp1[0],temp1[1 ],-1,-1)
-        
-        tempNoiseM = soup["title"];
-        tempNoiseM1 = tempNoiseM.split(";");
-        soup["title"]="%s;%s;%s; noisiness %.4f"%(tempNoiseM1[0],tempNoiseM1[1 ],tempNoiseM1[2],0.0);
-        
-        f = open("%s%s_TEMP.xml"%(filePath,fileName.replace('.xml','')),'w')
-        f.write(soupInit.encode())
-        f.close()
-        os.remove("%s%s.xml"%(filePath,fileName.replace('.xml','')))
-        os.rename("%s%s_TEMP.xml"%(filePath,fileName.replace('.xml','')),"%s%s.xml"%(filePath,fileName.replace('.xml','')))
-        
-        
-        soupTemp1 = bs4.BeautifulSoup(open(fileName1))
-        pgInfo1 = soupTemp1.find_all('div',class_="ocr_page")
-        soup1= pgInfo1[0];      
-        # insert noisemeasure
-        tempNoiseM = soup1["title"];
-        tempNoiseM1 = tempNoiseM.split(";");
-        soup1["title"]="%s;%s;%s; noisiness %.4f"%(tempNoiseM1[0],tempNoiseM1[1 ],tempNoiseM1[2],0.0);
-        
-        f = open("%s%s_IDHMC.xml"%(filePath,fileName.replace('.xml','')),'w')
-        f.write(soupTemp1.encode())
-        f.close()
+        ho.annotate_words(wordSpans,wordInfo[:,0],-np.ones(np.size(wordInfo[:,0])),-np.ones(np.size(wordInfo[:,0])))
+        ho.annotate_page(soup,0.0)
+        ho.write_outputs(soupInit,"%s%s"%(filePath,fileName.replace('.xml','')))
         Noisemeasure = 0.0;
         return Noisemeasure
         #print "Do Nothing and generate two hOCR with all bounding boxes as noise"
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Reading and rewriting the hOCR of a page for Denoise.
+
+The hOCR is parsed once and its words are indexed by id.  The predictions
+and noise confidences are set on that tree, which is serialized for the
+annotated hOCR replacing the original, and then, without the noise words and
+with their original titles, for the _IDHMC copy.  Both files are replaced
+atomically so a reader never sees a partial file.
+"""
+import os
+import bs4
+
+
+def parse_hocr(fileName):
+    """Parse an hOCR file
+
+    Args:
+        fileName (str): Path to the hOCR
+
+    Returns:
+        BeautifulSoup: The document.
+    """
+    with open(fileName) as f:
+        return bs4.BeautifulSoup(f)
+
+
+def index_words(page):
+    """Find the words of a page
+
+    Args:
+        page (Tag): The ocr_page element
+
+    Returns:
+        tuple: The word spans in document order and a dict of them by id.
+    """
+    spans = page.find_all("span", class_="ocrx_word")
+    return spans, dict((span["id"], span) for span in spans)
+
+
+def annotate_page(page, noisiness):
+    """Add the noisiness to the title of a page
+
+    Args:
+        page (Tag): The ocr_page element
+        noisiness (float): Fraction of the words found to be noise
+    """
+    parts = page["title"].split(";")
+    page["title"] = "%s;%s;%s; noisiness %.4f" % (parts[0], parts[1], parts[2], noisiness)
+
+
+def annotate_words(wordSpans, wordIds, labels, noiseConf):
+    """Add the prediction and noise confidence to the title of words
+
+    Args:
+        wordSpans (dict): Word spans by id
+        wordIds (list): Number of each word, as in its word_<number> id
+        labels (list): Prediction of each word, 1 for text, 0 for noise or -1 for none
+        noiseConf (list): Noise confidence of each word
+
+    Returns:
+        dict: The original title of each word by id.
+    """
+    titles = {}
+    for word_id, label, conf in zip(wordIds, labels, noiseConf):
+        span = wordSpans["word_%d" % word_id]
+        titles[span["id"]] = span["title"]
+        parts = span["title"].split(';')
+        span["title"] = "%s;%s; pred %d; noiseConf %.4f" % (parts[0], parts[1], label, conf)
+    return titles
+
+
+def remove_words(wordSpans, titles, noiseIds):
+    """Restore the original titles of words and remove the noise words
+
+    Args:
+        wordSpans (dict): Word spans by id
+        titles (dict): Original title by id, from annotate_words
+        noiseIds (list): Ids of the words to remove
+    """
+    for span_id, title in titles.items():
+        wordSpans[span_id]["title"] = title
+    for span_id in noiseIds:
+        wordSpans[span_id].extract()
+
+
+def write_atomic(fileName, data):
+    """Replace a file by writing a temporary file next to it and renaming it
+
+    Args:
+        fileName (str): Path to the file
+        data (str): Contents of the file
+    """
+    tmpName = "%s.tmp" % fileName
+    try:
+        with open(tmpName, 'w') as f:
+            f.write(data)
+        os.rename(tmpName, fileName)
+    except Exception:
+        if os.path.isfile(tmpName):
+            os.remove(tmpName)
+        raise
+
+
+def write_outputs(document, outputName, wordSpans=None, titles=None, noiseIds=None):
+    """Write the annotated hOCR over the original and its _IDHMC copy
+
+    Args:
+        document (BeautifulSoup): The annotated document
+        outputName (str): Path to the hOCR without the .xml extension
+        wordSpans (dict, optional): Word spans by id
+        titles (dict, optional): Original title of the words by id
+        noiseIds (list, optional): Ids of the words to leave out of the
+            _IDHMC copy, which then has the original word titles.  If not
+            given the copy is the annotated hOCR.
+    """
+    data = document.encode()
+    write_atomic("%s.xml" % outputName, data)
+    if noiseIds is not None:
+        remove_words(wordSpans, titles, noiseIds)
+        data = document.encode()
+    write_atomic("%s_IDHMC.xml" % outputName, data)
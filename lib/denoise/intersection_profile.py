@@ -0,0 +1,16 @@
+"""
+The intersection profile shared with MultiColumnSkew.
+
+The module is loaded from lib/MultiColumnSkew by its path, so Denoise does not
+need that directory on sys.path.
+"""
+import imp
+import os
+
+#: The lib/MultiColumnSkew intersection_profile module
+shared = imp.load_source("multicolumnskew_intersection_profile",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MultiColumnSkew",
+                                      "intersection_profile.py"))
+
+intersection_profile = shared.intersection_profile
+bottom_points = shared.bottom_points
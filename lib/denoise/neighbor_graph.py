@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Nearest neighbor graph of the words in a column, used by the Denoise relabeling.
+
+Each relabeling iteration replaces the label of a word by the average label of
+its nearest neighbors, weighted by inverse distance.  The neighbors are the k
+nearest boxes to each corner of the word within D_max, and only depend on the
+box positions, so they are found once per column with a uniform grid of cell
+size D_max and every iteration only re-aggregates the labels over the graph.
+The neighbors, their order and the weights are identical to the former search
+over all the boxes of the column on every iteration.
+"""
+import numpy as np
+
+#: Corners of a word, as (x, y) columns of the word bounding boxes
+CORNERS = ([1, 2], [1, 4], [3, 2], [3, 4])
+#: Grid cells are made slightly larger than D_max so rounding can not skip a neighbor
+CELL_MARGIN = 1e-6
+
+
+def corner_distances(boxes, point):
+    """Get the distance from each corner of the boxes to a point
+
+    Args:
+        boxes (ndarray): Word bounding boxes, with the columns (id, x1, y1, x2, y2, ...)
+        point (ndarray): The x and y of the point
+
+    Returns:
+        ndarray: The distances with one row per corner and one column per box.
+    """
+    distances = []
+    for corner in ([1, 2], [3, 2], [1, 4], [3, 4]):
+        distWord = np.power(np.subtract(boxes[:, corner], point), 2)
+        distances.append(np.power(np.sum(distWord, axis=1), 0.5))
+    return np.array(distances)
+
+
+class NeighborGraph(object):
+    """Inverse distance weighted neighbors of the words in a column
+
+    Attributes:
+        neighbors (list): Index of the neighbors of each word
+        distances (list): Distance to the neighbors of each word
+        weights (list): Weight of the neighbors of each word
+    """
+
+    def __init__(self, boxes, D_max, k=11):
+        """Find the neighbors of every word
+
+        Args:
+            boxes (ndarray): Word bounding boxes, with the columns (id, x1, y1, x2, y2, ...)
+            D_max (float): Boxes farther than this from a corner are not its neighbors
+            k (int): Most neighbors of each corner
+        """
+        self.size = boxes.shape[0]
+        self.corner_cells = []
+        self.neighbors = []
+        self.distances = []
+        self.weights = []
+        cells = self._grid(boxes, D_max)
+        for word in range(self.size):
+            if cells is None:
+                candidates = np.array([], dtype=int)
+            else:
+                candidates = self._candidates(cells, word)
+            index, distance = self._nearest(boxes, word, candidates, D_max, k)
+            # Boxes on the corner of the word get the weight of a box at distance 1
+            with np.errstate(divide='ignore'):
+                weight = np.divide(1, distance)
+            weight[np.isnan(weight) | np.isinf(weight)] = 1.0
+            self.neighbors.append(index)
+            self.distances.append(distance)
+            self.weights.append(weight)
+        self._group()
+
+    def _grid(self, boxes, D_max):
+        """Assign the corners of the boxes to grid cells of size D_max
+
+        Returns:
+            dict: Boxes with a corner in each cell, or None if no box can be a neighbor.
+        """
+        if not D_max > 0 or self.size == 0:
+            return None
+        cell = D_max * (1 + CELL_MARGIN)
+        cells = {}
+        for x, y in CORNERS:
+            corner = zip(np.floor(boxes[:, x] / cell).astype(int), np.floor(boxes[:, y] / cell).astype(int))
+            self.corner_cells.append(corner)
+            for word, key in enumerate(corner):
+                cells.setdefault(key, set()).add(word)
+        return cells
+
+    def _candidates(self, cells, word):
+        """Get the boxes with a corner in a cell next to a corner of the word, in order"""
+        candidates = set()
+        for corner in self.corner_cells:
+            cx, cy = corner[word]
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    candidates.update(cells.get((cx + dx, cy + dy), ()))
+        candidates.discard(word)
+        return np.array(sorted(candidates), dtype=int)
+
+    def _nearest(self, boxes, word, candidates, D_max, k):
+        """Pick the neighbors of each corner of the word among the candidates
+
+        The k nearest boxes closer than D_max to each corner are taken, and
+        duplicates of the neighbors of the first two corners are dropped from
+        those of the last two as in the original relabeling.
+
+        Returns:
+            tuple: Index and distance of the neighbors.
+        """
+        remaining = boxes[candidates, :]
+        dists = [np.min(corner_distances(remaining, boxes[word, corner]), axis=0) for corner in CORNERS]
+        selected = [np.flatnonzero(dist < D_max) for dist in dists]
+        ks = [min(k, np.size(sel)) for sel in selected]
+        if not any(ks):
+            return np.array([], dtype=int), np.array([])
+        order = [np.argsort(dist[sel]) for dist, sel in zip(dists, selected)]
+        picks = [order[0][:ks[0]], order[1][:ks[1]], order[2][:ks[2]], order[3][:ks[3]]]
+        # The original compared positions in the sorted lists of different corners, keep it for identical labels
+        if ks[0] != 0:
+            picks[2] = picks[2][~np.in1d(picks[2], picks[0])]
+        if ks[1] != 0:
+            picks[3] = picks[3][~np.in1d(picks[3], picks[1])]
+        index = np.concatenate([candidates[sel[pick]] for sel, pick in zip(selected, picks)])
+        distance = np.concatenate([dist[sel[pick]] for dist, sel, pick in zip(dists, selected, picks)])
+        return index, distance
+
+    def _group(self):
+        """Stack the words with the same number of neighbors so they are relabeled together"""
+        self.groups = []
+        counts = np.array([np.size(n) for n in self.neighbors], dtype=int)
+        for count in np.unique(counts[counts > 0]):
+            words = np.flatnonzero(counts == count)
+            index = np.array([self.neighbors[w] for w in words])
+            weight = np.array([self.weights[w] for w in words])
+            self.groups.append((words, index, weight, np.sum(weight, axis=1)))
+        # Edges from each neighbor to the word averaging its label, for finding the words to update
+        self.isolated = counts == 0
+        self.edge_word = np.repeat(np.arange(self.size), counts)
+        self.edge_neighbor = np.concatenate(self.neighbors + [np.array([], dtype=int)]).astype(int)
+
+    def relabel(self, labels):
+        """Average the labels of the neighbors of every word
+
+        Args:
+            labels (ndarray): Current label of each word
+
+        Returns:
+            ndarray: The weighted average label of the neighbors of each word,
+                or its own label if it has none.
+        """
+        preLabel = np.array(labels, dtype=float)
+        for words, index, weight, total in self.groups:
+            preLabel[words] = np.divide(np.sum(np.multiply(labels[index], weight), axis=1), total)
+        return preLabel
+
+    def dependents(self, changed):
+        """Get the words whose average depends on the labels of some words
+
+        Args:
+            changed (ndarray): Index of the words whose label changed
+
+        Returns:
+            ndarray: Index of the words with one of them as a neighbor, and
+                of those without neighbors, which keep their own label.
+        """
+        words = self.edge_word[np.in1d(self.edge_neighbor, changed)]
+        changed = np.asarray(changed, dtype=int)
+        return np.union1d(words, changed[self.isolated[changed]])
+
+    def update(self, labels, preLabel, words):
+        """Average the labels of the neighbors of some words
+
+        The averages are identical to those of relabel.
+
+        Args:
+            labels (ndarray): Current label of each word
+            preLabel (ndarray): Averages of the last relabel, updated in place
+            words (ndarray): Index of the words to average
+        """
+        selected = np.zeros(self.size, dtype=bool)
+        selected[words] = True
+        for group_words, index, weight, total in self.groups:
+            rows = selected[group_words]
+            if rows.any():
+                preLabel[group_words[rows]] = np.divide(
+                    np.sum(np.multiply(labels[index[rows]], weight[rows]), axis=1), total[rows])
+        isolated = selected & self.isolated
+        preLabel[isolated] = labels[isolated]
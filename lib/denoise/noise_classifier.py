@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Neural network classifying the words of a page as text or noise, used by Denoise.
+
+The network has 7 inputs (OCR confidence, height to width ratio, area,
+normalized height, relabeled neighbor label and the distances to the top and
+column center), 8 tansig hidden units and a softmax over text and noise.  The
+weights are loaded once into MODEL and every word of a column is scored with
+one matrix multiply per layer instead of one network simulation per word.
+"""
+import numpy as np
+
+# Network weight matrix
+IW = np.array([[-0.594140000082075, 0.0284426552800584, 0.633962614499578, 3.28625526733271, 0.135357920986002, 0.0744090237062824, -0.104335668169507],
+               [0.582301257544410, 1.02518630598767, -9.11772639809179, -0.402524297693123, 0.0102389560044855, -0.0791970693550233, 0.369262689723785],
+               [0.239984949103749, -87.5269134098991, -33.8991260602495, 1.17564645973248, -1.12089713455975, -0.983194853356573, -47.6282329029053],
+               [0.235158115252368, -19.1996471786875, -440.781581422114, 7.55469040107880, 0.316909768618500, -0.0395229877154089, 0.210814777210327],
+               [4.40901664698217, 16.1450856630481, 0.0906903536753684, -5.39330399600042, -0.617335318223031, -0.223181914782527, -0.0180602735321480],
+               [-0.540902931519254, -131.891721211789, -55.5540477615985, -3.04419286543500, -0.0953696784219757, -0.118330193755444, -0.0293326608826203],
+               [0.268341734790750, 6.21756468534859, 1.10959003485922, 15.1283657342125, 0.00161804321049251, -0.0196312514795930, 0.178605142680341],
+               [0.361328059849469, 0.210300855715019, -0.607497545986723, -3.22209066515691, -0.112050733164288, -0.0519265549320669, 0.0699452632434586]])
+# Bias for hidden layer
+b1 = np.array([1.23003200158914, -10.3246201755893, -82.9226929464117, -457.603059874791,
+               16.7138065068903, -188.825283911144, 10.1739148122845, -1.13862142860185])
+# Output layer weight matrix
+LW = np.array([[-34.0506100659894, 31.2573651380090, 0.466550632307331, -4.00279418916034, -1.25936711908938, -51.8134696327409, -4.00089910338376, -46.4067607691938],
+               [35.1466171843005, -30.8357383677796, -0.887824702053121, 4.38946074239154, 1.40004866498257, 51.6906113788625, 4.50615099912734, 47.1133076956261]])
+# Bias for output layer
+b2 = np.array([-31.8507, 33.0516])
+# Range of each input used to scale it to [-1, 1]
+maxVec = np.array([0.939940000000000, 89.1880000000000, 0.0399480000000000, 57.1560000000000, 1.0, 0.999020000000000, 0.544920000000000])
+minVec = np.array([0.0, 0.0125960000000000, 5.96050000000000e-08, -34.9380000000000, -1, 0.0, 0.0])
+
+
+def tansig(dat):
+    """Hyperbolic tangent sigmoid activation"""
+    with np.errstate(over='ignore'):
+        return np.subtract(np.divide(2, (1 + np.exp(np.multiply(-2, dat)))), 1)
+
+
+def softmax(dat):
+    """Softmax of each column, shifted by its maximum so exp can not overflow"""
+    temp = np.exp(np.subtract(dat, np.max(dat, axis=0)))
+    return np.divide(temp, np.sum(temp, axis=0))
+
+
+class NoiseClassifier(object):
+    """Two layer network scoring many words at once
+
+    Attributes:
+        IW (ndarray): Hidden layer weights
+        b1 (ndarray): Hidden layer bias, as a column
+        LW (ndarray): Output layer weights
+        b2 (ndarray): Output layer bias, as a column
+    """
+
+    def __init__(self, IW, b1, LW, b2, minVec, maxVec):
+        self.IW = np.asarray(IW, dtype=float)
+        self.b1 = np.asarray(b1, dtype=float).reshape(-1, 1)
+        self.LW = np.asarray(LW, dtype=float)
+        self.b2 = np.asarray(b2, dtype=float).reshape(-1, 1)
+        self.minVec = np.asarray(minVec, dtype=float).reshape(-1, 1)
+        self.rangeVec = (np.asarray(maxVec, dtype=float) - np.asarray(minVec, dtype=float)).reshape(-1, 1)
+
+    def normalize(self, features):
+        """Scale the features of each word to [-1, 1]
+
+        Args:
+            features (ndarray): One row per input and one column per word
+
+        Returns:
+            ndarray: The scaled features.
+        """
+        return 2 * np.divide(np.subtract(features, self.minVec), self.rangeVec) - 1
+
+    def simulate(self, normX):
+        """Get the text and noise probabilities of the scaled features
+
+        Args:
+            normX (ndarray): Scaled features with one column per word
+
+        Returns:
+            ndarray: Text and noise probability rows with one column per word.
+        """
+        hiddenOutput = tansig(np.dot(self.IW, normX) + self.b1)
+        outputActivation = np.dot(self.LW, hiddenOutput) + self.b2
+        return softmax(outputActivation)
+
+    def predict(self, features):
+        """Classify words as text or noise
+
+        Args:
+            features (ndarray): One row per input and one column per word
+
+        Returns:
+            tuple: Label of each word, 1 for text and -1 for noise, and the
+                probability of that label.
+        """
+        simOut = self.simulate(self.normalize(features))
+        index_max = np.argmax(simOut, axis=0)
+        max_value = simOut[index_max, np.arange(simOut.shape[1])]
+        return np.where(index_max == 1, -1, 1), max_value
+
+
+MODEL = NoiseClassifier(IW, b1, LW, b2, minVec, maxVec)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Iterative relabeling of the words of a column as text or noise, used by Denoise.
+
+Each iteration averages the labels of the neighbors of every word and scores
+the words with the network, with the average as one of the inputs, until at
+most one label changes, the same number of labels changes three times or
+max_iter is reached.  A word's average only changes when a neighbor's label
+changed, and its score only when its average changed, so after the first
+iteration only those words are averaged and scored again.  The labels reached
+are the same as when every word is scored on every iteration.
+"""
+import numpy as np
+import noise_classifier as nc
+
+#: Row of the network inputs holding the average label of the neighbors
+LABEL_ROW = 4
+#: Confidence of the words not scored by the network
+DEFAULT_CONF = 0.95
+
+
+def relabel_column(graph, features, labels, scored, max_iter=20, model=nc.MODEL):
+    """Relabel the words of a column until the labels settle
+
+    Args:
+        graph (NeighborGraph): Neighbors of the words
+        features (ndarray): Network inputs with one column per word, the
+            LABEL_ROW is filled in with the neighbor averages
+        labels (ndarray): Initial label of each word, 1 for text and -1 for noise
+        scored (ndarray): Mask of the words the network may relabel
+        max_iter (int, optional): Most iterations
+        model (NoiseClassifier, optional): The network
+
+    Returns:
+        tuple: Labels, confidence of each label, and a dict with the
+            iterations, the words averaged and scored over all iterations,
+            the labels changed by the last iteration and whether the labels
+            converged rather than stopping on the iteration or repeat limits.
+    """
+    labels = np.array(labels, dtype=float)
+    features = np.array(features, dtype=float)
+    size = np.size(labels)
+    ratio = features[1, :]
+    kept = np.flatnonzero(scored & ~np.isinf(ratio) & ~np.isnan(ratio))
+    # The scores fill the words passing the confidence filter in order, even
+    # when words before them were skipped for an infinite ratio, as before
+    slots = np.flatnonzero(scored)[:np.size(kept)]
+    pred = np.zeros(np.size(kept))
+    conf = np.zeros(np.size(kept))
+
+    stats = {"iterations": 0, "averaged": 0, "scored": 0, "changed": size, "converged": False}
+    preLabel = None
+    changed = np.arange(size)
+    repeats = 0
+    prevChanged = -999
+    onlyOneBox = size == 1
+    while (np.size(changed) > 1 and stats["iterations"] < max_iter and repeats < 3) or onlyOneBox:
+        if prevChanged == np.size(changed):
+            repeats += 1
+        prevChanged = np.size(changed)
+        stats["iterations"] += 1
+
+        if preLabel is None:
+            preLabel = graph.relabel(labels)
+            stats["averaged"] += size
+            stale = np.arange(np.size(kept))
+        else:
+            words = graph.dependents(changed)
+            previous = preLabel[words]
+            graph.update(labels, preLabel, words)
+            stats["averaged"] += np.size(words)
+            stale = np.flatnonzero(np.in1d(kept, words[preLabel[words] != previous]))
+
+        if np.size(stale) > 0:
+            features[LABEL_ROW, kept[stale]] = preLabel[kept[stale]]
+            pred[stale], conf[stale] = model.predict(features[:, kept[stale]])
+            stats["scored"] += np.size(stale)
+        prevLabels = np.copy(labels)
+        labels[slots] = pred
+        changed = np.flatnonzero(labels != prevLabels)
+        onlyOneBox = False
+
+    stats["changed"] = np.size(changed)
+    stats["converged"] = np.size(changed) <= 1
+    confidence = DEFAULT_CONF * np.ones(size)
+    confidence[slots] = conf
+    return labels, confidence, stats
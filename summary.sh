@@ -1,30 +1,5 @@
 #!/bin/bash
 
-ERROR_COUNT=$(grep -HnR "ERROR:" logs/emop-controller-*.out | wc -l)
-WALLTIME_ERROR_COUNT=$(grep -HnR "TIME LIMIT" logs/*.out | wc -l)
-MEMORY_LIMIT_COUNT=$(egrep -HnR "^slurmstepd: Exceeded job memory limit$" logs/*.out | wc -l)
-
-bootstrap_total=0
-bootstrap_count=0
-for i in $(grep "BOOTSTRAP TIME:" logs/*.out | awk '{ print $3; }'); do
-    bootstrap_total=$(echo $bootstrap_total+$i | bc)
-    ((bootstrap_count++))
-done
-BOOTSTRAP_AVG=$(echo "scale=2; $bootstrap_total / $bootstrap_count" | bc)
-
-start_mariadb_total=0
-start_mariadb_count=0
-for i in $(grep "START MARIADB TIME:" logs/*.out | awk '{ print $4; }'); do
-    start_mariadb_total=$(echo $start_mariadb_total+$i | bc)
-    ((start_mariadb_count++))
-done
-START_MARIADB_AVG=$(echo "scale=2; $start_mariadb_total / $start_mariadb_count" | bc)
-
-./emop.py query --avg-runtimes
-
-echo "ERROR COUNT: ${ERROR_COUNT}"
-echo "HIT WALLTIME LIMIT COUNT: ${WALLTIME_ERROR_COUNT}"
-echo "EXCEEDED MEMORY LIMIT COUNT: ${MEMORY_LIMIT_COUNT}"
-
-echo "BOOTSTRAP AVG TIME: ${BOOTSTRAP_AVG}"
-echo "START MARIADB AVG TIME: ${START_MARIADB_AVG}"
+# Where the node time of the jobs logged in logdir was spent, with the
+# counts of errors and jobs killed for their time or memory limit.
+./emop.py query --overhead "$@"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Benchmark the submit command against the fake dashboard and fake SLURM
+
+Each run starts an EmopFakeDashboard with one page per job, puts the fake
+SLURM commands in tests/fake_slurm first on PATH and times
+
+    emop.py submit --num-jobs N --pages-per-job 1
+
+Example, timing 100, 1000 and 3000 jobs with and without job arrays:
+
+    python -m tests.benchmark_submit --jobs 100 1000 3000 --array
+"""
+import argparse
+import ConfigParser
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from emop.lib.emop_fake_dashboard import EmopFakeDashboard
+from emop.lib.emop_fake_slurm import EmopFakeSLURM
+
+test_root = os.path.dirname(os.path.abspath(__file__))
+app_root = os.path.abspath(os.path.join(test_root, '..'))
+
+
+def write_config(tmpdir, url_base, max_jobs, array):
+    config = ConfigParser.RawConfigParser()
+    config.read(os.path.join(app_root, 'config.ini.example'))
+    config.set('dashboard', 'url_base', url_base)
+    config.set('controller', 'payload_input_path', os.path.join(tmpdir, 'payload/input'))
+    config.set('controller', 'payload_output_path', os.path.join(tmpdir, 'payload/output'))
+    config.set('controller', 'cache_path', os.path.join(tmpdir, 'cache'))
+    config.set('scheduler', 'max_jobs', str(max_jobs))
+    config.set('scheduler', 'logdir', os.path.join(tmpdir, 'logs'))
+    config.set('scheduler', 'array', str(array))
+    config_path = os.path.join(tmpdir, 'config.ini')
+    with open(config_path, 'w') as f:
+        config.write(f)
+    return config_path
+
+
+def run(num_jobs, array):
+    """Time one submit of num_jobs one page jobs
+
+    Returns:
+        tuple: Seconds the submit took and number of jobs in the fake queue
+    """
+    tmpdir = tempfile.mkdtemp(prefix="emop-benchmark-")
+    dashboard = EmopFakeDashboard(db_path=os.path.join(tmpdir, 'dashboard.db'))
+    dashboard.add_pages(num_jobs)
+    dashboard.start()
+    try:
+        config_path = write_config(tmpdir, dashboard.url_base, num_jobs, array)
+        env = os.environ.copy()
+        env['PATH'] = os.path.join(test_root, 'fake_slurm') + os.pathsep + env.get('PATH', '')
+        env['PYTHON'] = sys.executable
+        env['EMOP_FAKE_SLURM_DB'] = os.path.join(tmpdir, 'slurm.db')
+        env['EMOP_FAKE_SLURM_QUEUE_WAIT'] = '3600'
+        env.setdefault('DENOISE_HOME', os.path.join(app_root, 'lib/denoise'))
+        env.setdefault('SEASR_HOME', os.path.join(app_root, 'lib/seasr'))
+        env.setdefault('JUXTA_HOME', os.path.join(app_root, 'lib/juxta-cl'))
+        env.setdefault('RETAS_HOME', os.path.join(app_root, 'lib/retas'))
+        cmd = [sys.executable, os.path.join(app_root, 'emop.py'), '-c', config_path, 'submit',
+               '--num-jobs', str(num_jobs), '--pages-per-job', '1']
+        start = time.time()
+        with open(os.path.join(tmpdir, 'submit.log'), 'w') as log:
+            exitcode = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=app_root)
+        elapsed = time.time() - start
+        if exitcode != 0:
+            with open(os.path.join(tmpdir, 'submit.log')) as log:
+                sys.stderr.write(log.read())
+            raise RuntimeError("submit exited with %s" % exitcode)
+        slurm = EmopFakeSLURM(db_path=env['EMOP_FAKE_SLURM_DB'])
+        try:
+            output, _ = slurm.squeue(['-r', '--noheader'])
+        finally:
+            slurm.close()
+        return elapsed, len(output.splitlines())
+    finally:
+        dashboard.stop()
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark emop.py submit with fake SLURM commands")
+    parser.add_argument('--jobs', dest='jobs', nargs='+', type=int, default=[100, 1000, 3000],
+                        help='numbers of jobs to submit')
+    parser.add_argument('--array', dest='array', action='store_true',
+                        help='also submit each as a job array')
+    args = parser.parse_args()
+
+    for array in ([False, True] if args.array else [False]):
+        for num_jobs in args.jobs:
+            elapsed, queued = run(num_jobs, array)
+            print("jobs=%d array=%s queued=%d seconds=%0.2f jobs/sec=%0.1f" %
+                  (num_jobs, array, queued, elapsed, num_jobs / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -45,6 +45,29 @@ class TestDenoise(TestCase):
         self.assertEqual(job.postproc_result.pp_noisemsr, "1.0")
         self.assertTupleEqual(expected_results, retval)
 
+    @mock.patch("emop.lib.processes.denoise.metrics")
+    @mock.patch("emop.lib.processes.denoise.os.path.isfile")
+    def test_run_relabel_metrics(self, mock_path_isfile, mock_metrics):
+        settings = default_settings()
+        job = mock_emop_job(settings)
+        denoise = Denoise(job)
+
+        mock_path_isfile.return_value = True
+        self.mock_rv.communicate.return_value[0] = (
+            "RELABEL ITERATIONS: 3 AVERAGED: 120 SCORED: 90 CONVERGED: 1\n"
+            "RELABEL ITERATIONS: 5 AVERAGED: 80 SCORED: 60 CONVERGED: 0\n"
+            "NOISEMEASURE: 0.2500"
+        )
+
+        denoise.run()
+
+        mock_metrics.inc.assert_has_calls([
+            mock.call("emop_denoise_relabel_iterations_total", 8),
+            mock.call("emop_denoise_averaged_words_total", 200),
+            mock.call("emop_denoise_scored_words_total", 150),
+        ])
+        self.assertEqual(job.postproc_result.pp_noisemsr, "0.2500")
+
     def test_should_run_false(self):
         settings = default_settings()
         job = mock_emop_job(settings)
@@ -0,0 +1,69 @@
+import os
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+
+# Skipped where BeautifulSoup, used by hocr_output, is not installed
+hocr_output = pytest.importorskip("hocr_output")
+
+HOCR = """<html><body>
+<div class="ocr_page" id="page_1" title='image "1.tif"; bbox 0 0 100 100; ppageno 0'>
+<span class="ocr_line" id="line_1">
+<span class="ocrx_word" id="word_1" title="bbox 1 1 10 10; x_wconf 90">one</span>
+<span class="ocrx_word" id="word_2" title="bbox 11 1 20 10; x_wconf 40">two</span>
+</span>
+</div>
+</body></html>
+"""
+
+
+class TestHocrOutput(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_hocr(self, tmpdir):
+        self.outputName = str(tmpdir.join("1"))
+        with open("%s.xml" % self.outputName, "w") as f:
+            f.write(HOCR)
+        self.document = hocr_output.parse_hocr("%s.xml" % self.outputName)
+        self.page = self.document.find_all("div", class_="ocr_page")[0]
+        self.spans, self.wordSpans = hocr_output.index_words(self.page)
+
+    def words(self, suffix=""):
+        document = hocr_output.parse_hocr("%s%s.xml" % (self.outputName, suffix))
+        page = document.find_all("div", class_="ocr_page")[0]
+        return page["title"], [(s["id"], s["title"]) for s in hocr_output.index_words(page)[0]]
+
+    def test_index_words(self):
+        self.assertEqual(["word_1", "word_2"], [s["id"] for s in self.spans])
+        self.assertEqual(sorted(self.wordSpans), ["word_1", "word_2"])
+
+    def test_write_outputs(self):
+        titles = hocr_output.annotate_words(self.wordSpans, [1, 2], [1, 0], [0.2, 0.75])
+        hocr_output.annotate_page(self.page, 0.5)
+        hocr_output.write_outputs(self.document, self.outputName, self.wordSpans, titles, ["word_2"])
+
+        page_title = 'image "1.tif"; bbox 0 0 100 100; ppageno 0; noisiness 0.5000'
+        self.assertEqual((page_title, [("word_1", "bbox 1 1 10 10; x_wconf 90; pred 1; noiseConf 0.2000"),
+                                       ("word_2", "bbox 11 1 20 10; x_wconf 40; pred 0; noiseConf 0.7500")]),
+                         self.words())
+        self.assertEqual((page_title, [("word_1", "bbox 1 1 10 10; x_wconf 90")]), self.words("_IDHMC"))
+        self.assertEqual(["1.xml", "1_IDHMC.xml"], sorted(os.listdir(os.path.dirname(self.outputName))))
+
+    def test_write_outputs_without_predictions(self):
+        hocr_output.annotate_words(self.wordSpans, [1, 2], [-1, -1], [-1, -1])
+        hocr_output.annotate_page(self.page, 0.0)
+        hocr_output.write_outputs(self.document, self.outputName)
+
+        self.assertEqual(self.words(), self.words("_IDHMC"))
+        self.assertEqual("bbox 1 1 10 10; x_wconf 90; pred -1; noiseConf -1.0000", self.words()[1][0][1])
+
+    def test_write_atomic_keeps_file_on_error(self):
+        with pytest.raises(TypeError):
+            hocr_output.write_atomic("%s.xml" % self.outputName, None)
+
+        with open("%s.xml" % self.outputName) as f:
+            self.assertEqual(HOCR, f.read())
+        self.assertEqual(["1.xml"], os.listdir(os.path.dirname(self.outputName)))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestHocrOutput)
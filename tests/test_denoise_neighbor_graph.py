@@ -0,0 +1,119 @@
+import numpy as np
+from unittest import TestCase
+from unittest import TestLoader
+from neighbor_graph import NeighborGraph
+
+
+def reference_distances(a, b):
+    """distCalulationNew, the distances from the corners of words a to the point b"""
+    distVec = []
+    for corner in ([1, 2], [3, 2], [1, 4], [3, 4]):
+        distWord = np.power(np.subtract(a[:, corner], b), 2)
+        distVec.append(np.power(np.sum(distWord, axis=1), 0.5))
+    return np.array(distVec)
+
+
+def reference_unique(index, earlier, k_earlier):
+    """Drop the neighbors of a right corner already found from the left corner"""
+    for i in range(0, np.size(index)):
+        if k_earlier != 0:
+            if np.any(index[i] == earlier[range(0, k_earlier)]):
+                index[i] = -999
+        else:
+            break
+    return index[index != -999]
+
+
+def reference_neighbors(boxes, labels, word, D_max, k):
+    """Distances and labels of the k nearest neighbors of each corner of a word"""
+    remainingBbox = np.ones(labels.shape) == 1
+    remainingBbox[word] = False
+    wordInOrgDoc = boxes[word, :]
+    dists = [np.min(reference_distances(boxes[remainingBbox, :], wordInOrgDoc[corner]), axis=0)
+             for corner in ([1, 2], [1, 4], [3, 2], [3, 4])]
+    selInds = [np.ix_(dist < D_max) for dist in dists]
+    ks = [min(k, np.size(selInd)) for selInd in selInds]
+    if not np.any(np.array(ks) > 0):
+        return []
+    inds = [np.argsort(dist[selInd]) for dist, selInd in zip(dists, selInds)]
+    remainingBbox = np.ix_(remainingBbox)
+    parts = []
+    for corner in range(4):
+        index = inds[corner][range(0, ks[corner])]
+        if corner >= 2:
+            index = reference_unique(index, inds[corner - 2], ks[corner - 2])
+        if np.size(index) != 0:
+            rows = selInds[corner][0][index[range(0, np.size(index))]]
+            parts.append(np.array([dists[corner][rows], labels[remainingBbox[0][rows]]]))
+    return parts
+
+
+def reference_relabel(boxes, labels, D_max, k=11):
+    """The neighbor search and averaging formerly done on every iteration in deNoise_Post.py"""
+    preLabel = np.copy(labels)
+    for word in range(0, np.size(labels)):
+        parts = reference_neighbors(boxes, labels, word, D_max, k)
+        if parts:
+            kNeigh = np.concatenate(parts, axis=1)
+            with np.errstate(divide="ignore"):
+                wNeigh = np.divide(1, kNeigh[0, :])
+            for inD in range(0, np.size(wNeigh)):
+                if np.isnan(wNeigh[inD]) or np.isinf(wNeigh[inD]):
+                    wNeigh[inD] = 1.0
+            preLabel[word] = np.divide(np.sum(np.multiply(kNeigh[1, :], wNeigh)), np.sum(wNeigh))
+    return preLabel
+
+
+def random_page(num_words, seed):
+    """Words in lines with normalized coordinates like deNoise_Post.py"""
+    rng = np.random.RandomState(seed)
+    x1 = rng.uniform(0.05, 0.9, num_words)
+    y1 = 1 - rng.randint(1, 60, num_words) * 0.015
+    height = rng.uniform(0.005, 0.02, num_words)
+    width = rng.uniform(0.01, 0.08, num_words)
+    boxes = np.zeros((num_words, 8))
+    boxes[:, 0] = np.arange(1, num_words + 1)
+    boxes[:, 1] = x1
+    boxes[:, 2] = y1
+    boxes[:, 3] = x1 + width
+    boxes[:, 4] = y1 - height
+    boxes[:, 5] = height
+    boxes[:, 6] = width
+    boxes[:, 7] = rng.uniform(0.5, 1, num_words)
+    labels = rng.choice([-1.0, 1.0], num_words)
+    return boxes, labels
+
+
+class TestNeighborGraph(TestCase):
+    def assert_parity(self, boxes, labels, D_max):
+        graph = NeighborGraph(boxes, D_max)
+        expected = reference_relabel(boxes, labels, D_max)
+        self.assertTrue(np.array_equal(expected, graph.relabel(labels)))
+
+    def test_parity(self):
+        boxes, labels = random_page(300, seed=1)
+        self.assert_parity(boxes, labels, 0.05)
+
+    def test_parity_relabeled_labels(self):
+        boxes, labels = random_page(200, seed=2)
+        graph = NeighborGraph(boxes, 0.04)
+        for _ in range(3):
+            labels = np.where(reference_relabel(boxes, labels, 0.04) > 0, 1.0, -1.0)
+            self.assertTrue(np.array_equal(reference_relabel(boxes, labels, 0.04), graph.relabel(labels)))
+
+    def test_parity_dense_ties(self):
+        boxes, labels = random_page(60, seed=3)
+        # Duplicate boxes are at distance zero and tie with each other
+        boxes = np.concatenate([boxes, boxes[:30]])
+        labels = np.concatenate([labels, -labels[:30]])
+        self.assert_parity(boxes, labels, 0.5)
+
+    def test_no_neighbors(self):
+        boxes, labels = random_page(20, seed=4)
+        graph = NeighborGraph(boxes, 0)
+        self.assertTrue(np.array_equal(labels, graph.relabel(labels)))
+        self.assertTrue(np.array_equal(labels[:1], NeighborGraph(boxes[:1], 0.05).relabel(labels[:1])))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestNeighborGraph)
@@ -0,0 +1,81 @@
+import numpy as np
+from unittest import TestCase
+from unittest import TestLoader
+import noise_classifier
+from noise_classifier import MODEL
+
+
+def reference_predict(xTemp):
+    """The per-word network simulation formerly in deNoise_Post.py, with arrays for np.matrix"""
+    IW = noise_classifier.IW
+    LW = noise_classifier.LW
+    b1 = noise_classifier.b1.reshape(-1, 1)
+    b2 = noise_classifier.b2.reshape(-1, 1)
+    maxVec = noise_classifier.maxVec
+    minVec = noise_classifier.minVec
+
+    def tansig(dat):
+        return np.subtract(np.divide(2, (1 + np.exp(np.multiply(-2, dat)))), 1)
+
+    def softmax(dat):
+        temp = np.exp(dat)
+        return np.divide(temp, np.sum(temp))
+
+    normX = np.zeros(xTemp.shape)
+    for v in range(0, xTemp.shape[0]):
+        normX[v, :] = np.divide(np.subtract(xTemp[v, :], minVec[v]), (maxVec[v] - minVec[v]))
+    for v in range(0, xTemp.shape[0]):
+        normX[v, :] = 2 * normX[v, :] - 1
+    pred = np.zeros(normX.shape[1])
+    conf = np.zeros(normX.shape[1])
+    for col in range(0, normX.shape[1]):
+        with np.errstate(over='ignore'):
+            simOut = softmax(np.dot(LW, tansig(np.dot(IW, normX[:, [col]]) + b1)) + b2)
+        index_max = np.argmax(simOut)
+        conf[col] = simOut[index_max]
+        pred[col] = -1 if index_max == 1 else 1
+    return pred, conf
+
+
+def random_features(num_words, seed):
+    """Features in the ranges seen on pages"""
+    rng = np.random.RandomState(seed)
+    return np.array([rng.uniform(0, 0.95, num_words),
+                     rng.uniform(0.05, 20, num_words),
+                     rng.uniform(0, 0.02, num_words),
+                     rng.uniform(-3, 30, num_words),
+                     rng.uniform(-1, 1, num_words),
+                     rng.uniform(0, 1, num_words),
+                     rng.uniform(0, 0.5, num_words)])
+
+
+class TestNoiseClassifier(TestCase):
+    def test_parity(self):
+        features = random_features(2000, seed=1)
+        expected_pred, expected_conf = reference_predict(features)
+        pred, conf = MODEL.predict(features)
+
+        self.assertTrue(np.array_equal(expected_pred, pred))
+        # The batched matrix multiply may round differently from the per-word one in the last bits
+        np.testing.assert_allclose(conf, expected_conf, rtol=0, atol=1e-12)
+        self.assertTrue(0 < np.sum(pred == 1) < np.size(pred))
+
+    def test_normalize(self):
+        features = random_features(100, seed=2)
+        normX = MODEL.normalize(features)
+        for v in range(0, features.shape[0]):
+            expected = 2 * np.divide(np.subtract(features[v, :], noise_classifier.minVec[v]),
+                                     (noise_classifier.maxVec[v] - noise_classifier.minVec[v])) - 1
+            self.assertTrue(np.array_equal(expected, normX[v, :]))
+
+    def test_softmax_large_activation(self):
+        out = noise_classifier.softmax(np.array([[1000.0, 0.0], [0.0, 1000.0]]))
+        self.assertTrue(np.array_equal(np.eye(2), out))
+
+    def test_predict_no_words(self):
+        pred, conf = MODEL.predict(np.zeros((7, 0)))
+        self.assertEqual((0, 0), (np.size(pred), np.size(conf)))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestNoiseClassifier)
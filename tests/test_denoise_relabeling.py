@@ -0,0 +1,98 @@
+import numpy as np
+from unittest import TestCase
+from unittest import TestLoader
+from tests.test_denoise_neighbor_graph import random_page
+from neighbor_graph import NeighborGraph
+from noise_classifier import MODEL
+from relabeling import relabel_column
+
+
+def reference_relabel_column(graph, xTemp, finalFilterTemp, max_iter=20):
+    """The loop formerly in deNoise_Post.py, averaging and scoring every word on every iteration"""
+    finalFilterTemp = np.array(finalFilterTemp, dtype=float)
+    prevfinalFilterTemp = 999
+    iter_ = 0
+    count_ = 0
+    numPrevError = -999
+    onlyOneBoxFlag = 1 if np.size(finalFilterTemp) == 1 else 0
+    confValTemp = 0.95 * np.ones(finalFilterTemp.shape)
+    while ((np.size(np.ix_(finalFilterTemp != prevfinalFilterTemp)) > 1) and (iter_ < max_iter) and (count_ < 3)) or onlyOneBoxFlag == 1:
+        numCurrentError = (np.size(np.ix_(finalFilterTemp != prevfinalFilterTemp)))
+        if numPrevError == numCurrentError:
+            count_ = count_ + 1
+        numPrevError = numCurrentError
+        iter_ = iter_ + 1
+        prevfinalFilterTemp = np.copy(finalFilterTemp)
+        features = np.copy(xTemp)
+        features[4, :] = graph.relabel(finalFilterTemp)
+        removeBboxesWithConf = features[0, :] < 0.95
+        fullRemove = removeBboxesWithConf & ~np.isinf(features[1, :]) & ~np.isnan(features[1, :])
+        confValTemp = 0.95 * np.ones(finalFilterTemp.shape)
+        confValTempAfterConfRem = confValTemp[removeBboxesWithConf]
+        tempPred = finalFilterTemp[removeBboxesWithConf]
+        predLabel, predConf = MODEL.predict(features[:, fullRemove])
+        confValTempAfterConfRem[:np.size(predConf)] = predConf
+        tempPred[:np.size(predLabel)] = predLabel
+        confValTemp[removeBboxesWithConf] = confValTempAfterConfRem
+        finalFilterTemp[removeBboxesWithConf] = tempPred
+        onlyOneBoxFlag = 0
+    return finalFilterTemp, confValTemp, iter_
+
+
+def page_features(boxes):
+    """Network inputs of the words as built by deNoise_Post.py"""
+    tempHeight = boxes[:, 5]
+    tempWidth = boxes[:, 6]
+    iqrHeight = np.percentile(tempHeight, [25, 75])
+    iqrHeight = abs(iqrHeight[0] - iqrHeight[1])
+    medianHeight = np.median(tempHeight)
+    bbox_center = np.array([np.mean(boxes[:, [1, 3]], axis=1), np.mean(boxes[:, [2, 4]], axis=1)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.array([boxes[:, 7], np.divide(tempHeight, tempWidth), np.multiply(tempHeight, tempWidth),
+                         np.divide(np.subtract(tempHeight, medianHeight), iqrHeight), np.zeros(boxes.shape[0]),
+                         abs(1 - bbox_center[1, :]), abs(0.5 - bbox_center[0, :])]), medianHeight + 7 * iqrHeight
+
+
+class TestRelabeling(TestCase):
+    def assert_parity(self, boxes, labels):
+        features, D_max = page_features(boxes)
+        graph = NeighborGraph(boxes, D_max)
+        expected_labels, expected_conf, expected_iterations = reference_relabel_column(graph, features, labels)
+        actual_labels, actual_conf, stats = relabel_column(graph, features, labels, features[0, :] < 0.95)
+
+        self.assertTrue(np.array_equal(expected_labels, actual_labels))
+        np.testing.assert_allclose(actual_conf, expected_conf, rtol=0, atol=1e-12)
+        self.assertEqual(expected_iterations, stats["iterations"])
+        return stats
+
+    def test_parity(self):
+        boxes, labels = random_page(400, seed=1)
+        stats = self.assert_parity(boxes, labels)
+
+        self.assertTrue(stats["iterations"] > 1)
+        self.assertTrue(stats["scored"] < stats["iterations"] * np.sum(boxes[:, 7] < 0.95))
+        self.assertTrue(stats["converged"])
+
+    def test_parity_infinite_ratio(self):
+        boxes, labels = random_page(200, seed=2)
+        # A zero width word is skipped by the network and shifts the scores of the words after it
+        boxes[10, 6] = 0.0
+        boxes[10, 7] = 0.5
+        self.assert_parity(boxes, labels)
+
+    def test_one_word(self):
+        boxes, labels = random_page(1, seed=3)
+        boxes[0, 7] = 0.5
+        stats = self.assert_parity(boxes, labels)
+        self.assertEqual(1, stats["iterations"])
+
+    def test_no_words(self):
+        boxes, labels = random_page(0, seed=4)
+        features, _ = page_features(random_page(5, seed=4)[0])
+        labels, conf, stats = relabel_column(NeighborGraph(boxes, 0.05), features[:, :0], labels, np.array([], dtype=bool))
+
+        self.assertEqual((0, 0, 0), (np.size(labels), np.size(conf), stats["iterations"]))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestRelabeling)
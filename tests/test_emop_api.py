@@ -0,0 +1,61 @@
+import mock
+import pytest
+import requests
+from unittest import TestCase
+from unittest import TestLoader
+from emop.lib.emop_api import EmopAPI
+from emop.lib.emop_fake_dashboard import EmopFakeDashboard
+from emop.lib.emop_metrics import metrics
+
+
+class TestEmopAPI(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_dashboard(self):
+        self.dashboard = EmopFakeDashboard(seed=1)
+        self.dashboard.add_pages(1)
+        self.dashboard.start()
+        self.api = EmopAPI(self.dashboard.url_base, {}, retries=2, retry_delay=0)
+        metrics.api_calls = []
+        yield
+        self.dashboard.stop()
+
+    def test_get_request_records_metrics(self):
+        self.api.get_request("/api/job_statuses", {"name": "Done"})
+        call = metrics.api_calls[-1]
+
+        self.assertEqual("GET", call["method"])
+        self.assertEqual("/api/job_statuses", call["endpoint"])
+        self.assertEqual(200, call["status"])
+        self.assertEqual(0, call["retries"])
+        self.assertTrue(call["response_bytes"] > 0)
+
+    def test_get_request_retries(self):
+        self.dashboard.error_rate = 1
+        results = self.api.get_request("/api/job_statuses", {"name": "Done"})
+        call = metrics.api_calls[-1]
+
+        self.assertEqual({}, results)
+        self.assertEqual(3, self.dashboard.request_counts["/api/job_statuses"])
+        self.assertEqual(500, call["status"])
+        self.assertEqual(2, call["retries"])
+
+    def test_put_request_not_retried(self):
+        self.dashboard.error_rate = 1
+        self.api.put_request("/api/job_queues/reserve", {"job_queue": {"num_pages": 1}})
+        call = metrics.api_calls[-1]
+
+        self.assertEqual(1, self.dashboard.request_counts["/api/job_queues/reserve"])
+        self.assertEqual(0, call["retries"])
+        self.assertTrue(call["request_bytes"] > 0)
+
+    @mock.patch("emop.lib.emop_api.requests.request")
+    def test_request_exception_recorded(self, mock_request):
+        mock_request.side_effect = requests.exceptions.ConnectionError("refused")
+
+        self.assertRaises(requests.exceptions.ConnectionError, self.api.get_request, "/api/job_statuses")
+        self.assertEqual(3, mock_request.call_count)
+        self.assertEqual("ConnectionError", metrics.api_calls[-1]["status"])
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopAPI)
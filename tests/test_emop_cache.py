@@ -0,0 +1,39 @@
+import mock
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+from emop.lib.emop_cache import EmopCache
+
+
+class TestEmopCache(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_cache(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.cache = EmopCache(str(tmpdir.join("cache")), "test")
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get("foo", ttl=60))
+
+    def test_set_get(self):
+        self.cache.set("foo", 1)
+        other = EmopCache(str(self.tmpdir.join("cache")), "test")
+
+        self.assertEqual(1, other.get("foo", ttl=60))
+
+    @mock.patch("emop.lib.emop_cache.time.time")
+    def test_get_expired(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.set("foo", 1)
+        mock_time.return_value = 1061
+
+        self.assertIsNone(self.cache.get("foo", ttl=60))
+        self.assertEqual(1, self.cache.get("foo", ttl=120))
+
+    def test_load_unreadable(self):
+        self.tmpdir.mkdir("cache").join("test.json").write("{")
+
+        self.assertEqual({}, self.cache.load())
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopCache)
@@ -0,0 +1,117 @@
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+from tests.utilities import *
+from emop.emop_query import EmopQuery
+from emop.emop_submit import EmopSubmit
+from emop.emop_upload import EmopUpload
+from emop.lib.emop_api import EmopAPI
+from emop.lib.emop_cache import EmopCache
+from emop.lib.emop_payload import EmopPayload
+from emop.lib.emop_fake_dashboard import EmopFakeDashboard, DONE, FAILED
+
+
+class TestEmopFakeDashboard(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_dashboard(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.dashboard = EmopFakeDashboard()
+        self.dashboard.add_pages(10, batch_id=16)
+        self.dashboard.add_pages(5, batch_id=17)
+        self.dashboard.start()
+        yield
+        self.dashboard.stop()
+
+    def setup_settings(self, obj):
+        obj.settings.payload_input_path = str(self.tmpdir.join("input"))
+        obj.settings.payload_output_path = str(self.tmpdir.join("output"))
+        obj.settings.payload_completed_path = str(self.tmpdir.join("completed"))
+        obj.settings.payload_uploaded_path = str(self.tmpdir.join("uploaded"))
+        obj.settings.cache_path = str(self.tmpdir.join("cache"))
+        obj.emop_api = EmopAPI(self.dashboard.url_base, obj.settings.api_headers)
+        if hasattr(obj, "cache"):
+            obj.cache = EmopCache(obj.settings.cache_path, "emop_query")
+        return obj
+
+    def test_job_statuses(self):
+        api = EmopAPI(self.dashboard.url_base, {})
+        results = api.get_request("/api/job_statuses", {"name": "Not Started"})
+
+        self.assertEqual([{"id": 1, "name": "Not Started"}], results["results"])
+
+    def test_pending_pages(self):
+        query = self.setup_settings(EmopQuery(default_config_path()))
+
+        self.assertEqual(15, query.pending_pages(q_filter={}))
+        self.assertEqual(5, query.pending_pages(q_filter={"batch_id": 17}))
+
+    def test_pending_pages_cached_job_status(self):
+        query = self.setup_settings(EmopQuery(default_config_path()))
+        query.pending_pages(q_filter={})
+        query = self.setup_settings(EmopQuery(default_config_path()))
+        query.pending_pages(q_filter={})
+
+        self.assertEqual(1, self.dashboard.request_counts["/api/job_statuses"])
+        self.assertEqual(2, self.dashboard.request_counts["/api/job_queues/count"])
+
+    def test_pending_pages_by_batch(self):
+        query = self.setup_settings(EmopQuery(default_config_path()))
+
+        self.assertEqual([(16, 10), (17, 5)], query.pending_pages_by(q_filter={}, by="batch"))
+        self.assertEqual([(17, 5)], query.pending_pages_by(q_filter={"batch_id": [17]}, by="batch"))
+        self.assertEqual([(16, 10)], query.pending_pages_by(q_filter={"batch_id": 16}, by="batch"))
+
+    def test_reserve_and_upload(self):
+        submit = self.setup_settings(EmopSubmit(default_config_path()))
+        upload = self.setup_settings(EmopUpload(default_config_path()))
+        proc_id = submit.reserve(num_pages=3, r_filter={"batch_id": 16})
+        reserved = submit.payload.load_input()
+        data = {
+            "job_queues": {
+                "completed": [reserved[0]["id"], reserved[1]["id"]],
+                "failed": [{"id": reserved[2]["id"], "results": "test"}],
+            },
+            "page_results": [{"page_id": reserved[0]["page"]["id"], "batch_id": 16, "ocr_text_path": "/dne"}],
+            "postproc_results": [],
+        }
+        uploaded = upload.upload_chunks(data, submit.payload)
+
+        self.assertTrue(proc_id)
+        self.assertEqual(3, len(reserved))
+        self.assertEqual(12, self.dashboard.count(1))
+        self.assertTrue(uploaded)
+        self.assertEqual(2, self.dashboard.count(DONE))
+        self.assertEqual(1, self.dashboard.count(FAILED))
+
+    def test_reserve_bulk(self):
+        submit = self.setup_settings(EmopSubmit(default_config_path()))
+        submit.settings.reserve_max_pages = 6
+        reserved = submit.reserve_bulk(num_jobs=5, pages_per_job=3, r_filter={"batch_id": 16})
+        proc_ids = [r[0] for r in reserved]
+        num_pages = [r[1] for r in reserved]
+        payload_ids = [j["id"] for p in proc_ids for j in EmopPayload(submit.settings, p).load_input()]
+
+        self.assertEqual([3, 3, 2, 2], num_pages)
+        self.assertEqual(4, len(set(proc_ids)))
+        self.assertEqual(10, len(set(payload_ids)))
+        self.assertEqual(2, self.dashboard.request_counts["/api/job_queues/reserve"])
+        self.assertEqual(0, submit.emop_api.get_request("/api/job_queues/count", {"batch_id": 16, "job_status_id": 1})["job_queue"]["count"])
+
+    def test_reserve_unique_proc_ids(self):
+        submit = self.setup_settings(EmopSubmit(default_config_path()))
+        proc_id_1 = submit.reserve(num_pages=1, r_filter={})
+        proc_id_2 = submit.reserve(num_pages=1, r_filter={})
+
+        self.assertNotEqual(proc_id_1, proc_id_2)
+
+    def test_error_injection(self):
+        self.dashboard.error_rate = 1
+        api = EmopAPI(self.dashboard.url_base, {})
+        results = api.get_request("/api/job_statuses", {"name": "Not Started"})
+
+        self.assertEqual({}, results)
+        self.assertEqual(1, self.dashboard.request_counts["/api/job_statuses"])
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopFakeDashboard)
@@ -0,0 +1,185 @@
+import mock
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest import TestLoader
+from tests.utilities import *
+from emop.lib.emop_fake_slurm import EmopFakeSLURM, parse_time, format_time
+from emop.lib.schedulers.emop_slurm import EmopSLURM
+
+SQUEUE_ARGS = ["-r", "--noheader", "-p", "idhmc", "-n", "emop-controller", "-o", "%i|%T|%r|%M|%l|%N|%j|%k|%K"]
+SACCT_ARGS = ["-n", "-P", "--name", "emop-controller", "-o", "JobID,State,Elapsed,MaxRSS,TotalCPU,ExitCode"]
+
+
+class TestEmopFakeSLURM(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.slurm = self.fake_slurm()
+
+    def tearDown(self):
+        self.slurm.close()
+        shutil.rmtree(self.tmpdir)
+
+    def fake_slurm(self, **kwargs):
+        kwargs.setdefault("queue_wait", 0)
+        kwargs.setdefault("runtime", 60)
+        kwargs.setdefault("fail_rate", 0)
+        kwargs.setdefault("cpus", 4)
+        return EmopFakeSLURM(db_path=os.path.join(self.tmpdir, "slurm.db"), seed=1, **kwargs)
+
+    def sbatch(self, *args):
+        argv = ["--parsable", "-p", "idhmc", "-J", "emop-controller", "--mem-per-cpu", "4000",
+                "--cpus-per-task", "1"] + list(args) + ["emop.slrm"]
+        output, exitcode = self.slurm.sbatch(argv)
+        self.assertEqual(0, exitcode)
+        return output.strip()
+
+    def squeue(self):
+        output, exitcode = self.slurm.squeue(SQUEUE_ARGS)
+        return [line.split("|") for line in output.splitlines()]
+
+    def test_parse_time(self):
+        self.assertEqual(120, parse_time("2"))
+        self.assertEqual(125, parse_time("2:05"))
+        self.assertEqual(3725, parse_time("1:02:05"))
+        self.assertEqual(93600, parse_time("1-02"))
+        self.assertEqual(None, parse_time("UNLIMITED"))
+
+    def test_format_time(self):
+        self.assertEqual("00:02:05", format_time(125))
+        self.assertEqual("1-02:00:00", format_time(93600))
+        self.assertEqual("UNLIMITED", format_time(None))
+
+    def test_sbatch(self):
+        self.assertEqual("1", self.sbatch("--comment", "0001"))
+        self.assertEqual("2", self.sbatch("--comment", "0002"))
+
+    def test_sbatch_not_parsable(self):
+        output, exitcode = self.slurm.sbatch(["emop.slrm"])
+        self.assertEqual("Submitted batch job 1\n", output)
+
+    def test_squeue(self):
+        self.sbatch("--comment", "0001", "--time", "00:10:00")
+        jobs = self.squeue()
+
+        self.assertEqual(1, len(jobs))
+        self.assertEqual(["1", "RUNNING", "None"], jobs[0][:3])
+        self.assertEqual(["00:10:00", self.slurm.hostname, "emop-controller", "0001", "N/A"], jobs[0][4:])
+
+    def test_squeue_header(self):
+        self.sbatch()
+        output, exitcode = self.slurm.squeue(["-o", "%i %T"])
+        self.assertEqual("JOBID STATE", output.splitlines()[0])
+
+    def test_squeue_filters(self):
+        self.sbatch()
+        self.assertEqual([], self.slurm.squeue(SQUEUE_ARGS[:3] + ["other"] + SQUEUE_ARGS[4:])[0].splitlines())
+        self.assertEqual([], self.slurm.squeue(SQUEUE_ARGS[:5] + ["other"] + SQUEUE_ARGS[6:])[0].splitlines())
+
+    def test_squeue_pending(self):
+        self.slurm = self.fake_slurm(queue_wait=1e9)
+        self.sbatch()
+        self.assertEqual(["1", "PENDING", "Priority"], self.squeue()[0][:3])
+
+    def test_squeue_array_throttle(self):
+        self.assertEqual("1", self.sbatch("--array", "0-4%2"))
+        jobs = self.squeue()
+
+        self.assertEqual(["1_0", "1_1", "1_2", "1_3", "1_4"], [j[0] for j in jobs])
+        self.assertEqual(["RUNNING"] * 2 + ["PENDING"] * 3, [j[1] for j in jobs])
+        self.assertEqual(["0", "1", "2", "3", "4"], [j[8] for j in jobs])
+
+    def test_squeue_completed_not_listed(self):
+        self.sbatch()
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            self.assertEqual([], self.squeue())
+
+    def test_sacct_completed(self):
+        self.sbatch("--time", "01:00:00")
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            output, exitcode = self.slurm.sacct(SACCT_ARGS)
+        lines = [line.split("|") for line in output.splitlines()]
+
+        self.assertEqual(["1", "1.batch"], [line[0] for line in lines])
+        self.assertEqual(["COMPLETED", "COMPLETED"], [line[1] for line in lines])
+        self.assertEqual("", lines[0][3])
+        self.assertTrue(lines[1][3].endswith("K"))
+        self.assertEqual("0:0", lines[1][5])
+
+    def test_sacct_allocations(self):
+        self.sbatch()
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            output, exitcode = self.slurm.sacct(["-X"] + SACCT_ARGS)
+        self.assertEqual(1, len(output.splitlines()))
+
+    def test_sacct_timeout(self):
+        self.sbatch("--time", "0:10")
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            output, exitcode = self.slurm.sacct(["-X"] + SACCT_ARGS)
+        job = output.strip().split("|")
+
+        self.assertEqual("TIMEOUT", job[1])
+        self.assertEqual("00:00:10", job[2])
+
+    def test_sacct_out_of_memory(self):
+        self.slurm = self.fake_slurm(max_rss=100000)
+        self.sbatch()
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            output, exitcode = self.slurm.sacct(["-X"] + SACCT_ARGS)
+        self.assertEqual("OUT_OF_MEMORY", output.strip().split("|")[1])
+
+    def test_sacct_failed(self):
+        self.slurm = self.fake_slurm(fail_rate=1)
+        self.sbatch()
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            output, exitcode = self.slurm.sacct(["-X"] + SACCT_ARGS)
+        job = output.strip().split("|")
+
+        self.assertEqual("FAILED", job[1])
+        self.assertEqual("1:0", job[5])
+
+    def test_sinfo(self):
+        self.sbatch("--array", "0-9")
+        output, exitcode = self.slurm.sinfo(["--noheader", "-p", "idhmc", "-o", "%C"])
+        self.assertEqual("4/0/0/4\n", output)
+
+    def test_emop_slurm_get_jobs(self):
+        self.sbatch("--comment", "0001")
+        self.sbatch("--array", "0-1%1", "--comment", "/dne/0002.manifest")
+        output, exitcode = self.slurm.squeue(SQUEUE_ARGS)
+        settings = default_settings()
+        scheduler = EmopSLURM(settings)
+        scheduler.read_manifest = mock.Mock(return_value=["0002", "0003"])
+        with mock.patch("emop.lib.schedulers.emop_slurm.exec_cmd",
+                        return_value=mock_proc_tuple(output, "", 0)):
+            jobs = scheduler.get_jobs()
+
+        self.assertEqual(["1", "2_0", "2_1"], [j.job_id for j in jobs])
+        self.assertEqual(["RUNNING", "RUNNING", "PENDING"], [j.state for j in jobs])
+        self.assertEqual(["0001", "0002", "0003"], [j.proc_id for j in jobs])
+        scheduler.read_manifest.assert_called_once_with("/dne/0002.manifest")
+
+    def test_emop_slurm_get_accounting(self):
+        self.sbatch("--comment", "0001", "--time", "01:00:00")
+        self.sbatch("--comment", "0002", "--time", "0:10")
+        with mock.patch("emop.lib.emop_fake_slurm.time.time", return_value=time.time() + 3600):
+            output, exitcode = self.slurm.sacct(["-n", "-P", "--name", "emop-controller", "-o",
+                                                 "JobID,State,ExitCode,Elapsed,Timelimit,MaxRSS,TotalCPU,AllocCPUS,"
+                                                 "ReqMem,End,Comment"])
+        scheduler = EmopSLURM(default_settings())
+        with mock.patch("emop.lib.schedulers.emop_slurm.exec_cmd",
+                        return_value=mock_proc_tuple(output, "", 0)):
+            records = scheduler.get_accounting(0)
+
+        self.assertEqual(["COMPLETED", "TIMEOUT"], [r.state for r in records])
+        self.assertEqual(["0001", "0002"], [r.proc_id for r in records])
+        self.assertEqual(10, records[1].elapsed)
+        self.assertEqual(4000, records[0].req_mem)
+        self.assertTrue(records[0].max_rss > 0)
+        self.assertTrue(records[0].total_cpu > 0)
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopFakeSLURM)
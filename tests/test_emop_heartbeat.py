@@ -0,0 +1,118 @@
+import json
+import mock
+import os
+import pytest
+import time
+from unittest import TestCase
+from unittest import TestLoader
+from tests.utilities import *
+from emop.emop_query import EmopQuery
+from emop.lib.emop_heartbeat import EmopHeartbeat, heartbeat_filename, load_heartbeats
+from emop.lib.emop_scheduler import EmopSchedulerJob
+
+
+def scheduler_job(proc_id, job_id="1", state="RUNNING", elapsed=60, time_limit=3600):
+    return EmopSchedulerJob(job_id=job_id, state=state, reason="None", elapsed=elapsed, time_limit=time_limit,
+                            node="c0101", name="emop-controller", proc_id=proc_id)
+
+
+class TestEmopHeartbeat(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_settings(self, tmpdir):
+        self.settings = default_settings()
+        self.settings.heartbeat_path = str(tmpdir.join("heartbeats"))
+
+    def heartbeat(self, proc_id="0001", num_pages=4):
+        return EmopHeartbeat(settings=self.settings, proc_id=proc_id, job_id="1", num_pages=num_pages)
+
+    def read(self, proc_id="0001"):
+        with open(heartbeat_filename(self.settings, proc_id)) as f:
+            return json.load(f)
+
+    def test_write(self):
+        heartbeat = self.heartbeat()
+        heartbeat.start_page(10)
+        heartbeat.start_stage("Denoise")
+        heartbeat.write()
+        status = self.read()
+
+        self.assertEqual(("0001", "1", 4, 10, "Denoise"),
+                         (status["proc_id"], status["job_id"], status["num_pages"], status["page"], status["stage"]))
+        self.assertTrue(status["updated"] >= status["started"])
+        self.assertEqual(["0001.json"], os.listdir(self.settings.heartbeat_path))
+
+    def test_page_done_predicts_finish(self):
+        heartbeat = self.heartbeat()
+        with mock.patch("emop.lib.emop_heartbeat.time.time", side_effect=[100.0, 110.0, 110.0, 130.0]):
+            heartbeat.start_page(1)
+            heartbeat.page_done()
+            heartbeat.start_page(2)
+            heartbeat.page_done(failed=True)
+        status = heartbeat.get_status()
+
+        self.assertEqual((1, 1), (status["pages_done"], status["pages_failed"]))
+        self.assertEqual(15.0, status["mean_page_time"])
+        self.assertEqual(160.0, status["eta"])
+        self.assertEqual(None, status["stage"])
+
+    def test_thread_writes_and_removes_file(self):
+        heartbeat = self.heartbeat()
+        heartbeat.start()
+        for _ in range(100):
+            if os.path.isfile(heartbeat.filename):
+                break
+            time.sleep(0.01)
+        self.assertTrue(os.path.isfile(heartbeat.filename))
+        heartbeat.stop()
+        self.assertFalse(os.path.isfile(heartbeat.filename))
+
+    def test_load_heartbeats_skips_unreadable(self):
+        self.heartbeat("0001").write()
+        with open(os.path.join(self.settings.heartbeat_path, "0002.json"), "w") as f:
+            f.write("{")
+
+        self.assertEqual(["0001"], list(load_heartbeats(self.settings)))
+
+    def query(self, jobs):
+        query = EmopQuery(default_config_path())
+        query.settings = self.settings
+        query.scheduler.snapshot = mock.Mock(return_value=jobs)
+        return query
+
+    def test_query_running(self):
+        heartbeat = self.heartbeat("0001")
+        heartbeat.status["started"] = time.time() - 3600
+        heartbeat.page_done()
+        heartbeat.write()
+        report = self.query([scheduler_job("0001"), scheduler_job("0002", job_id="2")]).running()
+        first, second = report["jobs"]
+
+        self.assertEqual(("1", "RUNNING", 1, 4, None), (first["job_id"], first["state"], first["pages_done"],
+                                                        first["num_pages"], first["stalled"]))
+        self.assertEqual(3540, first["time_left"])
+        self.assertAlmostEqual(1.0, first["pages_per_hour"], places=2)
+        self.assertEqual(("2", None), (second["job_id"], second["num_pages"]))
+        self.assertEqual(0, report["stalled"])
+
+    def test_query_running_stalled(self):
+        self.settings.heartbeat_stall = 60
+        heartbeat = self.heartbeat("0001")
+        heartbeat.start_stage("PageCorrector")
+        heartbeat.status["stage_started"] -= 120
+        heartbeat.write()
+        self.heartbeat("0002").write()
+        report = self.query([scheduler_job("0001")]).running()
+
+        self.assertEqual(["in PageCorrector for 120 seconds", "not running"], [j["stalled"] for j in report["jobs"]])
+        self.assertEqual(2, report["stalled"])
+
+    def test_query_running_no_heartbeat(self):
+        self.heartbeat("0001").write()
+        with mock.patch("emop.emop_query.time.time", return_value=time.time() + 3600):
+            report = self.query([scheduler_job("0001")]).running()
+
+        self.assertTrue(report["jobs"][0]["stalled"].startswith("no heartbeat for"))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopHeartbeat)
@@ -0,0 +1,132 @@
+import mock
+import os
+import pytest
+import sys
+import time
+from unittest import TestCase
+from unittest import TestLoader
+from tests.utilities import default_settings
+from emop.lib.emop_scheduler import EmopScheduler
+from emop.lib.schedulers.emop_local import EmopLocal
+
+
+class TestEmopLocal(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_local(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.settings = default_settings()
+        self.settings.local_job_db = str(tmpdir.join("local_jobs.db"))
+        self.settings.local_processes = 2
+        self.settings.scheduler_logfile = str(tmpdir.join("logs", "emop-controller-%j.out"))
+        self.settings.scheduler_set_walltime = False
+        self.scheduler = EmopLocal(self.settings)
+        self.scheduler.poll_interval = 0.05
+        self.scheduler.start_runner = mock.MagicMock(return_value=os.getpid())
+        self.scheduler.get_upload_cmd = lambda proc_id: [sys.executable, "-c", "print('uploaded %s')" % proc_id]
+
+    def get_states(self):
+        conn = self.scheduler.connect()
+        try:
+            return [r["state"] for r in conn.execute("SELECT state FROM jobs ORDER BY id")]
+        finally:
+            conn.close()
+
+    def test_get_scheduler_instance(self):
+        scheduler = EmopScheduler.get_scheduler_instance(name="local", settings=self.settings)
+        self.assertTrue(isinstance(scheduler, EmopLocal))
+
+    def test_submit_job_dispatch(self):
+        for proc_id in ["1", "2", "3"]:
+            self.assertTrue(self.scheduler.submit_job(proc_id, 1))
+
+        self.assertEqual(["RUNNING", "RUNNING", "PENDING"], self.get_states())
+        self.assertEqual(2, self.scheduler.start_runner.call_count)
+        self.assertEqual(3, self.scheduler.current_job_count())
+
+    def test_submit_job_walltime(self):
+        self.settings.scheduler_set_walltime = True
+        self.settings.avg_page_runtime = 10
+        self.settings.max_job_runtime = 3600
+        self.scheduler.submit_job("1", 2)
+        jobs = self.scheduler.get_jobs()
+
+        self.assertEqual(80, jobs[0].time_limit)
+        self.assertEqual("1", jobs[0].proc_id)
+
+    def test_get_jobs_dead_runner(self):
+        self.scheduler.submit_job("1", 1)
+        self.scheduler.pid_alive = mock.MagicMock(return_value=False)
+
+        self.assertEqual([], self.scheduler.get_jobs())
+        self.assertEqual(["FAILED"], self.get_states())
+
+    def test_run_job(self):
+        self.scheduler.submit_job("1", 1)
+        self.scheduler.get_run_cmd = lambda proc_id: [sys.executable, "-c", "import os; print(os.environ['PROC_ID'])"]
+        state = self.scheduler.run_job(1)
+
+        self.assertEqual("COMPLETED", state)
+        self.assertEqual(["COMPLETED"], self.get_states())
+        log = self.tmpdir.join("logs", "emop-controller-1.out").read().splitlines()
+        self.assertEqual("1", log[0])
+        self.assertEqual("uploaded 1", log[2])
+        self.assertTrue(log[3].startswith("UPLOAD TIME: "))
+        self.assertTrue(log[4].startswith("JOB TIME: "))
+
+    def test_run_job_failed(self):
+        self.scheduler.submit_job("1", 1)
+        self.scheduler.get_run_cmd = lambda proc_id: [sys.executable, "-c", "import sys; sys.exit(1)"]
+
+        self.assertEqual("FAILED", self.scheduler.run_job(1))
+        log = self.tmpdir.join("logs", "emop-controller-1.out").read()
+        self.assertFalse("uploaded" in log)
+        self.assertTrue(log.startswith("JOB TIME: "))
+
+    def test_run_job_upload(self):
+        self.scheduler.submit_job("1", 1)
+        self.scheduler.get_run_cmd = lambda proc_id: [sys.executable, "-c", "pass"]
+        self.scheduler.get_upload_cmd = mock.MagicMock(return_value=[sys.executable, "-c", "import sys; sys.exit(1)"])
+
+        self.assertEqual("COMPLETED", self.scheduler.run_job(1))
+        self.scheduler.get_upload_cmd.assert_called_once_with("1")
+
+    def test_get_upload_cmd(self):
+        cmd = EmopLocal(self.settings).get_upload_cmd("1")
+        self.assertEqual(["upload", "--proc-id", "1"], cmd[-3:])
+        self.assertEqual(["-c", self.settings.config_path], cmd[-5:-3])
+
+    def test_run_job_timeout(self):
+        self.settings.scheduler_set_walltime = True
+        self.scheduler.walltime = mock.MagicMock(return_value=0.1)
+        self.scheduler.kill_grace = 0.1
+        self.scheduler.submit_job("1", 1)
+        self.scheduler.get_run_cmd = lambda proc_id: [sys.executable, "-c", "import time; time.sleep(10)"]
+        start = time.time()
+
+        self.assertEqual("TIMEOUT", self.scheduler.run_job(1))
+        self.assertTrue(time.time() - start < 5)
+        self.assertTrue("uploaded 1" in self.tmpdir.join("logs", "emop-controller-1.out").read())
+
+    def test_get_accounting(self):
+        self.scheduler.submit_job("1", 1)
+        self.scheduler.get_run_cmd = lambda proc_id: [sys.executable, "-c", "import sys; sys.exit(1)"]
+        self.scheduler.run_job(1)
+        records = self.scheduler.get_accounting(0)
+
+        self.assertEqual(["1"], [r.job_id for r in records])
+        self.assertEqual("FAILED", records[0].state)
+        self.assertEqual("1:0", records[0].exit_code)
+        self.assertEqual("1", records[0].proc_id)
+        self.assertEqual([], self.scheduler.get_accounting(time.time() + 60))
+
+    def test_is_job_environment(self):
+        os.environ["EMOP_LOCAL_JOB_ID"] = "1"
+        try:
+            self.assertTrue(self.scheduler.is_job_environment())
+            self.assertEqual("1", self.scheduler.get_job_id())
+        finally:
+            del os.environ["EMOP_LOCAL_JOB_ID"]
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopLocal)
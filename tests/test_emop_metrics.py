@@ -0,0 +1,126 @@
+import json
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+from emop.lib.emop_metrics import EmopMetrics, format_labels
+
+
+class TestEmopMetrics(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_metrics(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.metrics = EmopMetrics()
+
+    def record_calls(self):
+        self.metrics.record_api_call("GET", "/api/job_statuses", 0, 50, 0.02, 200, 0)
+        self.metrics.record_api_call("GET", "/api/job_statuses", 0, 50, 0.2, 200, 0)
+        self.metrics.record_api_call("GET", "/api/job_statuses", 0, 0, 3.0, 500, 2)
+        self.metrics.record_api_call("PUT", "/api/job_queues/reserve", 100, 500, 1.5, 200, 0)
+
+    def test_percentile(self):
+        values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        self.assertEqual(5, EmopMetrics.percentile(values, 50))
+        self.assertEqual(9, EmopMetrics.percentile(values, 90))
+        self.assertEqual(10, EmopMetrics.percentile(values, 100))
+        self.assertEqual(0, EmopMetrics.percentile([], 50))
+
+    def test_api_summary(self):
+        self.record_calls()
+        summary = self.metrics.api_summary()
+        job_statuses = summary[0]
+        buckets = dict(job_statuses["buckets"])
+
+        self.assertEqual(2, len(summary))
+        self.assertEqual("/api/job_statuses", job_statuses["endpoint"])
+        self.assertEqual(3, job_statuses["count"])
+        self.assertEqual(1, job_statuses["errors"])
+        self.assertEqual(2, job_statuses["retries"])
+        self.assertEqual(100, job_statuses["response_bytes"])
+        self.assertEqual(0.2, job_statuses["latency_p50"])
+        self.assertEqual(3.0, job_statuses["latency_max"])
+        self.assertEqual(1, buckets[0.05])
+        self.assertEqual(2, buckets[0.25])
+        self.assertEqual(3, buckets["+Inf"])
+
+    def test_format_api_summary_empty(self):
+        self.assertEqual([], self.metrics.format_api_summary())
+
+    def test_write_log(self):
+        log_file = self.tmpdir.join("logs", "metrics.jsonl")
+        self.metrics.configure(log_filename=str(log_file))
+        self.record_calls()
+        self.metrics.write_log("submit")
+        lines = log_file.read().splitlines()
+        record = json.loads(lines[-1])
+
+        self.assertEqual(4, len(lines))
+        self.assertEqual("api_call", record["type"])
+        self.assertEqual("submit", record["command"])
+        self.assertEqual("/api/job_queues/reserve", record["endpoint"])
+        self.assertEqual(100, record["request_bytes"])
+
+    def test_write_log_disabled(self):
+        self.record_calls()
+        self.metrics.write_log("submit")
+
+        self.assertEqual([], self.tmpdir.listdir())
+
+    def test_format_textfile_counter(self):
+        self.metrics.set_label("job", "12")
+        self.metrics.inc("emop_pages_total", result="completed")
+        self.metrics.inc("emop_pages_total", 2, result="completed")
+        lines = self.metrics.format_textfile()
+
+        self.assertEqual("# TYPE emop_pages_total counter", lines[1])
+        self.assertEqual('emop_pages_total{command="",host="%s",job="12",result="completed"} 3.0' %
+                         self.metrics.hostname, lines[2])
+
+    def test_format_textfile_histogram(self):
+        self.metrics.set_label("host", "c0101")
+        self.metrics.observe("emop_stage_duration_seconds", 3, [1, 5], stage="OCR")
+        self.metrics.observe("emop_stage_duration_seconds", 7, [1, 5], stage="OCR")
+        lines = self.metrics.format_textfile()[2:]
+        labels = 'command="",host="c0101",job=""'
+
+        self.assertEqual([
+            'emop_stage_duration_seconds_bucket{%s,le="1",stage="OCR"} 0.0' % labels,
+            'emop_stage_duration_seconds_bucket{%s,le="5",stage="OCR"} 1.0' % labels,
+            'emop_stage_duration_seconds_bucket{%s,le="+Inf",stage="OCR"} 2.0' % labels,
+            'emop_stage_duration_seconds_count{%s,stage="OCR"} 2.0' % labels,
+            'emop_stage_duration_seconds_sum{%s,stage="OCR"} 10.0' % labels,
+        ], lines)
+
+    def test_format_textfile_api_calls(self):
+        self.record_calls()
+        names = [line.split("{")[0] for line in self.metrics.format_textfile() if not line.startswith("#")]
+
+        self.assertEqual(3, len([n for n in names if n == "emop_api_requests_total"]))
+        self.assertTrue("emop_api_request_duration_seconds_bucket" in names)
+        self.assertTrue("emop_api_sent_bytes_total" in names)
+
+    def test_format_labels_escapes(self):
+        self.assertEqual('{a="x\\"y\\\\z\\n"}', format_labels((("a", 'x"y\\z\n'),)))
+
+    def test_write_textfile(self):
+        textfile_path = self.tmpdir.join("textfile")
+        self.metrics.configure(log_filename=None, textfile_path=str(textfile_path), textfile_interval=3600)
+        self.metrics.set_label("command", "run")
+        self.metrics.set_label("job", "12")
+        self.metrics.inc("emop_pages_total", result="completed")
+        self.metrics.inc("emop_pages_total", result="completed")
+        textfile = textfile_path.join("emop-run-12.prom")
+
+        self.assertEqual(["emop-run-12.prom"], [p.basename for p in textfile_path.listdir()])
+        self.assertTrue(textfile.read().splitlines()[2].endswith(" 1.0"))
+        self.metrics.write_textfile(force=True)
+        self.assertTrue(textfile.read().splitlines()[2].endswith(" 2.0"))
+
+    def test_write_textfile_disabled(self):
+        self.metrics.inc("emop_pages_total", result="completed")
+        self.metrics.write_textfile(force=True)
+
+        self.assertEqual([], self.tmpdir.listdir())
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopMetrics)
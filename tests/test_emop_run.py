@@ -68,6 +68,24 @@ class TestEmopRun(TestCase):
         self.assertItemsEqual(expected_completed, actual_completed_results)
         self.assertTrue(self.run.payload.save_output.called)
 
+    def test_append_result_heartbeat(self):
+        settings = default_settings()
+        job = mock_emop_job(settings)
+        self.run.payload.save_output = mock.MagicMock()
+        self.run.heartbeat = mock.Mock()
+        self.run.append_result(job=job, results="Test", failed=True)
+
+        self.run.heartbeat.page_done.assert_called_once_with(failed=True)
+
+    @mock.patch("emop.emop_run.metrics")
+    def test_append_result_metrics(self, mock_metrics):
+        settings = default_settings()
+        job = mock_emop_job(settings)
+        self.run.payload.save_output = mock.MagicMock()
+        self.run.append_result(job=job, results=None)
+
+        mock_metrics.inc.assert_called_once_with("emop_pages_total", result="completed")
+
     def test_get_results(self):
         self.run.jobs_completed.append(1)
         self.run.jobs_failed.append({"id": 2, "results": "test"})
@@ -84,6 +102,24 @@ class TestEmopRun(TestCase):
         actual_value = self.run.get_results()
         self.assertEqual(expected_value, actual_value)
 
+    def test_copy_results(self):
+        self.run.jobs_completed.append(1)
+        self.run.page_results.append({"batch_id": 1, "page_id": 2})
+        actual_value = self.run.copy_results()
+        self.run.jobs_completed.append(3)
+
+        self.assertEqual([1], actual_value["job_queues"]["completed"])
+        self.assertEqual(self.run.get_results()["page_results"], actual_value["page_results"])
+
+    def test_append_result_upload_thread(self):
+        settings = default_settings()
+        job = mock_emop_job(settings)
+        self.run.payload.save_output = mock.MagicMock()
+        self.run.upload_thread = mock.MagicMock()
+        self.run.append_result(job=job, results=None)
+
+        self.assertTrue(self.run.upload_thread.page_done.called)
+
     def test_do_process_page_corrector(self):
         settings = default_settings()
         job = mock_emop_job(settings)
@@ -0,0 +1,96 @@
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+import unittest
+from emop.lib.emop_runtime_model import EmopRuntimeModel, EmopRuntimeEstimate, normal_quantile
+from emop.lib.emop_stats import EmopStats
+
+
+class TestEmopRuntimeModel(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_model(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.model = EmopRuntimeModel(min_samples=3)
+
+    def write_log(self, name, lines):
+        self.tmpdir.join(name).write("\n".join(lines) + "\n")
+
+    def test_normal_quantile(self):
+        self.assertAlmostEqual(0.0, normal_quantile(0.5), places=6)
+        self.assertAlmostEqual(1.6449, normal_quantile(0.95), places=3)
+
+    def test_load_stats(self):
+        self.write_log("emop-controller-1.out", [
+            "[2015-01-01T00:00:00] INFO: Got job [1] - Batch: b JobType: ocr OCR Engine: tesseract BatchID: 16 Font: f1",
+            "[2015-01-01T00:00:10] INFO: Job [1] COMPLETE: Duration: 10.5 secs",
+            "[2015-01-01T00:00:10] INFO: Job [2] COMPLETE: Duration: 20 secs",
+        ])
+        self.write_log("emop-controller-1.err", ["Job [3] COMPLETE: Duration: 30 secs"])
+        stats = EmopStats(str(self.tmpdir.join("stats.db")))
+        stats.update_runtimes(str(self.tmpdir), processes=1)
+        self.model.load_stats(stats)
+
+        self.assertEqual([(10.5, "16", "f1"), (20.0, None, None)], sorted(self.model.samples))
+
+    def test_estimate_batch(self):
+        for r in [10, 20, 30]:
+            self.model.add_sample(r, batch_id="16", font="f1")
+        self.model.add_sample(100, batch_id="17", font="f1")
+        estimate = self.model.estimate({"batch_id": 16})
+
+        self.assertEqual("batch_id=16", estimate.source)
+        self.assertEqual(20, estimate.mean)
+
+    def test_estimate_font_fallback(self):
+        self.model.add_sample(10, batch_id="16", font="f1")
+        self.model.add_sample(20, batch_id="17", font="f1")
+        self.model.add_sample(30, batch_id="18", font="f1")
+        self.model.add_sample(1000, batch_id="19", font="f2")
+        estimate = self.model.estimate({"batch_id": [16]})
+
+        self.assertEqual("font=f1", estimate.source)
+        self.assertEqual(3, estimate.count)
+
+    def test_estimate_all_fallback(self):
+        self.model.add_sample(10, batch_id="16", font="f1")
+        self.model.add_sample(20, batch_id="17", font="f2")
+        self.model.add_sample(30)
+        estimate = self.model.estimate({"batch_id": 16})
+
+        self.assertEqual("all", estimate.source)
+        self.assertEqual(3, estimate.count)
+
+    def test_estimate_too_few(self):
+        self.model.add_sample(10)
+        self.assertIsNone(self.model.estimate({}))
+
+
+class TestEmopRuntimeEstimate(TestCase):
+    def test_quantile(self):
+        estimate = EmopRuntimeEstimate(range(1, 101), "all")
+        self.assertEqual(50, estimate.quantile(0.5))
+        self.assertEqual(95, estimate.quantile(0.95))
+        self.assertEqual(100, estimate.quantile(1))
+
+    def test_job_runtime(self):
+        estimate = EmopRuntimeEstimate([10, 30], "all")
+        self.assertEqual(10, estimate.std)
+        self.assertAlmostEqual(2000 + 100 * 1.6449, estimate.job_runtime(100, 0.95), places=1)
+
+    def test_job_runtime_single_page_quantile(self):
+        estimate = EmopRuntimeEstimate([10] * 9 + [100], "all")
+        self.assertEqual(100, estimate.job_runtime(1, 0.95))
+
+    def test_pages_within(self):
+        estimate = EmopRuntimeEstimate([10, 30], "all")
+        pages = estimate.pages_within(3600, 0.95)
+
+        self.assertTrue(estimate.job_runtime(pages, 0.95) <= 3600)
+        self.assertTrue(estimate.job_runtime(pages + 1, 0.95) > 3600)
+
+
+def suite():
+    return unittest.TestSuite([
+        TestLoader().loadTestsFromTestCase(TestEmopRuntimeModel),
+        TestLoader().loadTestsFromTestCase(TestEmopRuntimeEstimate),
+    ])
@@ -0,0 +1,81 @@
+from unittest import TestCase
+from unittest import TestLoader
+from emop.lib.emop_simulator import EmopSimulator
+
+
+class TestEmopSimulator(TestCase):
+    def get_simulator(self, page_runtimes, max_jobs=2, queue_wait=0, submit_interval=3600, **kwargs):
+        return EmopSimulator(page_runtimes=page_runtimes, max_jobs=max_jobs, queue_wait=queue_wait,
+                             submit_interval=submit_interval, max_job_runtime=3600, seed=0, **kwargs)
+
+    def test_run_job(self):
+        simulator = self.get_simulator([10])
+        self.assertEqual((3, 30, 30, False), simulator.run_job(3, 100))
+        self.assertEqual((2, 20, 25, True), simulator.run_job(3, 25))
+
+    def test_run_job_overhead(self):
+        simulator = self.get_simulator([10], job_overhead=5, signal_lead_time=10)
+        self.assertEqual((3, 35, 35, False), simulator.run_job(3, 100))
+        self.assertEqual((1, 15, 30, True), simulator.run_job(3, 30))
+
+    def test_submit_interval_invalid(self):
+        self.assertRaises(ValueError, self.get_simulator, [10], submit_interval=0)
+
+    def test_run(self):
+        simulator = self.get_simulator([10])
+        stats = simulator.run(page_count=10, running_job_count=0,
+                              strategy=lambda pending, active: (2, 5), walltime=lambda n: 3600)
+
+        self.assertEqual(50, stats["makespan"])
+        self.assertEqual(2, stats["jobs"])
+        self.assertEqual(0, stats["kill_rate"])
+        self.assertEqual(0, stats["idle_slot_hours"])
+        self.assertEqual(0, stats["incomplete_pages"])
+        self.assertAlmostEqual(100 / 3600.0, stats["node_hours"])
+
+    def test_run_overhead(self):
+        simulator = self.get_simulator([10], job_overhead=5)
+        stats = simulator.run(page_count=10, running_job_count=0,
+                              strategy=lambda pending, active: (2, 5), walltime=lambda n: 3600)
+
+        self.assertEqual(55, stats["makespan"])
+        self.assertAlmostEqual(110 / 3600.0, stats["node_hours"])
+
+    def test_run_killed_pages_resubmitted(self):
+        simulator = self.get_simulator([10], submit_interval=100)
+        stats = simulator.run(page_count=4, running_job_count=0,
+                              strategy=lambda pending, active: (1, pending), walltime=lambda n: 25)
+
+        self.assertEqual(2, stats["jobs"])
+        self.assertEqual(1, stats["killed_jobs"])
+        self.assertEqual(0.5, stats["kill_rate"])
+        self.assertEqual(120, stats["makespan"])
+        self.assertEqual(0, stats["incomplete_pages"])
+
+    def test_run_idle_slots(self):
+        simulator = self.get_simulator([10])
+        stats = simulator.run(page_count=2, running_job_count=0,
+                              strategy=lambda pending, active: (1, 2), walltime=lambda n: 3600)
+
+        self.assertEqual(20, stats["makespan"])
+        self.assertEqual(0.5, stats["idle_fraction"])
+
+    def test_run_horizon(self):
+        simulator = self.get_simulator([100], submit_interval=100)
+        stats = simulator.run(page_count=1, running_job_count=0,
+                              strategy=lambda pending, active: (1, 1), walltime=lambda n: 10, horizon=1000)
+
+        self.assertEqual(1, stats["incomplete_pages"])
+        self.assertEqual(1, stats["kill_rate"])
+
+    def test_run_many(self):
+        simulator = self.get_simulator([10, 20], queue_wait=60)
+        stats = simulator.run_many(5, page_count=10, running_job_count=1,
+                                   strategy=lambda pending, active: (2, 5), walltime=lambda n: 3600)
+
+        self.assertEqual(0, stats["incomplete_pages"])
+        self.assertTrue(stats["makespan"] > 0)
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopSimulator)
@@ -1,8 +1,12 @@
 import mock
 import os
+import shutil
+import tempfile
 from unittest import TestCase
 from unittest import TestLoader
 from tests.utilities import *
+from emop.lib.emop_runtime_model import EmopRuntimeEstimate
+from emop.lib.emop_scheduler import EmopSchedulerJob
 from emop.lib.schedulers.emop_slurm import EmopSLURM
 
 
@@ -18,9 +22,11 @@ class TestEmopSLURM(TestCase):
         self.settings.avg_page_runtime = 60
         self.settings.max_job_runtime = 3600
         self.settings.scheduler_logfile = "/dne/log.out"
+        self.tmpdir = tempfile.mkdtemp()
 
     def tearDown(self):
         self.popen_patcher.stop()
+        shutil.rmtree(self.tmpdir)
 
     def clear_job_id_env(self):
         if os.environ.get("SLURM_JOB_ID"):
@@ -29,10 +35,10 @@ class TestEmopSLURM(TestCase):
     def test_current_job_count(self):
         scheduler = EmopSLURM(self.settings)
         expected_cmd = [
-            "squeue", "-r", "--noheader", "-p", "idhmc", "-n", "emop-controller"
+            "squeue", "-r", "--noheader", "-p", "idhmc", "-n", "emop-controller", "-o", "%i|%T|%r|%M|%l|%N|%j|%k|%K"
         ]
-        mock_stdout = ("       0001                 idhmc emop-controller treydock  R    0:01:00      1 c0101\n"
-                       "       0002                 idhmc emop-controller treydock  R    0:01:00      1 c0102\n")
+        mock_stdout = ("0001|RUNNING|None|1:00|1:00:00|c0101|emop-controller|0001|N/A\n"
+                       "0002|RUNNING|None|1:00|1:00:00|c0102|emop-controller|0002|N/A\n")
         self.mock_rv.communicate.return_value[0] = mock_stdout
         retval = scheduler.current_job_count()
         args, kwargs = self.mock_popen.call_args
@@ -49,13 +55,14 @@ class TestEmopSLURM(TestCase):
             "-o", "/dne/log.out",
             "--mem-per-cpu", "4000",
             "--cpus-per-task", "1",
+            "--comment", "0001",
             "emop.slrm"
         ]
         self.mock_rv.communicate.return_value[0] = "1"
         retval = scheduler.submit_job('0001', '1')
         args, kwargs = self.mock_popen.call_args
-        PROC_ID = os.environ.get('PROC_ID')
-        EMOP_CONFIG_PATH = os.environ.get('EMOP_CONFIG_PATH')
+        PROC_ID = kwargs['env'].get('PROC_ID')
+        EMOP_CONFIG_PATH = kwargs['env'].get('EMOP_CONFIG_PATH')
         self.assertTrue(self.mock_popen.called)
         self.assertEqual(expected_cmd, args[0])
         self.assertEqual(PROC_ID, '0001')
@@ -115,6 +122,207 @@ class TestEmopSLURM(TestCase):
         actual_cmd = scheduler.get_submit_cmd('1')
         self.assertEqual(expected_cmd, actual_cmd)
 
+    def test_parse_time(self):
+        self.assertEqual(59, EmopSLURM.parse_time("0:59"))
+        self.assertEqual(3723, EmopSLURM.parse_time("1:02:03"))
+        self.assertEqual(93784, EmopSLURM.parse_time("1-02:03:04"))
+        self.assertEqual(None, EmopSLURM.parse_time("UNLIMITED"))
+        self.assertEqual(None, EmopSLURM.parse_time("INVALID"))
+        self.assertEqual(62, EmopSLURM.parse_time("01:02.345"))
+
+    def test_parse_memory(self):
+        self.assertEqual(4000, EmopSLURM.parse_memory("4000Mc"))
+        self.assertEqual(2048, EmopSLURM.parse_memory("4Gn", cpus=2))
+        self.assertEqual(1.5, EmopSLURM.parse_memory("1536K"))
+        self.assertEqual(None, EmopSLURM.parse_memory(""))
+
+    def test_get_accounting(self):
+        scheduler = EmopSLURM(self.settings)
+        manifest = os.path.join(self.tmpdir, "0002.manifest")
+        with open(manifest, "w") as f:
+            f.write("0002\n0003\n")
+        mock_stdout = (
+            "1|COMPLETED|0:0|00:10:00|01:00:00||09:00.000|1|4000Mc|2015-01-01T01:00:00|0001\n"
+            "1.batch|COMPLETED|0:0|00:10:00||10240K|00:30.000|1||2015-01-01T01:00:00|\n"
+            "1.0|COMPLETED|0:0|00:09:00||2048000K|08:30.000|1||2015-01-01T01:00:00|\n"
+            "2_1|FAILED|0:125|00:05:00|01:00:00||00:00:00|2|8Gn|2015-01-01T01:00:00|%s\n"
+            "2_1.batch|OUT_OF_MEMORY|0:125|00:05:00||8G|04:00.000|2||2015-01-01T01:00:00|\n"
+            "3|CANCELLED by 1000|0:0|00:00:00|01:00:00||00:00:00|1|4000Mc|Unknown|0004\n"
+            "4|RUNNING|0:0|00:01:00|01:00:00||00:00:00|1|4000Mc|Unknown|0005\n"
+        ) % manifest
+        self.mock_rv.communicate.return_value[0] = mock_stdout
+        records = scheduler.get_accounting(0)
+        args, kwargs = self.mock_popen.call_args
+
+        self.assertEqual(["sacct", "-n", "-P", "--name", "emop-controller"], args[0][:5])
+        self.assertEqual(["1", "2_1", "3", "4"], [r.job_id for r in records])
+        self.assertEqual(["0001", "0003", "0004", "0005"], [r.proc_id for r in records])
+        self.assertEqual(["COMPLETED", "OUT_OF_MEMORY", "CANCELLED", "RUNNING"], [r.state for r in records])
+        self.assertEqual(2000, records[0].max_rss)
+        self.assertEqual(540, records[0].total_cpu)
+        self.assertEqual(600, records[0].elapsed)
+        self.assertEqual(3600, records[0].time_limit)
+        self.assertEqual(4000, records[0].req_mem)
+        self.assertEqual(8192, records[1].max_rss)
+        self.assertEqual(240, records[1].total_cpu)
+        self.assertEqual(4096, records[1].req_mem)
+        self.assertEqual(None, records[2].end_time)
+
+    def test_get_accounting_failed(self):
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.returncode = 1
+        self.assertEqual(None, scheduler.get_accounting(0))
+
+    def test_snapshot(self):
+        scheduler = EmopSLURM(self.settings)
+        manifest = os.path.join(self.tmpdir, "0002_0.manifest")
+        with open(manifest, "w") as f:
+            f.write("0002_0\n0002_1\n")
+        self.mock_rv.communicate.return_value[0] = (
+            "1|RUNNING|None|1:00|1-00:00:00|c0101|emop-controller|0001|N/A\n"
+            "2_1|PENDING|Priority|0:00|1:00:00||emop-controller|%s|1\n" % manifest
+        )
+        jobs = scheduler.snapshot()
+        scheduler.snapshot()
+
+        self.assertEqual(1, self.mock_popen.call_count)
+        self.assertEqual(EmopSchedulerJob("1", "RUNNING", "None", 60, 86400, "c0101", "emop-controller", "0001"),
+                         jobs[0])
+        self.assertEqual("PENDING", jobs[1].state)
+        self.assertEqual("0002_1", jobs[1].proc_id)
+
+    def test_snapshot_expired(self):
+        self.settings.scheduler_snapshot_ttl = 10
+        scheduler = EmopSLURM(self.settings)
+        scheduler.snapshot()
+        scheduler.snapshot_time -= 11
+        scheduler.snapshot()
+
+        self.assertEqual(2, self.mock_popen.call_count)
+
+    def test_submit_job_clears_snapshot(self):
+        scheduler = EmopSLURM(self.settings)
+        scheduler.snapshot()
+        scheduler.submit_job('0001', '1')
+
+        self.assertIsNone(scheduler.snapshot_jobs)
+
+    def test_idle_cpus(self):
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.communicate.return_value[0] = "10/6/0/16\n"
+        retval = scheduler.idle_cpus()
+        args, kwargs = self.mock_popen.call_args
+        self.assertEqual(["sinfo", "--noheader", "-p", "idhmc", "-o", "%C"], args[0])
+        self.assertEqual(6, retval)
+
+    def get_opportunistic_scheduler(self, states, idle_cpus):
+        self.settings.scheduler_opportunistic = True
+        self.settings.scheduler_min_jobs = 0
+        self.settings.scheduler_burst_max_jobs = 20
+        self.settings.scheduler_max_pending_jobs = 2
+        scheduler = EmopSLURM(self.settings)
+        jobs = [EmopSchedulerJob(s[0], s[1], s[2], None, None, "", "emop-controller", None) for s in states]
+        scheduler.snapshot = mock.MagicMock(return_value=jobs)
+        scheduler.idle_cpus = mock.MagicMock(return_value=idle_cpus)
+        return scheduler
+
+    def test_available_job_slots(self):
+        self.settings.max_jobs = 5
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.communicate.return_value[0] = ("1|RUNNING|None|1:00|1:00:00|c0101|emop-controller|0001|N/A\n"
+                                                    "2|PENDING|Priority|0:00|1:00:00||emop-controller|0002|N/A\n")
+        self.assertEqual(3, scheduler.available_job_slots())
+
+    def test_available_job_slots_opportunistic_idle(self):
+        scheduler = self.get_opportunistic_scheduler([("1", "RUNNING", "None"), ("2", "PENDING", "Priority")], 10)
+        # 10 idle less 1 pending, plus 1 more allowed to pend
+        self.assertEqual(10, scheduler.available_job_slots())
+
+    def test_available_job_slots_opportunistic_ceiling(self):
+        scheduler = self.get_opportunistic_scheduler([("1", "RUNNING", "None")] * 15, 100)
+        self.assertEqual(5, scheduler.available_job_slots())
+
+    def test_available_job_slots_opportunistic_blocked(self):
+        scheduler = self.get_opportunistic_scheduler([("1", "PENDING", "QOSMaxJobsPerUserLimit")], 0)
+        self.assertEqual(0, scheduler.available_job_slots())
+
+    def test_available_job_slots_opportunistic_floor(self):
+        scheduler = self.get_opportunistic_scheduler([("1", "PENDING", "QOSMaxJobsPerUserLimit")], 0)
+        self.settings.scheduler_min_jobs = 4
+        self.assertEqual(3, scheduler.available_job_slots())
+
+    def test_get_submit_cmd_array(self):
+        self.settings.max_jobs = 5
+        scheduler = EmopSLURM(self.settings)
+        expected_cmd = [
+            "sbatch", "--parsable",
+            "-p", "idhmc",
+            "-J", "emop-controller",
+            "-o", "/dne/log.out",
+            "--mem-per-cpu", "4000",
+            "--cpus-per-task", "1",
+            "--array", "0-9%5",
+            "emop.slrm"
+        ]
+        actual_cmd = scheduler.get_submit_cmd('1', array_size=10)
+        self.assertEqual(expected_cmd, actual_cmd)
+
+    def test_get_submit_cmd_array_throttle(self):
+        self.settings.max_jobs = 5
+        scheduler = EmopSLURM(self.settings)
+        cmd = scheduler.get_submit_cmd('1', array_size=10, array_throttle=8)
+        self.assertEqual(["--array", "0-9%8"], cmd[-3:-1])
+
+    def test_get_submit_cmd_array_opportunistic(self):
+        scheduler = self.get_opportunistic_scheduler([], 0)
+        cmd = scheduler.get_submit_cmd('1', array_size=10)
+        self.assertEqual(["--array", "0-9%20"], cmd[-3:-1])
+
+    def test_submit_jobs_array(self):
+        self.settings.scheduler_array = True
+        self.settings.max_jobs = 5
+        self.settings.payload_input_path = self.tmpdir
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.communicate.return_value[0] = "100"
+        retval = scheduler.submit_jobs([('0001_0', 2, None), ('0001_1', 1, None), ('0001_2', 1, None)])
+        args, kwargs = self.mock_popen.call_args
+        manifest = kwargs['env'].get('EMOP_PROC_ID_MANIFEST')
+        self.assertEqual(1, self.mock_popen.call_count)
+        self.assertEqual(["--comment", manifest, "--array", "0-2%5"], args[0][-5:-1])
+        self.assertEqual(os.path.join(self.tmpdir, "0001_0.manifest"), manifest)
+        self.assertEqual("0001_0\n0001_1\n0001_2\n", open(manifest).read())
+        self.assertEqual(3, retval)
+        self.assertNotIn('EMOP_PROC_ID_MANIFEST', os.environ)
+
+    def test_submit_jobs_array_split(self):
+        self.settings.scheduler_array = True
+        self.settings.scheduler_max_array_size = 2
+        self.settings.max_jobs = 5
+        self.settings.payload_input_path = self.tmpdir
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.communicate.return_value[0] = "100"
+        retval = scheduler.submit_jobs([('0001_0', 1, None), ('0001_1', 1, None), ('0001_2', 1, None)])
+        arrays = [args[0][-2] for args, kwargs in self.mock_popen.call_args_list]
+        self.assertEqual(["0-1%5", "0-0%5"], arrays)
+        self.assertEqual("0001_0\n0001_1\n", open(os.path.join(self.tmpdir, "0001_0.manifest")).read())
+        self.assertEqual("0001_2\n", open(os.path.join(self.tmpdir, "0001_2.manifest")).read())
+        self.assertEqual(3, retval)
+
+    def test_submit_jobs_array_failed(self):
+        self.settings.scheduler_array = True
+        self.settings.payload_input_path = self.tmpdir
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.returncode = 1
+        retval = scheduler.submit_jobs([('0001_0', 1, None), ('0001_1', 1, None)])
+        self.assertEqual(0, retval)
+
+    def test_submit_jobs_no_array(self):
+        scheduler = EmopSLURM(self.settings)
+        self.mock_rv.communicate.return_value[0] = "1"
+        retval = scheduler.submit_jobs([('0001', 1, None), ('0002', 1, None)])
+        self.assertEqual(2, self.mock_popen.call_count)
+        self.assertEqual(2, retval)
+
     def test_options(self):
         self.assertEqual(self.settings.avg_page_runtime, 60)
         self.assertEqual(self.settings.max_job_runtime, 3600)
@@ -154,6 +362,37 @@ class TestEmopSLURM(TestCase):
         walltime = scheduler.walltime(39)
         self.assertEqual(walltime, 3510)
 
+    def test_walltime_overhead(self):
+        self.settings.job_overhead = 120
+        self.settings.signal_lead_time = 300
+        scheduler = EmopSLURM(self.settings)
+        self.assertEqual(660, scheduler.walltime(1))
+        self.assertEqual(2220, scheduler.walltime(15))
+        self.assertEqual(3600, scheduler.walltime(61))
+        self.assertEqual(431, scheduler.walltime(1, runtime=10.5))
+
+    def test_walltime_overhead_exceeds_max_runtime(self):
+        self.settings.job_overhead = 120
+        self.settings.signal_lead_time = 300
+        self.settings.max_job_runtime = 300
+        scheduler = EmopSLURM(self.settings)
+        self.assertEqual(300, scheduler.walltime(1))
+        self.assertEqual(300, scheduler.walltime(1, runtime=10.5))
+
+    def test_get_submit_cmd_walltime_small_job(self):
+        self.settings.scheduler_set_walltime = True
+        self.settings.avg_page_runtime = 5
+        scheduler = EmopSLURM(self.settings)
+        cmd = scheduler.get_submit_cmd(1)
+        self.assertEqual(["--time", "1"], cmd[-3:-1])
+
+    def test_walltime_runtime_estimate(self):
+        self.settings.walltime_probability = 0.5
+        scheduler = EmopSLURM(self.settings)
+        scheduler.runtime_estimate = EmopRuntimeEstimate([10, 30], "all")
+        self.assertEqual(200, scheduler.walltime(10))
+        self.assertEqual(3600, scheduler.walltime(1000))
+
     # Tests below are for functions inherited from EmopScheduler
 
     def test_is_job_environment_true(self):
@@ -0,0 +1,341 @@
+import json
+import mock
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+from tests.utilities import *
+from emop.emop_query import EmopQuery
+from emop.lib.emop_scheduler import EmopSchedulerAccounting
+from emop.lib.emop_stats import EmopStats, overheads, parse_runtimes, quantile, summarize
+
+LOG_LINES = [
+    "1234 started on c0101 at Thu Jan  1 00:00:00 CST 2015\n",
+    "[2015-01-01T00:00:00] INFO: Got job [1] - Page: 1 Work: 1 BatchID: 16 Font: Fake\n",
+    "[2015-01-01T00:00:10] INFO: OCR [1] COMPLETE: Duration: 10.000 secs\n",
+    "[2015-01-01T00:00:12] INFO: Denoise [1] COMPLETE: Duration: 2.000 secs\n",
+    "[2015-01-01T00:00:12] INFO: Job [1] COMPLETE: Duration: 12.000 secs\n",
+    "[2015-01-01T00:00:13] INFO: TOTAL TIME: 13.000\n",
+]
+
+
+def accounting_record(job_id, state="COMPLETED", elapsed=600, time_limit=3600, max_rss=2000.0, total_cpu=540,
+                      alloc_cpus=1, req_mem=4000.0, proc_id=None):
+    return EmopSchedulerAccounting(job_id=job_id, state=state, exit_code="0:0", elapsed=elapsed,
+                                   time_limit=time_limit, max_rss=max_rss, total_cpu=total_cpu,
+                                   alloc_cpus=alloc_cpus, req_mem=req_mem, end_time="2015-01-01T00:00:%02d" % int(job_id),
+                                   proc_id=proc_id or "%04d" % int(job_id))
+
+
+class TestEmopStats(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_stats(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.stats = EmopStats(str(tmpdir.join("cache", "stats.db")))
+
+    def test_quantile(self):
+        self.assertEqual(None, quantile([], 0.5))
+        self.assertEqual(5, quantile(range(1, 11), 0.5))
+        self.assertEqual(10, quantile(range(10, 0, -1), 0.95))
+
+    def write_log(self, name, lines, mode="w"):
+        path = self.tmpdir.join("logs", name)
+        path.ensure()
+        with open(str(path), mode) as f:
+            f.write("".join(lines))
+        return str(path)
+
+    def test_parse_runtimes(self):
+        path = self.write_log("emop-controller-1234.out", LOG_LINES)
+        path, offset, context, samples, found = parse_runtimes(path)
+
+        self.assertEqual(len("".join(LOG_LINES)), offset)
+        self.assertEqual([("OCR", 10.0), ("Denoise", 2.0), ("page", 12.0), ("total", 13.0)],
+                         [(r["process"], r["runtime"]) for r in samples])
+        self.assertEqual({"process": "page", "runtime": 12.0, "item": "1", "batch_id": "16", "font": "Fake",
+                          "job_id": "1234", "host": "c0101", "time": "2015-01-01T00:00:12"}, samples[2])
+        self.assertEqual(None, samples[3]["batch_id"])
+
+    def test_parse_runtimes_job_id_from_filename(self):
+        path = self.write_log("emop-controller-99.out", LOG_LINES[2:])
+        path, offset, context, samples, found = parse_runtimes(path)
+
+        self.assertEqual(["99"], list(set(r["job_id"] for r in samples)))
+        self.assertEqual([None], list(set(r["host"] for r in samples)))
+
+    def test_parse_runtimes_incomplete_line(self):
+        path = self.write_log("emop-controller-1.out", LOG_LINES[:3] + [LOG_LINES[3].rstrip("\n")])
+        path, offset, context, samples, found = parse_runtimes(path)
+
+        self.assertEqual(len("".join(LOG_LINES[:3])), offset)
+        self.assertEqual([("OCR", 10.0)], [(r["process"], r["runtime"]) for r in samples])
+        self.assertEqual([], parse_runtimes(path, offset, context)[3])
+
+    def test_parse_runtimes_context(self):
+        path = self.write_log("emop-controller-1.out", LOG_LINES[:3])
+        path, offset, context, samples, found = parse_runtimes(path)
+        self.write_log("emop-controller-1.out", LOG_LINES[3:], mode="a")
+        path, offset, context, samples, found = parse_runtimes(path, offset, context)
+
+        self.assertEqual(("16", "1234", "c0101"), (samples[0]["batch_id"], samples[0]["job_id"], samples[0]["host"]))
+
+    def test_update_runtimes_incremental(self):
+        logdir = str(self.tmpdir.join("logs"))
+        self.write_log("emop-controller-1.out", LOG_LINES[:4])
+
+        self.assertEqual(2, self.stats.update_runtimes(logdir, processes=1))
+        self.assertEqual(0, self.stats.update_runtimes(logdir, processes=1))
+        self.write_log("emop-controller-1.out", LOG_LINES[4:], mode="a")
+        self.assertEqual(2, self.stats.update_runtimes(logdir, processes=1))
+        self.assertEqual({"OCR": (1, 10.0), "Denoise": (1, 2.0), "page": (1, 12.0), "total": (1, 13.0)},
+                         self.stats.runtime_totals())
+        self.assertEqual([{"name": "16", "count": 1, "total": 12.0, "mean": 12.0, "p50": 12.0, "p90": 12.0,
+                           "p99": 12.0, "max": 12.0}], self.stats.page_runtimes_by("batch"))
+
+    def test_update_runtimes_truncated(self):
+        logdir = str(self.tmpdir.join("logs"))
+        self.write_log("emop-controller-1.out", LOG_LINES)
+        self.stats.update_runtimes(logdir, processes=1)
+        self.write_log("emop-controller-1.out", LOG_LINES[2:3])
+
+        self.assertEqual(1, self.stats.update_runtimes(logdir, processes=1))
+        self.assertEqual({"OCR": (1, 10.0)}, self.stats.runtime_totals())
+
+    def test_update_runtimes_pool(self):
+        logdir = str(self.tmpdir.join("logs"))
+        for job_id in range(4):
+            self.write_log("emop-controller-%d.out" % job_id, LOG_LINES)
+
+        self.assertEqual(16, self.stats.update_runtimes(logdir, processes=2))
+        self.assertEqual((4, 48.0), self.stats.runtime_totals()["page"])
+
+    def test_query_get_runtimes(self):
+        query = EmopQuery(default_config_path())
+        query.settings.scheduler_logdir = str(self.tmpdir.join("logs"))
+        query.stats = self.stats
+        self.write_log("emop-controller-1.out", LOG_LINES)
+        self.write_log("emop-controller-2.out", LOG_LINES[1:])
+        results = query.get_runtimes()
+        processes = dict((p["name"], p) for p in results["processes"])
+
+        self.assertEqual(2, results["total_pages"])
+        self.assertEqual(24.0, results["total_page_runtime"])
+        self.assertEqual(12.0, results["average_page_runtime"])
+        self.assertEqual(2, results["total_jobs"])
+        self.assertEqual(13.0, results["average_job_runtime"])
+        self.assertEqual({"name": "OCR", "count": 2, "total": 20.0, "avg": 10.0}, processes["OCR"])
+        self.assertEqual({"name": "PageCorrector", "count": 0, "total": 0, "avg": 0}, processes["PageCorrector"])
+
+    def test_schema_version_rebuilds_logs(self):
+        logdir = str(self.tmpdir.join("logs"))
+        self.write_log("emop-controller-1.out", LOG_LINES)
+        self.stats.update_runtimes(logdir, processes=1)
+        self.stats.set_meta("log_schema", "0")
+
+        self.assertEqual({}, self.stats.runtime_totals())
+        self.assertEqual(4, self.stats.update_runtimes(logdir, processes=1))
+
+    def test_summarize(self):
+        summary = summarize([float(i) for i in range(1, 101)])
+
+        self.assertEqual({"count": 100, "total": 5050.0, "mean": 50.5, "p50": 50.0, "p90": 90.0, "p99": 99.0,
+                          "max": 100.0}, summary)
+
+    def write_pages(self, name, runtimes, batch_id="16", host="c0101", hour=0):
+        lines = ["1 started on %s at now\n" % host]
+        for i, runtime in enumerate(runtimes):
+            lines.append("[2015-01-01T%02d:00:00] INFO: Got job [%d] - Page: 1 BatchID: %s Font: Fake\n" %
+                         (hour, i, batch_id))
+            lines.append("[2015-01-01T%02d:%02d:00] INFO: Job [%d] COMPLETE: Duration: %0.3f secs\n" %
+                         (hour, i % 60, i, runtime))
+        self.write_log(name, lines)
+
+    def test_runtime_stages(self):
+        self.write_pages("emop-controller-1.out", [float(i) for i in range(1, 101)])
+        self.stats.update_runtimes(str(self.tmpdir.join("logs")), processes=1)
+        stages = self.stats.runtime_stages()
+
+        self.assertEqual([{"name": "page", "count": 100, "total": 5050.0, "mean": 50.5, "p50": 50.0, "p90": 90.0,
+                           "p99": 99.0, "max": 100.0}], stages)
+
+    def test_throughput(self):
+        self.write_pages("emop-controller-1.out", [1.0] * 3, hour=0)
+        self.write_pages("emop-controller-2.out", [1.0] * 5, hour=1)
+        self.stats.update_runtimes(str(self.tmpdir.join("logs")), processes=1)
+
+        self.assertEqual([{"window": "2015-01-01T00", "pages": 3, "pages_per_hour": 3.0},
+                          {"window": "2015-01-01T01", "pages": 5, "pages_per_hour": 5.0}],
+                         self.stats.throughput("hour"))
+        self.assertEqual([{"window": "2015-01-01", "pages": 8, "pages_per_hour": 8 / 24.0}],
+                         self.stats.throughput("day"))
+
+    def test_page_runtimes_by_host(self):
+        self.write_pages("emop-controller-1.out", [1.0, 2.0], host="fast")
+        self.write_pages("emop-controller-2.out", [10.0, 30.0], host="slow")
+        self.stats.update_runtimes(str(self.tmpdir.join("logs")), processes=1)
+        hosts = self.stats.page_runtimes_by("host")
+
+        self.assertEqual(["slow", "fast"], [h["name"] for h in hosts])
+        self.assertEqual((2, 40.0, 30.0), (hosts[0]["count"], hosts[0]["total"], hosts[0]["max"]))
+
+    def test_query_runtime_report(self):
+        query = EmopQuery(default_config_path())
+        query.settings.scheduler_logdir = str(self.tmpdir.join("logs"))
+        query.stats = self.stats
+        self.write_log("emop-controller-1.out", LOG_LINES)
+        report = query.runtime_report(by=["batch", "job"], window="hour")
+
+        self.assertEqual(1, report["averages"]["total_pages"])
+        self.assertEqual(["page", "OCR", "Denoise", "total"], [s["name"] for s in report["stages"]])
+        self.assertEqual([{"window": "2015-01-01T00", "pages": 1, "pages_per_hour": 1.0}], report["throughput"])
+        self.assertEqual(["16"], [g["name"] for g in report["by"]["batch"]])
+        self.assertEqual(["1234"], [g["name"] for g in report["by"]["job"]])
+
+    def test_parse_runtimes_overheads_and_events(self):
+        lines = LOG_LINES[:1] + ["BOOTSTRAP TIME: 3\n", "START MARIADB TIME: 2\n"] + LOG_LINES[1:]
+        lines += ["[2015-01-01T00:00:14] ERROR: Upload failed\n", "UPLOAD TIME: 1\n",
+                  "slurmstepd: Exceeded job memory limit\n", "JOB TIME: 20\n"]
+        path = self.write_log("emop-controller-1.out", lines)
+        path, offset, context, samples, found = parse_runtimes(path)
+
+        self.assertEqual([("bootstrap", 3.0), ("start_mariadb", 2.0), ("upload", 1.0), ("job", 20.0)],
+                         [(r["process"], r["runtime"]) for r in samples if r["process"] in overheads.values()])
+        self.assertEqual([("error", "1234", "2015-01-01T00:00:14"), ("memory_limit", "1234", None)],
+                         [(e["event"], e["job_id"], e["time"]) for e in found])
+
+    def test_overhead_report(self):
+        setup_lines = ["BOOTSTRAP TIME: 3\n", "START MARIADB TIME: 2\n"]
+        self.write_log("emop-controller-1.out",
+                       LOG_LINES[:1] + setup_lines + LOG_LINES[1:] + ["UPLOAD TIME: 1\n", "JOB TIME: 20\n"])
+        self.write_log("emop-controller-2.out", LOG_LINES[1:] + ["slurmstepd: Exceeded job memory limit\n"])
+        self.stats.update_runtimes(str(self.tmpdir.join("logs")), processes=1)
+        report = self.stats.overhead_report()
+        first, second = report["jobs"]
+
+        self.assertEqual(("1234", "c0101", 20.0), (first["job_id"], first["host"], first["node"]))
+        self.assertEqual((3.0, 2.0, 10.0, 2.0, 1.0, 2.0),
+                         tuple(first["times"][s] for s in ["bootstrap", "start_mariadb", "OCR", "Denoise", "upload",
+                                                           "idle"]))
+        self.assertEqual(0.6, first["productive"])
+        self.assertEqual(("2", 13.0, 1.0), (second["job_id"], second["node"], second["times"]["idle"]))
+        self.assertEqual(1, second["events"]["memory_limit"])
+        self.assertEqual(2, report["aggregate"]["jobs"])
+        self.assertEqual(33.0, report["aggregate"]["node"])
+        self.assertEqual(24.0 / 33.0, report["aggregate"]["productive"])
+        self.assertEqual({"error": 0, "time_limit": 0, "memory_limit": 1}, report["aggregate"]["events"])
+
+    def test_overhead_report_reread_replaces_events(self):
+        logdir = str(self.tmpdir.join("logs"))
+        self.write_log("emop-controller-1.out", LOG_LINES + ["TIME LIMIT\n"])
+        self.stats.update_runtimes(logdir, processes=1)
+        self.write_log("emop-controller-1.out", LOG_LINES[:1])
+        self.stats.update_runtimes(logdir, processes=1)
+
+        self.assertEqual({"error": 0, "time_limit": 0, "memory_limit": 0},
+                         self.stats.overhead_report()["aggregate"]["events"])
+
+    def test_query_overhead(self):
+        query = EmopQuery(default_config_path())
+        query.settings.scheduler_logdir = str(self.tmpdir.join("logs"))
+        query.stats = self.stats
+        self.write_log("emop-controller-1.out", LOG_LINES)
+        report = query.overhead()
+
+        self.assertEqual(1, report["aggregate"]["jobs"])
+        self.assertEqual(13.0, report["aggregate"]["node"])
+
+    def test_meta(self):
+        self.assertEqual(None, self.stats.get_meta("key"))
+        self.stats.set_meta("key", 1.5)
+        self.assertEqual("1.5", self.stats.get_meta("key"))
+
+    def test_add_accounting_replaces(self):
+        self.stats.add_accounting([(accounting_record("1", state="RUNNING"), 10)])
+        self.stats.add_accounting([(accounting_record("1"), 10), (accounting_record("2"), 5)])
+        rows = self.stats.accounting()
+
+        self.assertEqual(["1", "2"], [r["job_id"] for r in rows])
+        self.assertEqual(["COMPLETED", "COMPLETED"], [r["state"] for r in rows])
+        self.assertEqual([10, 5], [r["num_pages"] for r in rows])
+
+    def test_accounting_report(self):
+        self.stats.add_accounting([
+            (accounting_record("1", max_rss=1000.0, elapsed=600, total_cpu=540), 10),
+            (accounting_record("2", max_rss=3000.0, elapsed=100, total_cpu=190, alloc_cpus=2, req_mem=2000.0), 5),
+            (accounting_record("3", state="TIMEOUT", elapsed=3600), 40),
+            (accounting_record("4", state="FAILED"), None),
+        ])
+        report = self.stats.accounting_report()
+
+        self.assertEqual(4, report["jobs"])
+        self.assertEqual({"COMPLETED": 2, "TIMEOUT": 1, "FAILED": 1}, report["states"])
+        self.assertEqual(1500, report["mem_used_max"])
+        self.assertEqual(4000, report["mem_requested"])
+        self.assertAlmostEqual(730 / 800.0, report["cpu_efficiency"])
+        self.assertEqual([], report["killed"])
+        self.assertEqual(["3"], [r["job_id"] for r in report["timed_out"]])
+        self.assertAlmostEqual((60 + 20) / 2.0, report["page_runtime"])
+        self.assertEqual("jobs", report["page_runtime_source"])
+        self.assertEqual({"mem_per_cpu": 1800, "cpus_per_task": 2, "avg_page_runtime": 40}, report["recommended"])
+
+    def test_accounting_report_logged_page_runtime(self):
+        self.write_log("emop-controller-1.out", [
+            "Job [1] COMPLETE: Duration: 10 secs\n",
+            "Job [2] COMPLETE: Duration: 21 secs\n",
+            "TOTAL TIME: 40\n",
+        ])
+        self.stats.update_runtimes(str(self.tmpdir.join("logs")), processes=1)
+        self.stats.add_accounting([(accounting_record("1", elapsed=600), 2)])
+        report = self.stats.accounting_report()
+
+        self.assertAlmostEqual(15.5, report["page_runtime"])
+        self.assertEqual("logs", report["page_runtime_source"])
+        self.assertEqual(16, report["recommended"]["avg_page_runtime"])
+
+    def test_accounting_report_out_of_memory(self):
+        self.stats.add_accounting([
+            (accounting_record("1", max_rss=1000.0), 10),
+            (accounting_record("2", state="OUT_OF_MEMORY", max_rss=4000.0), 10),
+        ])
+        report = self.stats.accounting_report()
+
+        self.assertEqual(["2"], [r["job_id"] for r in report["killed"]])
+        self.assertEqual(6000, report["recommended"]["mem_per_cpu"])
+
+    def test_accounting_report_empty(self):
+        report = self.stats.accounting_report()
+
+        self.assertEqual(0, report["jobs"])
+        self.assertEqual({"mem_per_cpu": None, "cpus_per_task": None, "avg_page_runtime": None},
+                         report["recommended"])
+
+    def test_query_accounting(self):
+        query = EmopQuery(default_config_path())
+        query.settings.payload_input_path = str(self.tmpdir.join("input"))
+        query.settings.scheduler_logdir = str(self.tmpdir.join("logs"))
+        query.stats = self.stats
+        self.tmpdir.join("input", "0001.json").write(json.dumps([{}, {}, {}]), ensure=True)
+        query.scheduler = mock.Mock()
+        query.scheduler.get_accounting.return_value = [
+            accounting_record("1"),
+            accounting_record("2", state="RUNNING"),
+        ]
+        report = query.accounting()
+        start = query.scheduler.get_accounting.call_args[0][0]
+        query.accounting()
+
+        self.assertEqual(1, report["jobs"])
+        self.assertEqual(3, self.stats.accounting()[0]["num_pages"])
+        self.assertTrue(query.scheduler.get_accounting.call_args[0][0] > start)
+
+    def test_query_accounting_failed(self):
+        query = EmopQuery(default_config_path())
+        query.stats = self.stats
+        query.scheduler = mock.Mock()
+        query.scheduler.get_accounting.return_value = None
+
+        self.assertEqual(None, query.accounting())
+        self.assertEqual(None, self.stats.get_meta("accounting_since"))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopStats)
@@ -1,7 +1,10 @@
+import mock
 from unittest import TestCase
 from unittest import TestLoader
 from tests.utilities import default_config_path
 from emop.emop_submit import EmopSubmit
+from emop.lib.emop_payload import EmopPayload
+from emop.lib.emop_runtime_model import EmopRuntimeEstimate, EmopRuntimeModel
 
 
 class TestEmopSubmit(TestCase):
@@ -52,6 +55,38 @@ class TestEmopSubmit(TestCase):
         self.assertEqual(num_jobs, 500)
         self.assertEqual(pages_per_job, 10)
 
+    def test_optimize_submit_job_slots(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        num_jobs, pages_per_job = submit.optimize_submit(page_count=10000, running_job_count=0, job_slots=200)
+        self.assertEqual(num_jobs, 200)
+        self.assertEqual(pages_per_job, 50)
+
+    def test_optimize_submit_runtime_estimate(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.walltime_probability = 0.95
+        submit.runtime_estimate = EmopRuntimeEstimate([10, 30], "all")
+        num_jobs, pages_per_job = submit.optimize_submit(page_count=100000, running_job_count=0)
+        self.assertEqual(num_jobs, 100)
+        self.assertEqual(pages_per_job, submit.runtime_estimate.pages_within(3600, 0.95))
+
+    def test_load_runtime_estimate_disabled(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.runtime_model = False
+        self.assertIsNone(submit.load_runtime_estimate(r_filter={}))
+        self.assertIsNone(submit.scheduler.runtime_estimate)
+
+    def test_estimate_runtimes(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.runtime_model_min_samples = 2
+        submit.stats = mock.MagicMock()
+        submit.stats.page_samples.return_value = [(10.0, "16", "f1"), (30.0, "16", "f1")]
+        model, estimate = submit.estimate_runtimes(r_filter={"batch_id": 16})
+
+        submit.stats.update_runtimes.assert_called_once_with(submit.settings.scheduler_logdir,
+                                                             processes=submit.settings.stats_processes)
+        self.assertEqual("batch_id=16", estimate.source)
+        self.assertEqual(20, estimate.mean)
+
     def test_optimize_submit_single_page(self):
         submit = self.get_submit(128, 300, 259200, 300)
         num_jobs, pages_per_job = submit.optimize_submit(page_count=1, running_job_count=0)
@@ -64,5 +99,102 @@ class TestEmopSubmit(TestCase):
         self.assertEqual(num_jobs, 1)
         self.assertEqual(pages_per_job, 1)
 
+    @mock.patch.object(EmopPayload, "save_input")
+    def test_reserve_bulk_splits_requests(self, mock_save_input):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.reserve_max_pages = 4
+        results = [{"id": i} for i in range(6)]
+        submit.reserve_request = mock.MagicMock(side_effect=[("1", results[:4]), ("2", results[4:])])
+        mock_save_input.return_value = True
+
+        reserved = submit.reserve_bulk(num_jobs=3, pages_per_job=2, r_filter={})
+
+        self.assertEqual([("1_0", 2, None), ("1_1", 2, None), ("2", 2, None)], reserved)
+        self.assertEqual(["1", "1", "1", "1", "2", "2"], [r["proc_id"] for r in results])
+        self.assertEqual(3, mock_save_input.call_count)
+        submit.reserve_request.assert_called_with(num_pages=2, r_filter={})
+
+    @mock.patch.object(EmopPayload, "save_input")
+    def test_reserve_bulk_single_job_extra_pages(self, mock_save_input):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.reserve_request = mock.MagicMock(return_value=("1", [{"id": i} for i in range(3)]))
+        mock_save_input.return_value = True
+
+        reserved = submit.reserve_bulk(num_jobs=1, pages_per_job=2, r_filter={})
+
+        self.assertEqual([("1", 3, None)], reserved)
+
+    def test_reserve_bulk_none_reserved(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.reserve_request = mock.MagicMock(return_value=("", []))
+
+        self.assertEqual([], submit.reserve_bulk(num_jobs=4, pages_per_job=2, r_filter={}))
+
+    def get_pages(self, batch_ids):
+        return [{"id": i, "batch_job": {"id": b, "font": {"font_name": "f%s" % b}}} for i, b in enumerate(batch_ids)]
+
+    def get_runtime_model(self):
+        model = EmopRuntimeModel(min_samples=2)
+        for r in [10, 10]:
+            model.add_sample(r, batch_id="1", font="f1")
+        for r in [100, 100]:
+            model.add_sample(r, batch_id="2", font="f2")
+        return model
+
+    def test_pack_pages_no_model(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        pages = self.get_pages([1, 1, 1, 1, 1])
+        jobs = submit.pack_pages(pages, 2)
+
+        self.assertEqual([(pages[0:3], None), (pages[3:5], None)], jobs)
+
+    def test_pack_pages_balanced(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.walltime_probability = 0.95
+        submit.runtime_model = self.get_runtime_model()
+        pages = self.get_pages([2, 2, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1])
+        jobs = submit.pack_pages(pages, 2)
+        job_ids = [[p["id"] for p in job[0]] for job in jobs]
+
+        self.assertEqual([range(0, 22, 2), range(1, 22, 2)], job_ids)
+        self.assertEqual([200, 200], [job[1] for job in jobs])
+
+    def test_pack_pages_unknown_batch_font(self):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.walltime_probability = 0.95
+        submit.runtime_model = self.get_runtime_model()
+        pages = self.get_pages([3]) + self.get_pages([2])
+        pages[0]["batch_job"]["font"]["font_name"] = "f2"
+        jobs = submit.pack_pages(pages, 2)
+
+        self.assertEqual([100, 100], [job[1] for job in jobs])
+
+    @mock.patch.object(EmopPayload, "save_input")
+    def test_reserve_bulk_packed(self, mock_save_input):
+        submit = self.get_submit(100, 300, 3600, 60)
+        submit.settings.walltime_probability = 0.95
+        submit.runtime_model = self.get_runtime_model()
+        results = self.get_pages([2, 2, 1, 1])
+        submit.reserve_request = mock.MagicMock(return_value=("1", results))
+        mock_save_input.return_value = True
+
+        reserved = submit.reserve_bulk(num_jobs=2, pages_per_job=2, r_filter={})
+
+        self.assertEqual([("1_0", 2, 110), ("1_1", 2, 110)], reserved)
+
+    def test_simulate(self):
+        submit = self.get_submit(10, 300, 3600, 60)
+        submit.settings.sim_runs = 2
+        submit.runtime_estimate = EmopRuntimeEstimate([30, 90], "all")
+        results = submit.simulate(page_count=1000, running_job_count=0, r_filter={})
+        names = [r[0] for r in results]
+
+        self.assertEqual(["current", "max_jobs x0.5", "max_jobs x2", "max_job_runtime x0.5", "max_job_runtime x2",
+                          "min_job_runtime x0.5", "min_job_runtime x2"], names)
+        self.assertEqual(0, results[0][1]["incomplete_pages"])
+        self.assertTrue(results[2][1]["makespan"] < results[1][1]["makespan"])
+        self.assertEqual(10, submit.settings.max_jobs)
+
+
 def suite():
     return TestLoader().loadTestsFromTestCase(TestEmopSubmit)
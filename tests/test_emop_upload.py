@@ -0,0 +1,146 @@
+import mock
+import pytest
+from unittest import TestCase
+from unittest import TestLoader
+from tests.utilities import *
+from emop.emop_upload import EmopUpload, EmopUploadThread
+from emop.lib.emop_payload import EmopPayload
+
+
+class TestEmopUpload(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_upload(self, tmpdir):
+        self.upload = EmopUpload(default_config_path())
+        self.settings = self.upload.settings
+        self.settings.payload_input_path = str(tmpdir.mkdir("input"))
+        self.settings.payload_output_path = str(tmpdir.mkdir("output"))
+        self.settings.payload_completed_path = str(tmpdir.mkdir("completed"))
+        self.settings.payload_uploaded_path = str(tmpdir.mkdir("uploaded"))
+        self.settings.upload_chunk_pages = 2
+        self.settings.upload_chunk_bytes = 0
+        self.payload = EmopPayload(self.settings, '0001')
+
+    def get_data(self):
+        data = {
+            "job_queues": {
+                "completed": [1, 2, 3],
+                "failed": [{"id": 4, "results": "test"}],
+            },
+            "page_results": [{"page_id": 11, "batch_id": 1}, {"page_id": 13, "batch_id": 1}],
+            "postproc_results": [{"page_id": 11, "batch_job_id": 1}, {"page_id": 14, "batch_job_id": 1}],
+        }
+        return data
+
+    def save_input(self):
+        input_data = [{"id": i, "page": {"id": i + 10}} for i in range(1, 5)]
+        self.payload.save_input(input_data)
+
+    def test_get_page_ids_no_input(self):
+        self.assertEqual({}, self.upload.get_page_ids(self.payload))
+
+    def test_get_page_ids(self):
+        self.save_input()
+        self.assertEqual({1: 11, 2: 12, 3: 13, 4: 14}, self.upload.get_page_ids(self.payload))
+
+    def test_get_units(self):
+        units = self.upload.get_units(self.get_data(), {1: 11, 2: 12, 3: 13, 4: 14})
+        keys = [u[0] for u in units]
+        unit_1 = units[0][1]
+        unit_4 = units[3][1]
+
+        self.assertEqual([1, 2, 3, 4], keys)
+        self.assertEqual([1], unit_1["job_queues"]["completed"])
+        self.assertEqual([{"page_id": 11, "batch_id": 1}], unit_1["page_results"])
+        self.assertEqual([{"page_id": 11, "batch_job_id": 1}], unit_1["postproc_results"])
+        self.assertEqual([{"id": 4, "results": "test"}], unit_4["job_queues"]["failed"])
+        self.assertEqual([{"page_id": 14, "batch_job_id": 1}], unit_4["postproc_results"])
+
+    def test_get_units_orphan_results(self):
+        units = self.upload.get_units(self.get_data(), {1: 11})
+        keys = [u[0] for u in units]
+
+        self.assertEqual([1, 2, 3, 4, "page-13", "page-14"], keys)
+
+    def test_get_chunks_pages(self):
+        units = self.upload.get_units(self.get_data(), {1: 11, 2: 12, 3: 13, 4: 14})
+        chunks = self.upload.get_chunks(units)
+
+        self.assertEqual(2, len(chunks))
+        self.assertEqual([1, 2], chunks[0][0])
+        self.assertEqual([1, 2], chunks[0][1]["job_queues"]["completed"])
+        self.assertEqual([3, 4], chunks[1][0])
+        self.assertEqual([{"id": 4, "results": "test"}], chunks[1][1]["job_queues"]["failed"])
+
+    def test_get_chunks_bytes(self):
+        self.settings.upload_chunk_pages = 0
+        self.settings.upload_chunk_bytes = 1
+        units = self.upload.get_units(self.get_data(), {1: 11, 2: 12, 3: 13, 4: 14})
+        chunks = self.upload.get_chunks(units)
+
+        self.assertEqual(4, len(chunks))
+
+    def test_upload_chunks_no_input(self):
+        self.upload.upload = mock.MagicMock(return_value={"status": "ok"})
+        retval = self.upload.upload_chunks(self.get_data(), self.payload)
+
+        self.upload.upload.assert_called_once_with(self.get_data())
+        self.assertTrue(retval)
+
+    def test_upload_chunks_resume(self):
+        self.save_input()
+        self.upload.upload = mock.MagicMock(side_effect=[{"status": "ok"}, None])
+        retval = self.upload.upload_chunks(self.get_data(), self.payload)
+
+        self.assertFalse(retval)
+        self.assertEqual([1, 2], self.payload.load_upload_progress())
+
+        self.upload.upload = mock.MagicMock(return_value={"status": "ok"})
+        retval = self.upload.upload_chunks(self.get_data(), self.payload)
+        args, kwargs = self.upload.upload.call_args
+
+        self.assertTrue(retval)
+        self.assertEqual(1, self.upload.upload.call_count)
+        self.assertEqual([3], args[0]["job_queues"]["completed"])
+        self.assertEqual([1, 2, 3, 4], self.payload.load_upload_progress())
+
+    def test_upload_thread_flush(self):
+        self.save_input()
+        self.upload.upload = mock.MagicMock(return_value={"status": "ok"})
+        data = self.get_data()
+        thread = EmopUploadThread(emop_upload=self.upload, payload=self.payload, get_results=lambda: data)
+        thread.page_done()
+        thread.page_done()
+        retval = thread.flush()
+
+        self.assertTrue(retval)
+        self.assertEqual(0, thread.pending)
+        self.assertEqual([1, 2, 3, 4], self.payload.load_upload_progress())
+
+    def test_upload_thread_flush_nothing_pending(self):
+        self.upload.upload_chunks = mock.MagicMock()
+        thread = EmopUploadThread(emop_upload=self.upload, payload=self.payload, get_results=self.get_data)
+        retval = thread.flush()
+
+        self.assertTrue(retval)
+        self.assertFalse(self.upload.upload_chunks.called)
+
+    def test_upload_thread_flush_failed(self):
+        self.upload.upload_chunks = mock.MagicMock(return_value=False)
+        thread = EmopUploadThread(emop_upload=self.upload, payload=self.payload, get_results=self.get_data)
+        thread.page_done()
+        retval = thread.flush()
+
+        self.assertFalse(retval)
+        self.assertEqual(1, thread.pending)
+
+    def test_upload_thread_wakes_on_pages(self):
+        self.settings.upload_progressive_pages = 2
+        thread = EmopUploadThread(emop_upload=self.upload, payload=self.payload, get_results=self.get_data)
+        thread.page_done()
+        self.assertFalse(thread.wake.is_set())
+        thread.page_done()
+        self.assertTrue(thread.wake.is_set())
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestEmopUpload)
@@ -0,0 +1,113 @@
+import numpy as np
+from unittest import TestCase
+from unittest import TestLoader
+from intersection_profile import bottom_points, intersection_profile
+from intersection_profile import shared as intersection_profile_module
+
+
+def reference_profile(xPointsUp, boxes, min_x, max_x):
+    """The per-position find_X_Profile formerly in multiColDetect.py and deNoise_Post.py"""
+    def findIntercept(coor2, coor1):
+        slope = np.divide(1, np.subtract(coor1, coor2))
+        b = np.subtract(1, np.multiply(slope, coor1))
+        return b
+
+    def find_X_Profile(xPointsUp):
+        if ((xPointsUp - 0.1) <= min_x) and (xPointsUp + 0.1) < max_x:
+            if xPointsUp < min_x:
+                xPointBelow = np.arange(min_x, (xPointsUp + 0.1 + (min_x - xPointsUp)), 0.01)
+            else:
+                xPointBelow = np.arange(min_x, (xPointsUp + 0.1), 0.01)
+        if ((xPointsUp - 0.1) > min_x) and (xPointsUp + 0.1) >= max_x:
+            if xPointsUp > max_x:
+                xPointBelow = np.arange((xPointsUp - 0.1 - (xPointsUp - max_x)), max_x, 0.01)
+            else:
+                xPointBelow = np.arange((xPointsUp - 0.1), max_x, 0.01)
+        if ((xPointsUp - 0.1) > min_x) and (xPointsUp + 0.1) < max_x:
+            xPointBelow = np.arange((xPointsUp - 0.1), (xPointsUp + 0.1), 0.01)
+        if ((xPointsUp - 0.1) < min_x) and (xPointsUp + 0.1) > max_x:
+            xPointBelow = np.arange((xPointsUp - 0.1), (xPointsUp + 0.1), 0.01)
+        xPointBelow = xPointBelow[abs(xPointBelow - xPointsUp) > 0.001]
+
+        slopeTemp = np.divide(1, np.subtract(xPointsUp, xPointBelow))
+        intercept = np.vectorize(findIntercept)(xPointBelow, xPointsUp)
+        countArray = np.ndarray((np.size(slopeTemp), 1), int)
+        for i in range(0, np.size(slopeTemp)):
+            s, b = slopeTemp[i], intercept[i]
+            ixA = np.add(np.multiply(s, boxes[:, 1]), np.subtract(b, boxes[:, 2]))
+            ixB = np.add(np.multiply(s, boxes[:, 3]), np.subtract(b, boxes[:, 4]))
+            ixC = np.add(np.multiply(s, boxes[:, 1]), np.subtract(b, boxes[:, 4]))
+            ixD = np.add(np.multiply(s, boxes[:, 3]), np.subtract(b, boxes[:, 2]))
+            countArray[i] = np.size(np.ix_((np.multiply(ixA, ixB) < 0) | (np.multiply(ixC, ixD) < 0)))
+        return np.min(countArray)
+
+    return np.vectorize(find_X_Profile)(xPointsUp)
+
+
+def random_boxes(num_words, seed, columns=2):
+    """Words in columns of lines with normalized coordinates like parseOCR.parseHOCR"""
+    rng = np.random.RandomState(seed)
+    column = rng.randint(0, columns, num_words)
+    x1 = 0.05 + column * (0.9 / columns) + rng.uniform(0, 0.9 / columns - 0.1, num_words)
+    x2 = x1 + rng.uniform(0.01, 0.08, num_words)
+    y1 = rng.uniform(0.05, 0.95, num_words)
+    y2 = y1 - rng.uniform(0.005, 0.02, num_words)
+    boxes = np.zeros((num_words, 9))
+    boxes[:, 0] = np.arange(1, num_words + 1)
+    boxes[:, 1] = x1
+    boxes[:, 2] = y1
+    boxes[:, 3] = x2
+    boxes[:, 4] = y2
+    return boxes
+
+
+class TestIntersectionProfile(TestCase):
+    def assert_parity(self, boxes):
+        max_x = np.max(boxes[:, 3])
+        min_x = np.min(boxes[:, 1])
+        xPointsUp = np.arange(min_x, max_x, ((max_x - min_x) / 1000))
+
+        expected = reference_profile(xPointsUp, boxes, min_x, max_x)
+        actual = intersection_profile(xPointsUp, boxes, min_x, max_x)
+        self.assertEqual(expected.dtype, actual.dtype)
+        self.assertTrue(np.array_equal(expected, actual))
+
+    def test_parity_two_columns(self):
+        self.assert_parity(random_boxes(120, seed=1))
+
+    def test_parity_three_columns(self):
+        self.assert_parity(random_boxes(150, seed=2, columns=3))
+
+    def test_parity_no_boxes(self):
+        boxes = random_boxes(50, seed=3)
+        max_x = np.max(boxes[:, 3])
+        min_x = np.min(boxes[:, 1])
+        xPointsUp = np.arange(min_x, max_x, ((max_x - min_x) / 1000))
+
+        self.assertTrue(np.array_equal(reference_profile(xPointsUp, boxes[:0], min_x, max_x),
+                                       intersection_profile(xPointsUp, boxes[:0], min_x, max_x)))
+
+    def test_parity_chunked(self):
+        boxes = random_boxes(80, seed=4)
+        original = intersection_profile_module.MAX_ELEMENTS
+        intersection_profile_module.MAX_ELEMENTS = 1000
+        try:
+            self.assert_parity(boxes)
+        finally:
+            intersection_profile_module.MAX_ELEMENTS = original
+
+    def test_bottom_points_match_arange(self):
+        min_x, max_x = 0.05, 0.93
+        xPointsUp = np.array([0.0, 0.07, 0.5, 0.9, 1.0])
+        points, valid = bottom_points(xPointsUp, min_x, max_x)
+
+        expected = np.arange(min_x, 0.07 + 0.1, 0.01)
+        expected = expected[abs(expected - 0.07) > 0.001]
+        self.assertTrue(np.array_equal(expected, points[1][valid[1]]))
+        expected = np.arange(0.9 - 0.1, max_x, 0.01)
+        expected = expected[abs(expected - 0.9) > 0.001]
+        self.assertTrue(np.array_equal(expected, points[3][valid[3]]))
+
+
+def suite():
+    return TestLoader().loadTestsFromTestCase(TestIntersectionProfile)